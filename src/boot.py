@@ -7,9 +7,8 @@ from machine import (
     lightsleep,
     reset_cause,
     DEEPSLEEP_RESET,
-    RTC,
-    Timer,
 )
+import uasyncio as asyncio
 
 
 from handlers.gps_handler import GPSHandler
@@ -17,28 +16,32 @@ from handlers.settings_handler import SettingsHandler
 from handlers.button_handler import ButtonHandler
 from handlers.display_handler import DisplayHandler
 from handlers.led_handler import LEDHandler
+from handlers.track_logger import TrackLogger
+from utils import rtc_store
 
 
 def initialize_handlers():
     settings_handler = SettingsHandler()
     led_handler = LEDHandler(settings_handler)
-    gps = GPSHandler(led_handler)
+    gps = GPSHandler(led_handler, settings_handler)
     gps.init_gps()
+    if settings_handler.get_setting("threaded", "GPS_SETTINGS"):
+        gps.start_thread()
+    if settings_handler.get_setting("track_log", "GPS_SETTINGS"):
+        gps.track_logger = TrackLogger(
+            interval_s=settings_handler.get_setting("track_interval_s", "GPS_SETTINGS")
+        )
     display_handler = DisplayHandler(gps, led_handler, settings_handler)
     button_handler = ButtonHandler(gps, display_handler)
     return settings_handler, led_handler, gps, display_handler, button_handler
 
 
 def manage_boot_cycle():
-    # Get boot cycle count from RTC memory
-    rtc = RTC()
-    boot_count = rtc.memory()
-    if not boot_count:
-        boot_count = 1
-    else:
-        boot_count = int(boot_count.decode()) + 1
-    # Store the new boot count in RTC memory
-    rtc.memory(str(boot_count).encode())
+    # Boot cycle count is kept in RTC memory next to the hot start fix
+    state = rtc_store.load_state()
+    boot_count = state["boot_count"] + 1
+    state["boot_count"] = boot_count
+    rtc_store.save_state(state)
     print(f"[DEBUG] Boot cycle: {boot_count}")
     return boot_count
 
@@ -67,6 +70,8 @@ def handle_boot_screen(display_handler):
 
 def handle_deep_sleep(power_manager):
     if reset_cause() == DEEPSLEEP_RESET:
+        # Show the last fix while the receiver hot starts from it
+        power_manager.gps.restore_hot_start()
         power_manager.wake_from_deep_sleep()
 
 
@@ -77,14 +82,22 @@ def initialize_builtin_led():
     return builtin_led
 
 
-def setup_screen_timeout(settings_handler, power_manager):
-    disp_timer = Timer(2)
-    disp_timer.init(
-        mode=Timer.ONE_SHOT,
-        period=settings_handler.get_setting("screen_timeout_ms", "DEVICE_SETTINGS"),
-        callback=lambda t: power_manager.enter_idle_mode(),
+# Modes that need live GPS data
+GPS_MODES = (0, 1, 2)
+
+
+# Run every subsystem as its own task so none of them can stall another
+async def run_tasks(gps, display_handler, button_handler, power_manager):
+    # Keep reading while logging so the track has no gaps in the menus
+    asyncio.create_task(
+        gps.run(
+            lambda: gps.track_logger is not None
+            or display_handler.current_mode in GPS_MODES
+        )
     )
-    return disp_timer
+    asyncio.create_task(button_handler.run())
+    asyncio.create_task(power_manager.run())
+    await display_handler.run()
 
 
 def main():
@@ -104,25 +117,15 @@ def main():
 
     handle_boot_screen(display_handler)
     initialize_builtin_led()
-    setup_screen_timeout(settings_handler, power_manager)
-    previous_mode = -1
     while True:
         try:
-            # Only call enter_mode if the mode has changed
-            if display_handler.current_mode != previous_mode:
-                print(
-                    f"[DEBUG] Mode changed: {previous_mode} -> {display_handler.current_mode}"
-                )
-
-                display_handler.enter_mode(display_handler.current_mode)
-                previous_mode = display_handler.current_mode  # Update the tracked mode
-
-            # display_handler.enter_mode(display_handler.current_mode)
-            if display_handler.current_mode in [0, 1, 2]:  # Modes requiring GPS
-                gps.read_gps()
-            lightsleep(110)
+            asyncio.run(
+                run_tasks(gps, display_handler, button_handler, power_manager)
+            )
         except Exception as e:
             print(f"Error: {e} ({type(e).__name__})")
+        # Start from a fresh event loop if a task crashed the scheduler
+        asyncio.new_event_loop()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
-from machine import Pin, lightsleep
+from machine import Pin, disable_irq, enable_irq
+import uasyncio as asyncio
 
 
 class ButtonHandler:
@@ -14,6 +15,12 @@ class ButtonHandler:
             "display_power_button": Pin(13, Pin.IN, Pin.PULL_UP),
             "nav_button": Pin(14, Pin.IN, Pin.PULL_UP),
         }
+        # One bit per button, set by the IRQ and consumed by the button task
+        self.button_bits = {}
+        for i, button in enumerate(self.buttons.values()):
+            self.button_bits[button] = 1 << i
+        self.pending = 0
+        self.pressed = asyncio.ThreadSafeFlag()
 
         # Attach a single interrupt handler
         for button in self.buttons.values():
@@ -38,20 +45,42 @@ class ButtonHandler:
     def handle_display_power(self, pin):
         self.display_handler.toggle_display_power()
 
+    # IRQ handler, only records the button so the work happens in the
+    # button task instead of inside the interrupt
     def handle_any_button(self, pin):
-        lightsleep(self.DEBOUNCE_DELAY)
-        if not pin.value():
-            # Handle any button press for power management
-            self.display_handler.handle_user_interaction()
-            # Then handle the buttons normally
-            if pin == self.buttons["set_button"]:
-                self.handle_set_button(pin)
-            elif pin == self.buttons["reset_mode_button"]:
-                self.handle_mode_button(pin)
-            elif pin == self.buttons["nav_button"]:
-                self.handle_nav_button(pin)
-            elif pin == self.buttons["display_power_button"]:
-                self.handle_display_power(pin)
+        self.pending |= self.button_bits.get(pin, 0)
+        self.pressed.set()
+
+    # Button task: debounce, then dispatch every button still held down
+    async def run(self):
+        while True:
+            await self.pressed.wait()
+            await asyncio.sleep_ms(self.DEBOUNCE_DELAY)
+            state = disable_irq()
+            pending = self.pending
+            self.pending = 0
+            enable_irq(state)
+            for pin, bit in self.button_bits.items():
+                if pending & bit and not pin.value():
+                    try:
+                        self.dispatch(pin)
+                    except Exception as e:
+                        print(f"Error: {e} ({type(e).__name__})")
+            # Show the result on the next frame
+            self.display_handler.request_redraw()
+
+    def dispatch(self, pin):
+        # Handle any button press for power management
+        self.display_handler.handle_user_interaction()
+        # Then handle the buttons normally
+        if pin == self.buttons["set_button"]:
+            self.handle_set_button(pin)
+        elif pin == self.buttons["reset_mode_button"]:
+            self.handle_mode_button(pin)
+        elif pin == self.buttons["nav_button"]:
+            self.handle_nav_button(pin)
+        elif pin == self.buttons["display_power_button"]:
+            self.handle_display_power(pin)
 
     # Disable pull-up resistors for buttons
     # Saves power when not in use (before deep sleep)
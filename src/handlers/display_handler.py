@@ -1,11 +1,13 @@
-from machine import freq, lightsleep, I2C, Pin
+from machine import freq, I2C, Pin
 import lib.ssd1306 as ssd1306
 import gc
 import os
 import esp32
 import esp
 import utime
+import uasyncio as asyncio
 from utils.haversine import haversine
+from utils.units import KNOTS_TO_MPS
 
 from handlers.vector_map_handler import VectorMap
 
@@ -20,6 +22,22 @@ class DisplayHandler:
         "Settings",
         "About",
     ]
+    # GPS sentences each mode consumes, see GPSHandler.set_sentence_profile
+    MODE_SENTENCE_PROFILES = [
+        "position",
+        "position",
+        "position",
+        "idle",
+        "idle",
+    ]
+    # How often each mode redraws on its own, 0 redraws only on request
+    MODE_REFRESH_MS = [
+        1000,
+        200,  # Map, positions are extrapolated between fixes
+        0,
+        0,
+        0,
+    ]
     SETTINGS_OPTIONS = [
         "Contrast",
         "Invert Display",
@@ -45,19 +63,39 @@ class DisplayHandler:
         self.power_manager.set_display_power_button(self.display_power_button)
 
         self.current_mode = 0
+        # Mode currently on screen, differs from current_mode after a button
+        # press until the render task catches up
+        self.rendered_mode = -1
+        self.redraw_event = asyncio.Event()
+        # Temporary screen shown on top of the current mode
+        self.overlay = None
+        self.overlay_until = 0
+        self.overlay_refresh_ms = 0
+        self.overlay_next_mode = None
+        # Set while toggle_display_power() waits to act
+        self.power_toggle_pending = False
         self.settings_index = 0
         self.is_editing = False
         self.point_A = None
         self.point_B = None
-        self.vector_map_file = "/simplified_out_0229.geojson"
+        self.vector_map_file = self.find_map_file()
         self.zoom_level = 2.0
         self.prev_zoom_level = self.zoom_level
         self.prev_lat = None
         self.prev_lon = None
         self.prev_alt = None
         self.prev_hdop = None
-        self.location_update_threshold = 25
-        self.vector_map = VectorMap(self.display, self.vector_map_file, bbox=None)
+        # Re-centre the map once the position is this many pixels off centre
+        self.recenter_px = 2
+        self.vector_map = VectorMap(
+            self.display,
+            self.vector_map_file,
+            bbox=None,
+            cache_bytes=self.settings_handler.get_setting(
+                "tile_cache_kb", "DEVICE_SETTINGS"
+            )
+            * 1024,
+        )
         self.vector_map.set_zoom(self.zoom_level)
         self.apply_display_settings_and_mode()
 
@@ -67,6 +105,18 @@ class DisplayHandler:
     def handle_user_interaction(self):
         self.power_manager.handle_user_interaction()
 
+    # Prefer map tiles from tools/compile_tiles.py, then a binary map from
+    # tools/compile_map.py, over the GeoJSON map
+    @staticmethod
+    def find_map_file():
+        for path in ("/map.tiles", "/map.bin"):
+            try:
+                os.stat(path)
+                return path
+            except OSError:
+                pass
+        return "/simplified_out_0229.geojson"
+
     # Initialize I2C, the OLED display, and the display power button
     @staticmethod
     def initialize_display():
@@ -92,6 +142,8 @@ class DisplayHandler:
         self.display.show()
 
         self.current_mode = mode
+        self.rendered_mode = mode
+        self.gps.set_sentence_profile(self.sentence_profile_for(mode))
         mode_functions = {
             0: self.show_main_gps_display,
             1: self.show_map_display,
@@ -104,13 +156,101 @@ class DisplayHandler:
         mode_functions.get(mode, self.show_main_gps_display)()
         gc.collect()
 
+    # Wake the render task so a change shows up on the next frame
+    def request_redraw(self):
+        self.redraw_event.set()
+
+    # Redraw the whole mode screen on the next frame
+    def redraw_mode(self):
+        self.rendered_mode = -1
+        self.request_redraw()
+
+    # Show a temporary screen for duration_ms without blocking other tasks
+    # render draws it (None if already drawn), refresh_ms > 0 redraws it
+    # periodically and next_mode is entered once it expires
+    def show_overlay(self, render, duration_ms, refresh_ms=0, next_mode=None):
+        self.overlay = render
+        self.overlay_until = utime.ticks_add(utime.ticks_ms(), duration_ms)
+        self.overlay_refresh_ms = refresh_ms if render else 0
+        self.overlay_next_mode = next_mode
+        if render:
+            render()
+        self.request_redraw()
+
+    def end_overlay(self):
+        self.overlay = None
+        if self.overlay_next_mode is not None:
+            self.current_mode = self.overlay_next_mode
+            self.overlay_next_mode = None
+        # Bring the mode screen back
+        self.redraw_mode()
+
+    # Redraw the current mode with fresh GPS data
+    def refresh_mode(self):
+        if self.current_mode == 0:
+            self.update_gps_display()
+        elif self.current_mode == 1:
+            self.show_map_display()
+
+    # Draw one frame and return the ms until the next one is due
+    # 0 means nothing changes until a redraw is requested
+    def render_frame(self):
+        if self.power_manager.state != "active":
+            return 0
+        if self.overlay is not None:
+            remaining = utime.ticks_diff(self.overlay_until, utime.ticks_ms())
+            if remaining > 0:
+                if self.overlay_refresh_ms:
+                    self.overlay()
+                    return min(remaining, self.overlay_refresh_ms)
+                return remaining
+            self.end_overlay()
+        if self.current_mode != self.rendered_mode:
+            if self.DEBUG:
+                print(
+                    f"[DEBUG] Mode changed: {self.rendered_mode} -> {self.current_mode}"
+                )
+            self.enter_mode(self.current_mode)
+        else:
+            self.refresh_mode()
+        return self.MODE_REFRESH_MS[self.current_mode]
+
+    # Render task, each mode redraws at its own rate and button presses
+    # trigger an immediate frame through redraw_event
+    async def run(self):
+        event = self.redraw_event
+        # Start from a clean screen whatever was shown during boot
+        self.rendered_mode = -1
+        while True:
+            try:
+                period = self.render_frame()
+            except Exception as e:
+                print(f"Error: {e} ({type(e).__name__})")
+                period = 1000
+            if period:
+                try:
+                    await asyncio.wait_for_ms(event.wait(), period)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await event.wait()
+            event.clear()
+
+    def sentence_profile_for(self, mode):
+        if 0 <= mode < len(self.MODE_SENTENCE_PROFILES):
+            return self.MODE_SENTENCE_PROFILES[mode]
+        return "position"
+
     # Main GPS display
     def show_main_gps_display(self):
         self.update_gps_display()
 
-    # Secondary GPS display
+    # Secondary GPS display, shown for 3 seconds before returning to the
+    # main display. Satellites in view come from GSV, which is only enabled
+    # while this screen is up.
     def show_second_gps_display(self):
-        self.gps_second_display()
+        self.gps.set_sentence_profile("satellites")
+        self.show_overlay(self.gps_second_display, 3000, refresh_ms=1000)
         gc.collect()
 
     # Update the GPS main display
@@ -120,7 +260,7 @@ class DisplayHandler:
         fix_status = self.gps.gps_data.get("fix", "No Fix")
         self.display.text(f"Fix: {fix_status}", 0, 0)
 
-        if fix_status in ["Valid", "Partial"]:
+        if fix_status in ["Valid", "Partial", "Stale"]:
 
             lat = self.gps.gps_data.get("lat")
             lon = self.gps.gps_data.get("lon")
@@ -156,17 +296,17 @@ class DisplayHandler:
             # HDOP is the horizontal dilution of precision
             if hdop != self.prev_hdop and hdop is not None:
                 self.display.fill_rect(0, 50, 128, 10, 0)
-                self.display.text(f"HDOP: {hdop:.1f}m", 0, 50)
+                self.display.text(f"HDOP: {hdop:.1f}", 0, 50)
                 self.prev_hdop = hdop
             elif hdop is not None:
-                self.display.text(f"HDOP: {hdop:.1f}m", 0, 50)
+                self.display.text(f"HDOP: {hdop:.1f}", 0, 50)
 
         else:
             # Clear dynamic areas and show waiting message
             self.display.fill_rect(0, 20, 128, 40, 0)
             self.display.text("Waiting for fix...", 0, 30)
 
-        self.display.show()
+        self.show_frame()
         self.led_handler.toggle_mode_led()
         gc.collect()
 
@@ -179,14 +319,18 @@ class DisplayHandler:
             self.display.text(f"Date: {self.gps.gps_data['utc_date']}", 0, 20)
 
         if "sats" in self.gps.gps_data and self.gps.gps_data["sats"] is not None:
-            self.display.text(f"Sats: {self.gps.gps_data['sats']}", 0, 30)
+            in_view = self.gps.gps_data.get("satellites_in_view", 0)
+            self.display.text(f"Sats: {self.gps.gps_data['sats']}/{in_view}", 0, 30)
 
         # Display PPS if available
         if "pps" in self.gps.gps_data and self.gps.gps_data["pps"] is not None:
             self.display.text(f"PPS: {self.gps.gps_data['pps']}us", 0, 48)
+
+        # Mean GPS-to-screen latency across all pipeline stages
+        lag_ms = self.gps.latency.total_mean() // 1000
+        if lag_ms:
+            self.display.text(f"Lag: {lag_ms}ms", 0, 56)
         self.display.show()
-        # Wait for 3 seconds before returning to main display
-        lightsleep(3000)
         gc.collect()
 
     # Entry point for distance mode
@@ -243,7 +387,6 @@ class DisplayHandler:
             if self.DEBUG:
                 print(f"[DEBUG] Error: {e}")
         self.display.show()
-        utime.sleep(2.5)
 
     # Calculate the distance between two points using the Haversine formula
     def set_distance_point(self):
@@ -282,6 +425,7 @@ class DisplayHandler:
             self.zoom_level = 0.5
         else:
             self.zoom_level = 3.0
+        self.vector_map.set_zoom(self.zoom_level)
         if self.DEBUG:
             print(f"[DEBUG] Setting zoom level to {self.zoom_level}")
 
@@ -368,27 +512,34 @@ class DisplayHandler:
         lat = self.gps.gps_data.get("lat")
         lon = self.gps.gps_data.get("lon")
         fix = self.gps.gps_data.get("fix")
+        predictor = self.gps.predictor
+        if fix == "Valid" and predictor.valid:
+            # Extrapolated from the last fix so the map moves every frame
+            lat_e6, lon_e6 = predictor.position(utime.ticks_ms())
+            lat = lat_e6 / 1000000
+            lon = lon_e6 / 1000000
 
         if fix == "No Fix" or lat is None or lon is None:
             self.display_text("No GPS data", "available")
-            self.display.show()
-            lightsleep(2000)
             # Transition to next screen so user can access other screens
-            self.current_mode = (self.current_mode + 1) % len(self.MODES)
+            self.show_overlay(
+                None, 2000, next_mode=(self.current_mode + 1) % len(self.MODES)
+            )
             return
 
         # Free up memory before rendering
         gc.collect()
 
         # Determine if we need to update the map
-        # Minimum distance threshold for location update
-        # is set in self.location_update_threshold in meters
+        # Re-centre once the position is recenter_px pixels from the centre
         location_changed = False
         if self.prev_lat is None or self.prev_lon is None:
             location_changed = True
         else:
-            distance = haversine(self.prev_lat, self.prev_lon, lat, lon)
-            if distance > self.location_update_threshold:
+            min_lon, min_lat, max_lon, max_lat = self.vector_map.bbox
+            dx = (lon - self.prev_lon) * self.display.width / (max_lon - min_lon)
+            dy = (lat - self.prev_lat) * self.display.height / (max_lat - min_lat)
+            if abs(dx) >= self.recenter_px or abs(dy) >= self.recenter_px:
                 location_changed = True
 
         zoom_level_changed = self.zoom_level != self.prev_zoom_level
@@ -406,18 +557,39 @@ class DisplayHandler:
             self.prev_zoom_level = self.zoom_level
             gc.collect()
 
+        if self.settings_handler.get_setting("heading_up", "DEVICE_SETTINGS"):
+            # Hold the last heading while too slow for the course to be valid
+            course = self.gps.gps_data.get("course")
+            speed = (self.gps.gps_data.get("speed_knots") or 0) * KNOTS_TO_MPS
+            if course is not None and speed >= predictor.MIN_SPEED_MPS:
+                self.vector_map.set_heading(course)
+        else:
+            self.vector_map.set_heading(None)
+
         self.display.fill(0)
         # Render the map features
         self.vector_map.render()
+        self.vector_map.render_track(self.gps.breadcrumbs)
         # Render the user's location
         self.vector_map.render_user_location(lat, lon)
 
         # Update the display __once__
-        self.display.show()
+        self.show_frame()
         gc.collect()
 
         # Utility methods
 
+    # Push a frame built from live GPS data to the screen and record how long
+    # the fix took to get there
+    def show_frame(self):
+        rendered = utime.ticks_us()
+        self.display.show()
+        self.gps.latency.frame_shown(
+            self.gps.gps_data.get("parsed_ticks_us"), rendered, utime.ticks_us()
+        )
+        if self.DEBUG:
+            self.gps.latency.report()
+
     # Initial boot screen
     def display_boot_screen(self):
         self.display.fill(0)
@@ -470,15 +642,25 @@ class DisplayHandler:
         self.display.show()
 
     # Toggle display power and enter deep sleep
+    # The delay runs in its own task so the event loop keeps going
     def toggle_display_power(self, timer=None):
         if self.DEBUG:
             print(f"[DEBUG] Toggling display power with timer: {timer}")
+        if self.power_toggle_pending:
+            return
+        self.power_toggle_pending = True
         if self.power_manager.state == "deep_sleep":
             # Debounce to avoid immediate wake-up
-            utime.sleep_ms(500)
+            asyncio.create_task(self.toggle_display_power_after(500, True))
+        else:
+            asyncio.create_task(self.toggle_display_power_after(300, False))
+
+    async def toggle_display_power_after(self, delay_ms, wake):
+        await asyncio.sleep_ms(delay_ms)
+        self.power_toggle_pending = False
+        if wake:
             self.power_manager.wake_from_deep_sleep()
         else:
-            utime.sleep_ms(300)
             self.power_manager.enter_deep_sleep()
 
     # Cycle through modes
@@ -486,20 +668,23 @@ class DisplayHandler:
         if self.DEBUG:
             print(f"[DEBUG] cycle_mode called. Current mode: {self.current_mode}")
         self.current_mode = (self.current_mode + 1) % len(self.MODES)
+        # Leaving the mode also dismisses any temporary screen
+        self.overlay = None
+        self.overlay_next_mode = None
         if self.DEBUG:
             print(f"[DEBUG] New mode after cycling: {self.current_mode}")
 
     # Handle navigation button per mode
     def handle_nav_button(self):
         if self.current_mode == 0:
-            self.gps_second_display()
+            self.show_second_gps_display()
         elif self.current_mode == 1:
             self.update_map_zoom()
         elif self.current_mode == 3:
             self.settings_index = (self.settings_index + 1) % len(self.SETTINGS_OPTIONS)
             self.update_settings_display()
         elif self.current_mode == 4:
-            self.display_device_storage()
+            self.show_overlay(self.display_device_storage, 2500)
         else:
             self.display.fill(0)
 
@@ -1,28 +1,180 @@
 # gps_handler.py
 
 import time
+import _thread
+from array import array
 
-from machine import UART, Pin, lightsleep
+from machine import RTC, UART, Pin
+from micropython import const
+import uasyncio as asyncio
+
+from utils.dead_reckoning import DeadReckoning
+from utils.fix_ring import FixRing
+from utils.latency import LatencyTracker
+from utils.nmea import (
+    build_sentence,
+    checksum_ok,
+    parse_coord,
+    parse_fixed,
+    parse_int,
+    split_fields,
+)
+from utils import rtc_store
+from utils.ring_buffer import RingBuffer
+from utils.satellite_table import SatelliteTable
+from utils.track_simplifier import TrackSimplifier
+from utils.uart_capture import CaptureUART
+from utils.ubx import (
+    CLASS_NAV,
+    CLASS_NMEA,
+    NAV_DOP,
+    NAV_DOP_LEN,
+    NAV_PVT,
+    NAV_PVT_MIN_LEN,
+    UBXReader,
+    aid_ini,
+    cfg_msg,
+    cfg_prt_uart,
+    cfg_rate,
+    cfg_rxm,
+    decode_nav_dop,
+    decode_nav_pvt,
+)
+
+# NMEA sentence types packed into integers for lookup without slicing
+_RMC = const(0x524D43)
+_GGA = const(0x474741)
+_GSA = const(0x475341)
+_GSV = const(0x475356)
+_VTG = const(0x565447)
+
+# Talker IDs packed the same way, mapped to the name stored in gps_data
+TALKERS = {
+    0x4750: "GP",  # GPS
+    0x474E: "GN",  # Combined GNSS
+    0x474C: "GL",  # GLONASS
+    0x4741: "GA",  # Galileo
+    0x4742: "GB",  # BeiDou
+    0x4244: "BD",  # BeiDou (pre NMEA 4.1)
+}
+
+# Offset added to GSV PRNs so the satellite table key is unique per system
+# GPS (1-32) and GLONASS (65-96) already use separate ranges
+PRN_BASE = {
+    "GA": 0x100,
+    "GB": 0x200,
+    "BD": 0x200,
+}
+
+
+# Output sentences as bits, used to describe what each screen consumes
+SENTENCE_GGA = const(0x01)
+SENTENCE_GLL = const(0x02)
+SENTENCE_GSA = const(0x04)
+SENTENCE_GSV = const(0x08)
+SENTENCE_RMC = const(0x10)
+SENTENCE_VTG = const(0x20)
+
+SENTENCE_PROFILES = {
+    # Fix, time, position, altitude and HDOP
+    "position": SENTENCE_RMC | SENTENCE_GGA,
+    # Position plus satellites in view and DOP
+    "satellites": SENTENCE_RMC | SENTENCE_GGA | SENTENCE_GSA | SENTENCE_GSV,
+    # Enough to keep fix status and time current
+    "idle": SENTENCE_RMC,
+}
+
+# (sentence bit, UBX CFG-MSG id in class 0xF0, PMTK314 field index)
+SENTENCE_IDS = (
+    (SENTENCE_GGA, 0x00, 3),
+    (SENTENCE_GLL, 0x01, 0),
+    (SENTENCE_GSA, 0x02, 4),
+    (SENTENCE_GSV, 0x03, 5),
+    (SENTENCE_RMC, 0x04, 1),
+    (SENTENCE_VTG, 0x05, 2),
+)
+
+# Time accuracy claimed by hot start aiding, the RTC drifts less than this
+# through deep sleep and the frame must be sent within it
+AIDING_TIME_ACCURACY_MS = 2000
 
 
 class GPSHandler:
-    def __init__(self, led_handler):
+    # Granularity of the reader task, also the minimum update interval
+    POLL_INTERVAL_MS = 100
+
+    def __init__(self, led_handler, settings_handler=None):
         self.led_handler = led_handler
+        self.settings_handler = settings_handler
         # Global variables to store GPS data
         self.gps_data = {
             "fix": "No Fix",
             "lat": 0.0,
             "lon": 0.0,
+            # Position as integer microdegrees, exact and allocation-free
+            "lat_e6": 0,
+            "lon_e6": 0,
             "alt": 0,
             "sats": 0,
             "pps": 0,
             "hdop": 0,
+            # Horizontal accuracy estimate in metres, UBX only
+            "h_acc_m": None,
             "utc_time": None,
             "utc_date": None,
-            "satellites": [],
+            "satellites": None,
             "satellites_in_view": 0,
+            "talker": None,
+            "fix_type": 1,
+            "pdop": None,
+            "vdop": None,
+            "speed_knots": 0,
+            "course": None,
+            # ticks_us of the PPS edge the fix belongs to, of the fix's
+            # sentence leaving the UART and of parsing completing
+            "pps_ticks_us": None,
+            "rx_ticks_us": None,
+            "parsed_ticks_us": None,
         }
+        # Dictionary the parsers write into. It is gps_data itself unless the
+        # ingestion thread is used, then fixes reach gps_data via fix_ring.
+        self.fix_data = self.gps_data
+        self.fix_ring = None
+        self.thread_running = False
+        # Commands for the receiver waiting for the ingestion thread, which
+        # owns the UART while it runs. Appended by the UI, popped by the
+        # thread, each a single operation under the GIL
+        self.tx_queue = []
         self.last_pps_time = None
+        # ticks_us when the sentence being parsed was taken off the UART
+        self.rx_ticks = 0
+        self.latency = LatencyTracker()
+
+        # Hot start: RTC clock set from GPS time, restored fix waiting to be
+        # sent as aiding, (lat_e6, lon_e6, alt_cm, has_time)
+        self.rtc_synced = False
+        self.pending_aiding = None
+        self.aiding_due = 0
+
+        # Each new valid fix feeds the breadcrumb trail and, if enabled,
+        # the TrackLogger
+        self.breadcrumbs = TrackSimplifier()
+        self.predictor = DeadReckoning()
+        self.track_logger = None
+        self.logged_ticks = None
+
+        # Double-buffered satellite tables for GSV assembly
+        # One epoch's GSV block may hold a sequence per constellation
+        self.sat_table = SatelliteTable()
+        self.sat_building = SatelliteTable()
+        # Copy of the published table read by the UI, see publish_fix()
+        self.shown_satellites = SatelliteTable()
+        self.gsv_in_block = False
+        self.gsv_complete = False
+        self.gsv_talker = 0
+        self.gsv_expected = 0
+        self.gsv_in_view = 0
+        self.gps_data["satellites"] = self.sat_table
 
         # Initialize PPS and GPS power pin
         self.pps_pin = Pin(4, Pin.IN)
@@ -31,28 +183,178 @@ class GPSHandler:
         # UART object
         self.uart1 = None
 
+        # Preallocated receive ring and line buffer for streaming NMEA input
+        # NMEA sentences are at most 82 characters long
+        self.rx_ring = RingBuffer(1024)
+        self.line_buf = bytearray(96)
+        # Start offsets of each field in line_buf, filled by split_fields
+        self.fields = array("H", [0] * 24)
+        self.checksum_errors = 0
+
+        # Sentence type -> (handler, minimum field count)
+        self.sentence_handlers = {
+            _RMC: (self.parse_rmc, 10),
+            _GGA: (self.parse_gga, 10),
+            _GSA: (self.parse_gsa, 18),
+            _GSV: (self.parse_gsv, 4),
+            _VTG: (self.parse_vtg, 8),
+        }
+
         # Cache frequently used methods and objects
-        self.uart_readline = self.uart1.readline if self.uart1 else None
         self.led_set_success = self.led_handler.set_success_led
         self.led_set_warning = self.led_handler.set_warning_led
         self.led_set_error = self.led_handler.set_error_led
 
-        self.update_interval = 1000
+        # Protocol selection, UBX mode needs a u-blox receiver (GT-U7 etc)
+        self.protocol = "nmea"
+        self.ubx_baudrate = 115200
+        self.nav_rate_hz = 1
+        if settings_handler:
+            self.protocol = settings_handler.get_setting("protocol", "GPS_SETTINGS")
+            self.ubx_baudrate = settings_handler.get_setting(
+                "ubx_baudrate", "GPS_SETTINGS"
+            )
+            self.nav_rate_hz = settings_handler.get_setting(
+                "nav_rate_hz", "GPS_SETTINGS"
+            )
+        # "ublox" receivers are configured with UBX CFG-MSG, "mtk" with PMTK314
+        self.receiver = "ublox"
+        if settings_handler:
+            self.receiver = settings_handler.get_setting("receiver", "GPS_SETTINGS")
+        self.ubx_reader = UBXReader() if self.protocol == "ubx" else None
+        # Sentences currently enabled on the receiver, None when unknown
+        self.sentence_mask = None
+        self.sentence_profile = None
+        # Receiver power save mode, see set_power_save
+        self.power_save = False
+        # Raw UART capture, see init_gps
+        self.capture_file = None
+        if settings_handler and settings_handler.get_setting(
+            "capture", "GPS_SETTINGS"
+        ):
+            self.capture_file = "/gps_capture.bin"
+        self.capture = None
+        # Sentences or UBX frames handled since boot
+        self.messages_handled = 0
+
+        # Receiver fix interval while the device is in use, the nav rate
+        if self.ubx_reader:
+            self.nav_rate_hz = max(1, min(self.nav_rate_hz, 10))
+            self.active_interval = 1000 // self.nav_rate_hz
+        else:
+            self.active_interval = 1000
+        self.update_interval = self.active_interval
         self.DEBUG = False
 
+    # Set how often the receiver outputs a fix. Every fix it sends reaches
+    # gps_data, so slowing the receiver down is what saves the parsing
     def set_update_interval(self, interval_ms):
-        self.update_interval = max(interval_ms, 100)  # Minimum interval of 100 ms
+        interval_ms = max(interval_ms, 100)  # Minimum interval of 100 ms
+        if interval_ms == self.update_interval:
+            return
+        self.update_interval = interval_ms
+        if not self.uart1:
+            return
+        if self.receiver == "mtk":
+            # PMTK220 takes 100 to 10000 ms
+            body = "PMTK220,%d" % min(interval_ms, 10000)
+            self.send_command(build_sentence(body))
+        else:
+            self.send_command(cfg_rate(interval_ms))
+        if self.DEBUG:
+            print(f"[DEBUG] Receiver fix interval: {interval_ms} ms")
+
+    # Enable only the NMEA sentences the current screen needs
+    # Each sentence switched off is bytes the UART and parser never see
+    def set_sentence_profile(self, profile):
+        if profile == self.sentence_profile:
+            return
+        mask = SENTENCE_PROFILES.get(profile)
+        if mask is None:
+            print(f"[ERROR] Unknown sentence profile: {profile}")
+            return
+        # The track log takes altitude and HDOP from GGA whatever is shown
+        if self.track_logger is not None:
+            mask |= SENTENCE_GGA
+        self.sentence_profile = profile
+        # UBX mode only outputs NAV-PVT, there are no NMEA sentences to trim
+        if not self.uart1 or self.ubx_reader:
+            return
+        if self.receiver == "mtk":
+            # One PMTK314 sets the rate of every sentence at once
+            rates = [0] * 19
+            for bit, _, pmtk_index in SENTENCE_IDS:
+                if mask & bit:
+                    rates[pmtk_index] = 1
+            body = "PMTK314," + ",".join(str(r) for r in rates)
+            self.send_command(build_sentence(body))
+        else:
+            # CFG-MSG is per sentence, only send the ones that change
+            if self.sentence_mask is None:
+                changed = 0x3F
+            else:
+                changed = mask ^ self.sentence_mask
+            for bit, msg_id, _ in SENTENCE_IDS:
+                if changed & bit:
+                    rate = 1 if mask & bit else 0
+                    self.send_command(cfg_msg(CLASS_NMEA, msg_id, rate))
+        self.sentence_mask = mask
+        if self.DEBUG:
+            print(f"[DEBUG] Sentence profile: {profile} ({mask:#04x})")
+
+    # Switch the receiver between continuous tracking and its power save
+    # mode, in which it keeps outputting fixes at a lower current draw
+    def set_power_save(self, enabled):
+        if enabled == self.power_save or not self.uart1:
+            return
+        self.power_save = enabled
+        if self.receiver == "mtk":
+            # Periodic standby: track 3 s, sleep 12 s
+            body = "PMTK225,2,3000,12000,18000,72000" if enabled else "PMTK225,0"
+            self.send_command(build_sentence(body))
+        else:
+            self.send_command(cfg_rxm(enabled))
+        if self.DEBUG:
+            print(f"[DEBUG] Receiver power save: {enabled}")
+
+    # Write a command frame to the receiver, or queue it for the ingestion
+    # thread while that owns the UART
+    def send_command(self, frame):
+        if self.thread_running:
+            self.tx_queue.append(frame)
+        else:
+            self.uart1.write(frame)
 
     # Initialize UART1 to read from the GPS module
-    def init_gps(self):
+    # A replay source (utils.uart_replay.ReplayUART) can be passed as uart
+    # to run the handler from a captured log instead of the receiver
+    def init_gps(self, uart=None):
         self.power_on()
         try:
-            self.uart1 = UART(
-                1, baudrate=9600, bits=8, parity=None, stop=1, tx=Pin(17), rx=Pin(16)
-            )
-            if not self.uart1:
+            if uart is None:
+                # rxbuf holds a full second of 9600 baud output, the UART is
+                # drained every POLL_INTERVAL_MS whatever the update interval
+                # timeout=0 keeps readinto() from blocking when the FIFO is empty
+                uart = UART(
+                    1,
+                    baudrate=9600,
+                    bits=8,
+                    parity=None,
+                    stop=1,
+                    tx=Pin(17),
+                    rx=Pin(16),
+                    rxbuf=1024,
+                    timeout=0,
+                )
+            if not uart:
                 raise ValueError("[ERROR] Failed to initialize UART")
-            self.uart_readline = self.uart1.readline
+            if self.capture_file:
+                # Tee the raw receiver output to flash for later replay
+                self.capture = CaptureUART(uart, self.capture_file)
+                uart = self.capture
+            self.uart1 = uart
+            if self.ubx_reader:
+                self.configure_ubx()
         except Exception as e:
             print(f"[ERROR] UART initialization error: {e}")
             self.uart1 = None
@@ -63,6 +365,28 @@ class GPSHandler:
         if self.DEBUG:
             print("[DEBUG] GPS initialized")
 
+    # Switch the receiver to UBX NAV-PVT output at a higher baud and nav rate
+    # The receiver starts at 9600 baud NMEA after power up
+    def configure_ubx(self):
+        uart = self.uart1
+        # UBX+NMEA in, UBX out. Sent at both rates in case the receiver kept
+        # the faster configuration across an ESP32 reset.
+        port_config = cfg_prt_uart(self.ubx_baudrate)
+        uart.write(port_config)
+        # Let the frame leave the FIFO before changing our own baud rate
+        time.sleep_ms(100)
+        uart.init(baudrate=self.ubx_baudrate, tx=Pin(17), rx=Pin(16))
+        uart.write(port_config)
+        time.sleep_ms(100)
+        uart.write(cfg_msg(CLASS_NAV, NAV_PVT, 1))
+        # NAV-PVT carries no HDOP
+        uart.write(cfg_msg(CLASS_NAV, NAV_DOP, 1))
+        uart.write(cfg_rate(1000 // self.nav_rate_hz))
+        if self.DEBUG:
+            print(
+                f"[DEBUG] UBX mode: {self.ubx_baudrate} baud, {self.nav_rate_hz} Hz"
+            )
+
     def power_off(self):
         if self.DEBUG:
             print("[DEBUG] Powering off GPS")
@@ -71,6 +395,12 @@ class GPSHandler:
     def power_on(self):
         print("[DEBUG] Powering on GPS")
         self.gps_power_pin.value(0)
+        # The receiver comes back with its default sentence output, the
+        # profile is applied again on the next mode change
+        self.sentence_mask = None
+        self.sentence_profile = None
+        self.power_save = False
+        self.update_interval = self.active_interval
 
     # PPS signal handler to measure intervals between pulses
     def pps_handler(self, pin):
@@ -79,124 +409,492 @@ class GPSHandler:
             if pin.value() == 1:
                 if self.last_pps_time is not None:
                     interval = time.ticks_diff(current_time, self.last_pps_time)
-                    self.gps_data["pps"] = interval
+                    self.fix_data["pps"] = interval
                 self.last_pps_time = current_time
         except Exception as e:
             print(f"[ERROR] PPS handler error: {e}")
 
-    # Convert DDDMM.MMMM to decimal degrees
-    @staticmethod
-    @micropython.native
-    def convert_to_decimal(degrees_minutes):
-        if degrees_minutes and degrees_minutes.strip():
-            try:
-                parts = degrees_minutes.split(".")
-                if len(parts) != 2:
-                    return None
-                degrees = float(parts[0][:-2])
-                minutes = float(parts[0][-2:] + "." + parts[1])
-                return degrees + (minutes / 60)
-            except ValueError as e:
-                print(f"[ERROR] Error converting {degrees_minutes} to decimal: {e}")
-        return None
-
     # Read GPS data
-    # The @micropython.native decorator gives a 5% performance boost
+    # Drains everything the receiver has sent since the last call and parses
+    # every complete sentence, so the fix never lags behind the UART.
+    # Never blocks, the reader task decides how often it runs.
     def read_gps(self):
-        if not self.uart_readline:
+        if not self.uart1:
             if self.DEBUG:
                 print("[DEBUG] UART not initialized!")
             return self.gps_data
 
-        line = self.uart_readline()
-        if not line:
-            return self.gps_data
+        # Commands queued by the UI while the ingestion thread runs
+        while self.tx_queue:
+            self.uart1.write(self.tx_queue.pop(0))
+
+        if self.ubx_reader:
+            handled = self.read_ubx()
+        else:
+            handled = self.read_nmea()
+
+        self.messages_handled += handled
+
+        # Fix status handling
+        fix_data = self.fix_data
+        if fix_data["fix"] == "No Fix":
+            if any(fix_data.get(key) for key in ["lat", "lon", "alt", "sats"]):
+                fix_data["fix"] = "Partial"
+                self.led_set_warning(1)
+
+        if handled and self.fix_ring is not None:
+            self.fix_ring.push(fix_data)
+
+        # The RTC keeps running through deep sleep, set it once per boot so
+        # the time can be given to the receiver as aiding on wake
+        if not self.rtc_synced and fix_data["fix"] == "Valid":
+            self.sync_rtc()
+        if self.pending_aiding is not None:
+            late_ms = time.ticks_diff(time.ticks_ms(), self.aiding_due)
+            if late_ms >= 0:
+                self.send_aiding(late_ms)
+        return self.gps_data
+
+    # Move UART ingestion and parsing to a separate thread
+    # The thread owns the UART and publishes every new fix into fix_ring,
+    # the UI side only copies the newest snapshot into gps_data. On the ESP32
+    # port MicroPython threads share one core under the GIL, so this decouples
+    # ingestion from slow redraws rather than parsing in parallel.
+    def start_thread(self, slots=4):
+        if self.thread_running:
+            return
+        self.fix_data = dict(self.gps_data)
+        self.fix_ring = FixRing(
+            self.fix_data, slots, tables={"satellites": SatelliteTable}
+        )
+        self.thread_running = True
+        _thread.stack_size(8 * 1024)
+        _thread.start_new_thread(self.ingest_forever, ())
+
+    def stop_thread(self):
+        self.thread_running = False
+
+    # Ingestion thread body
+    def ingest_forever(self):
+        while self.thread_running:
+            try:
+                self.read_gps()
+            except Exception as e:
+                print(f"[ERROR] GPS thread error: {e}")
+            # Drain at the poll rate whatever the fix interval, see run()
+            time.sleep_ms(self.POLL_INTERVAL_MS)
+        if self.DEBUG:
+            print("[DEBUG] GPS thread stopped")
+
+    # Seconds since 2000-01-01 UTC from the RTC, whatever the port's epoch
+    @staticmethod
+    def utc_seconds():
+        return time.time() - time.mktime((2000, 1, 1, 0, 0, 0, 0, 0))
 
+    # Set the RTC clock from the GPS UTC date and time
+    def sync_rtc(self):
+        fix_data = self.fix_data
+        utc_date = fix_data["utc_date"]
+        utc_time = fix_data["utc_time"]
+        if not utc_date or not utc_time:
+            return
         try:
-            line_decoded = line.decode("ascii", "ignore").strip()
-            if not line_decoded.startswith("$"):
-                if self.DEBUG:
-                    print(f"[DEBUG] Invalid NMEA sentence: {line_decoded}")
-                return
-            data = line_decoded.split(",")
-            # Cache locally for performance
-            gps_data = self.gps_data
-
-            if line_decoded.startswith("$GPRMC") and len(data) >= 7:
-                fix = data[2] == "A"
-                gps_data["fix"] = "Valid" if fix else "No Fix"
-
-                self.led_set_success(1 if fix else 0)
-                self.led_set_warning(0)
-                self.led_set_error(0 if fix else 1)
-
-                if fix and len(data) >= 7:
-                    # Extract UTC time and date
-                    gps_data[
-                        "utc_time"
-                    ] = f"{data[1][:2]}:{data[1][2:4]}:{data[1][4:6]}"
-                    gps_data[
-                        "utc_date"
-                    ] = f"20{data[9][4:6]}-{data[9][2:4]}-{data[9][:2]}"
-
-                    # Extract latitude and longitude
-                    latitude = self.convert_to_decimal(data[3])
-                    longitude = self.convert_to_decimal(data[5])
-                    if latitude is not None and longitude is not None:
-                        gps_data["lat"] = latitude * (-1 if data[4] == "S" else 1)
-                        gps_data["lon"] = longitude * (-1 if data[6] == "W" else 1)
-
-                    # Extract speed and course if available
-                    gps_data["speed_knots"] = float(data[7]) if data[7] else 0
-                    gps_data["course"] = float(data[8]) if data[8] else None
-
-            elif line_decoded.startswith("$GPGGA") and len(data) >= 10:
-                gps_data["alt"] = float(data[9]) if data[9] else 0
-                gps_data["sats"] = int(data[7]) if data[7] else 0
-                #  Horizontal dilution of precision (accuracy indicator)
-                gps_data["hdop"] = float(data[8]) if data[8] else None
-
-            elif line_decoded.startswith("$GPGSV") and len(data) >= 4:
-                # Extract satellite information
-                gps_data["satellites_in_view"] = int(data[3]) if data[3] else 0
-                if "satellites" not in gps_data:
-                    gps_data["satellites"] = []
-                for i in range(4, len(data) - 4, 4):
-                    try:
-                        sat_id = int(data[i])
-                        elevation = int(data[i + 1]) if data[i + 1] else None
-                        azimuth = int(data[i + 2]) if data[i + 2] else None
-                        snr = int(data[i + 3]) if data[i + 3] else None
-                        gps_data["satellites"].append(
-                            {
-                                "id": sat_id,
-                                "elevation": elevation,
-                                "azimuth": azimuth,
-                                "snr": snr,
-                            }
-                        )
-                    except (ValueError, IndexError):
-                        continue
+            year, month, day = [int(part) for part in utc_date.split("-")]
+            hour, minute, second = [int(part) for part in utc_time.split(":")]
+            RTC().datetime((year, month, day, 0, hour, minute, second, 0))
+            self.rtc_synced = True
+        except Exception as e:
+            print(f"[ERROR] RTC sync error: {e}")
+
+    # Keep the last valid fix and satellites in RTC memory before deep sleep
+    def save_hot_start(self):
+        state = rtc_store.load_state()
+        data = self.gps_data
+        if data["fix"] == "Valid":
+            state["flags"] = rtc_store.FLAG_FIX
+            state["lat_e6"] = data["lat_e6"]
+            state["lon_e6"] = data["lon_e6"]
+            state["alt_cm"] = int(data["alt"] * 100)
+            # Strongest tracked satellites, GPS/GLONASS PRNs fit in a byte
+            table = self.sat_table
+            prns = bytearray()
+            for i in range(len(table)):
+                prn = table.prn[i]
+                if prn < 256 and 0 < table.snr[i] < 0xFF:
+                    prns.append(prn)
+            state["satellites"] = prns[: rtc_store.MAX_SATELLITES]
+        if self.rtc_synced:
+            state["flags"] |= rtc_store.FLAG_RTC_TIME
+            state["utc_s"] = self.utc_seconds()
+        rtc_store.save_state(state)
+
+    # After deep sleep: show the saved fix as "Stale" straight away and queue
+    # position/time aiding for the receiver once it has booted
+    def restore_hot_start(self, delay_ms=1000):
+        state = rtc_store.load_state()
+        if not state["flags"] & rtc_store.FLAG_FIX:
+            return
+        lat_e6 = state["lat_e6"]
+        lon_e6 = state["lon_e6"]
+        for data in (self.fix_data, self.gps_data):
+            data["fix"] = "Stale"
+            data["lat_e6"] = lat_e6
+            data["lon_e6"] = lon_e6
+            data["lat"] = lat_e6 / 1000000
+            data["lon"] = lon_e6 / 1000000
+            data["alt"] = state["alt_cm"] / 100
+
+        # The RTC ran through deep sleep, so its time is current. The frame
+        # is built when it is sent, so it carries the time of sending
+        has_time = bool(state["flags"] & rtc_store.FLAG_RTC_TIME)
+        if has_time:
+            self.rtc_synced = True
+        self.pending_aiding = (lat_e6, lon_e6, state["alt_cm"], has_time)
+        self.aiding_due = time.ticks_add(time.ticks_ms(), delay_ms)
+        if self.DEBUG:
+            print(f"[DEBUG] Restored stale fix, sats: {list(state['satellites'])}")
+
+    # Send the restored fix and the RTC time as aiding, late_ms after it was
+    # due. Aiding that waited longer than the time accuracy it claims is
+    # dropped, the receiver is better off searching without it
+    def send_aiding(self, late_ms):
+        lat_e6, lon_e6, alt_cm, has_time = self.pending_aiding
+        self.pending_aiding = None
+        if late_ms > AIDING_TIME_ACCURACY_MS:
+            if self.DEBUG:
+                print(f"[DEBUG] Dropped hot start aiding, {late_ms} ms late")
+            return
+        utc_s = self.utc_seconds() if has_time else None
+        if self.receiver == "mtk":
+            frame = self.mtk_aiding(lat_e6, lon_e6, alt_cm, utc_s)
+        else:
+            # Allow 10 km of movement while asleep
+            frame = aid_ini(
+                lat_e6, lon_e6, alt_cm, 1000000, utc_s, AIDING_TIME_ACCURACY_MS
+            )
+        if frame is None:
+            return
+        self.uart1.write(frame)
+        if self.DEBUG:
+            print("[DEBUG] Sent hot start aiding")
+
+    # PMTK741: position and UTC time aiding for MTK receivers
+    @staticmethod
+    def mtk_aiding(lat_e6, lon_e6, alt_cm, utc_s):
+        if utc_s is None:
+            return None
+        base = time.mktime((2000, 1, 1, 0, 0, 0, 0, 0))
+        year, month, day, hour, minute, second = time.gmtime(base + utc_s)[:6]
+        body = "PMTK741,%.6f,%.6f,%d,%d,%02d,%02d,%02d,%02d,%02d" % (
+            lat_e6 / 1000000,
+            lon_e6 / 1000000,
+            alt_cm // 100,
+            year,
+            month,
+            day,
+            hour,
+            minute,
+            second,
+        )
+        return build_sentence(body)
+
+    # Reader task, drains and parses the UART every POLL_INTERVAL_MS so the
+    # receiver's output never backs up in the UART buffer and each fix is
+    # stamped when it arrived. Whatever the receiver sent is published into
+    # gps_data and recorded at once, unless not is_needed(). The receiver's
+    # own fix interval sets the rate, see set_update_interval.
+    # With the ingestion thread running the thread drains the UART and this
+    # picks up its snapshots instead.
+    async def run(self, is_needed):
+        if self.thread_running:
+            latest = dict(self.gps_data)
+        else:
+            # Parse into a dictionary of its own, gps_data changes on publish
+            self.fix_data = dict(self.gps_data)
+            latest = self.fix_data
+        while True:
+            try:
+                if self.thread_running:
+                    new = self.fix_ring.pop_latest_into(latest)
+                else:
+                    handled = self.messages_handled
+                    self.read_gps()
+                    new = self.messages_handled != handled
+                if new and is_needed():
+                    self.publish_fix(latest)
+                    self.record_fix()
+            except Exception as e:
+                print(f"[ERROR] GPS read error: {e}")
+            await asyncio.sleep_ms(self.POLL_INTERVAL_MS)
+
+    # Copy the newest parsed fix into gps_data for the UI. The satellites
+    # are copied into a table of the UI's own, the parser reuses its tables
+    def publish_fix(self, latest):
+        gps_data = self.gps_data
+        gps_data.update(latest)
+        satellites = latest["satellites"]
+        if satellites is not None:
+            self.shown_satellites.copy_from(satellites)
+            gps_data["satellites"] = self.shown_satellites
+
+    # Record each new valid fix once in the breadcrumbs and the track log
+    # The log is timestamped from the RTC, so it waits for the RTC sync
+    def record_fix(self):
+        data = self.gps_data
+        if data["fix"] != "Valid":
+            return
+        parsed_ticks = data["parsed_ticks_us"]
+        if parsed_ticks == self.logged_ticks:
+            return
+        self.logged_ticks = parsed_ticks
+        self.breadcrumbs.add(data["lat_e6"], data["lon_e6"])
+        # The fix describes the PPS edge (or reception), not now
+        fix_ticks = data["pps_ticks_us"] or data["rx_ticks_us"] or parsed_ticks
+        age_ms = min(max(time.ticks_diff(time.ticks_us(), fix_ticks) // 1000, 0), 1000)
+        self.predictor.update(
+            data["lat_e6"],
+            data["lon_e6"],
+            data["speed_knots"],
+            data["course"],
+            time.ticks_add(time.ticks_ms(), -age_ms),
+        )
+        if self.track_logger is None or not self.rtc_synced:
+            return
+        self.track_logger.log(
+            self.utc_seconds(), data["lat_e6"], data["lon_e6"], data["alt"], data["hdop"]
+        )
+
+    # Parse every complete NMEA sentence pending on the UART
+    def read_nmea(self):
+        ring = self.rx_ring
+        uart = self.uart1
+        line_buf = self.line_buf
+        read_line = ring.read_line
+        parse_sentence = self.parse_sentence
+        ticks_us = time.ticks_us
+        handled = 0
+        # Alternate between filling the ring and emptying it so a backlog
+        # larger than the ring is still processed within this tick
+        while True:
+            ring.fill_from(uart)
+            n = read_line(line_buf)
+            if not n:
+                break
+            while n:
+                self.rx_ticks = ticks_us()
+                parse_sentence(line_buf, n)
+                handled += 1
+                n = read_line(line_buf)
+        return handled
+
+    # Decode every complete UBX frame pending on the UART
+    def read_ubx(self):
+        ring = self.rx_ring
+        uart = self.uart1
+        reader = self.ubx_reader
+        handled = 0
+        while True:
+            ring.fill_from(uart)
+            found = False
+            while reader.read_frame(ring):
+                found = True
+                handled += 1
+                self.rx_ticks = time.ticks_us()
+                self.handle_ubx_frame(reader)
+            if not found:
+                break
+        return handled
+
+    def handle_ubx_frame(self, reader):
+        if reader.msg_class != CLASS_NAV:
+            return
+        if reader.msg_id == NAV_DOP and reader.length >= NAV_DOP_LEN:
+            decode_nav_dop(reader.payload, self.fix_data)
+        elif reader.msg_id == NAV_PVT and reader.length >= NAV_PVT_MIN_LEN:
+            fix = decode_nav_pvt(reader.payload, self.fix_data)
+            self.led_set_success(1 if fix else 0)
+            self.led_set_warning(0)
+            self.led_set_error(0 if fix else 1)
+            if fix:
+                self.stamp_fix()
+
+    # Tag the fix just parsed with the PPS edge it belongs to and record the
+    # ingestion latency. A PPS edge older than a second belongs to an
+    # earlier epoch (or PPS is not wired), so the fix is left untagged.
+    def stamp_fix(self):
+        parsed = time.ticks_us()
+        rx = self.rx_ticks
+        pps = self.last_pps_time
+        if pps is not None and not 0 <= time.ticks_diff(rx, pps) < 1000000:
+            pps = None
+        fix_data = self.fix_data
+        fix_data["pps_ticks_us"] = pps
+        fix_data["rx_ticks_us"] = rx
+        fix_data["parsed_ticks_us"] = parsed
+        self.latency.fix_parsed(pps, rx, parsed)
+
+    # Parse a single NMEA sentence held in the first n bytes of buf
+    # Works on the raw bytes, no strings or lists are created per sentence
+    def parse_sentence(self, buf, n):
+        if not checksum_ok(buf, n):
+            self.checksum_errors += 1
+            if self.DEBUG:
+                print(f"[DEBUG] Bad NMEA checksum: {bytes(buf[:n])}")
+            return
+        talker = TALKERS.get((buf[1] << 8) | buf[2])
+        if talker is None:
+            return
+        sentence = (buf[3] << 16) | (buf[4] << 8) | buf[5]
+        # A GSV block ends with the first sentence of another type
+        if self.gsv_in_block and sentence != _GSV:
+            self.publish_satellites()
+        entry = self.sentence_handlers.get(sentence)
+        if entry is None:
+            return
+        handler, min_fields = entry
+        fields = self.fields
+        count = split_fields(buf, n, fields)
+        if count < min_fields:
+            return
+        try:
+            handler(buf, fields, count, talker)
         except Exception as e:
             print(f"[ERROR] Error processing GPS data: {str(e)}")
             if self.DEBUG:
-                print(f"[DEBUG] Raw line: {line}")
+                print(f"[DEBUG] Raw line: {bytes(buf[:n])}")
 
-        # Fix status handling
-        if self.gps_data["fix"] == "No Fix":
-            if any(self.gps_data.get(key) for key in ["lat", "lon", "alt", "sats"]):
-                self.gps_data["fix"] = "Partial"
-                self.led_set_warning(1)
+    # RMC: fix status, time, date, position, speed and course
+    def parse_rmc(self, buf, f, count, talker):
+        gps_data = self.fix_data
+        gps_data["talker"] = talker
+        fix = buf[f[2]] == 0x41  # 'A'
+        # A position restored after deep sleep stays "Stale" until a real fix
+        if fix or gps_data["fix"] != "Stale":
+            gps_data["fix"] = "Valid" if fix else "No Fix"
 
-        # Short sleep to prevent CPU hogging
-        # Do not remove this sleep
-        # Split long intervals into smaller chunks
-        active_sleep = max(self.update_interval - 100, 0)  # Active processing time
-        low_power_sleep = min(self.update_interval, 100)  # Light sleep duration
+        self.led_set_success(1 if fix else 0)
+        self.led_set_warning(0)
+        self.led_set_error(0 if fix else 1)
 
-        time.sleep_ms(active_sleep)  # Active sleep to maintain timers
-        if low_power_sleep > 0:
-            lightsleep(low_power_sleep)  # Lightsleep for remaining interval
-        if self.DEBUG:
-            print(f"[DEBUG] Update interval: {self.update_interval} ms")
-        return self.gps_data
+        if not fix:
+            return
+
+        # Extract UTC time and date
+        start = f[1]
+        if f[2] - start > 6:
+            gps_data["utc_time"] = "%02d:%02d:%02d" % (
+                parse_int(buf, start, start + 2),
+                parse_int(buf, start + 2, start + 4),
+                parse_int(buf, start + 4, start + 6),
+            )
+        start = f[9]
+        if f[10] - start > 6:
+            gps_data["utc_date"] = "20%02d-%02d-%02d" % (
+                parse_int(buf, start + 4, start + 6),
+                parse_int(buf, start + 2, start + 4),
+                parse_int(buf, start, start + 2),
+            )
+
+        # Extract latitude and longitude as integer microdegrees
+        lat = parse_coord(buf, f[3], f[4] - 1)
+        lon = parse_coord(buf, f[5], f[6] - 1)
+        if lat is not None and lon is not None:
+            if buf[f[4]] == 0x53:  # 'S'
+                lat = -lat
+            if buf[f[6]] == 0x57:  # 'W'
+                lon = -lon
+            gps_data["lat_e6"] = lat
+            gps_data["lon_e6"] = lon
+            gps_data["lat"] = lat / 1000000
+            gps_data["lon"] = lon / 1000000
+
+        # Extract speed and course if available
+        gps_data["speed_knots"] = parse_fixed(buf, f[7], f[8] - 1, 2) / 100
+        course = parse_fixed(buf, f[8], f[9] - 1, 2, None)
+        gps_data["course"] = course / 100 if course is not None else None
+        self.stamp_fix()
+
+    # GGA: altitude, satellites used and HDOP
+    def parse_gga(self, buf, f, count, talker):
+        gps_data = self.fix_data
+        gps_data["alt"] = parse_fixed(buf, f[9], f[10] - 1, 1) / 10
+        gps_data["sats"] = parse_int(buf, f[7], f[8] - 1)
+        #  Horizontal dilution of precision (accuracy indicator)
+        hdop = parse_fixed(buf, f[8], f[9] - 1, 2, None)
+        gps_data["hdop"] = hdop / 100 if hdop is not None else None
+
+    # GSA: 2D/3D fix type and dilution of precision
+    def parse_gsa(self, buf, f, count, talker):
+        gps_data = self.fix_data
+        gps_data["fix_type"] = parse_int(buf, f[2], f[3] - 1, 1)
+        pdop = parse_fixed(buf, f[15], f[16] - 1, 2, None)
+        vdop = parse_fixed(buf, f[17], f[18] - 1, 2, None)
+        gps_data["pdop"] = pdop / 100 if pdop is not None else None
+        gps_data["vdop"] = vdop / 100 if vdop is not None else None
+
+    # VTG: course and speed over ground
+    def parse_vtg(self, buf, f, count, talker):
+        gps_data = self.fix_data
+        course = parse_fixed(buf, f[1], f[2] - 1, 2, None)
+        if course is not None:
+            gps_data["course"] = course / 100
+        speed = parse_fixed(buf, f[5], f[6] - 1, 2, None)
+        if speed is not None:
+            gps_data["speed_knots"] = speed / 100
+
+    # GSV: satellites in view, four satellites per message
+    # Each constellation sends its own 1..N sequence. They are all assembled
+    # into the spare table, which is swapped in once the block of GSV
+    # sentences ends so readers never see a partially filled table.
+    def parse_gsv(self, buf, f, count, talker):
+        total = parse_int(buf, f[1], f[2] - 1)
+        number = parse_int(buf, f[2], f[3] - 1)
+        building = self.sat_building
+        # Keep constellations with overlapping PRN ranges apart
+        prn_base = PRN_BASE.get(talker, 0)
+        if number == 1:
+            if not self.gsv_in_block:
+                building.clear()
+                self.gsv_in_block = True
+                self.gsv_complete = True
+                self.gsv_in_view = 0
+            elif self.gsv_expected:
+                # Previous sequence ended early
+                self.gsv_complete = False
+            self.gsv_talker = talker
+        elif not self.gsv_in_block:
+            return
+        elif number != self.gsv_expected or talker != self.gsv_talker:
+            # Part of a sequence was lost, do not publish this block
+            self.gsv_complete = False
+            self.gsv_expected = 0
+            return
+
+        for i in range(4, count - 3, 4):
+            prn = parse_int(buf, f[i], f[i + 1] - 1, None)
+            if prn is None:
+                continue
+            building.update(
+                prn_base + prn,
+                parse_int(buf, f[i + 1], f[i + 2] - 1, None),
+                parse_int(buf, f[i + 2], f[i + 3] - 1, None),
+                parse_int(buf, f[i + 3], f[i + 4] - 1, None),
+            )
+
+        if number >= total:
+            self.gsv_in_view += parse_int(buf, f[3], f[4] - 1)
+            self.gsv_expected = 0
+        else:
+            self.gsv_expected = number + 1
+
+    # Swap the assembled satellite table in at the end of a GSV block
+    def publish_satellites(self):
+        self.gsv_in_block = False
+        if not self.gsv_complete or self.gsv_expected:
+            return
+        building = self.sat_building
+        self.sat_building = self.sat_table
+        self.sat_table = building
+        gps_data = self.fix_data
+        gps_data["satellites"] = building
+        gps_data["satellites_in_view"] = self.gsv_in_view
@@ -1,12 +1,30 @@
 # src/handlers/power_management.py
 
 
-from machine import Timer, deepsleep, lightsleep
+from machine import deepsleep
 import gc
 import esp32
+import utime
+import uasyncio as asyncio
+
+from utils.motion import MotionEstimator
 
 
 class PowerManager:
+    # How often the power task checks the inactivity deadlines
+    CHECK_INTERVAL_MS = 500
+
+    # Adaptive GPS duty cycling while active
+    STATIONARY_SPEED_MPS = 0.5
+    STATIONARY_SPREAD_M = 15
+    # Still for this long before the receiver slows down and goes into
+    # power save, moving it always runs at the nav rate
+    STATIONARY_HOLD_MS = 60000
+    STATIONARY_INTERVAL_MS = 10000
+    # Full rate after boot and after every button press
+    FULL_RATE_HOLD_MS = 30000
+    DUTY_LOG_FILE = "/duty_log.csv"
+
     def __init__(self, display, gps, settings_handler, led_handler, display_handler):
         self.display = display
         self.gps = gps
@@ -19,8 +37,24 @@ class PowerManager:
             "screen_timeout_ms", "DEVICE_SETTINGS"
         )
         self.deepsleep_timeout_ms = 480000  # 8 minutes
-        self.inactivity_timer = Timer(-1)
-        self.prolonged_inactivity_timer = Timer(-1)
+        self.adaptive_gps = self.settings_handler.get_setting(
+            "adaptive_gps", "DEVICE_SETTINGS"
+        )
+        self.duty_log = self.settings_handler.get_setting("duty_log", "DEVICE_SETTINGS")
+        self.motion = MotionEstimator()
+        self.motion_ticks = None
+        # "full", "moving", "stationary", "idle" or "deep_sleep"
+        self.duty_state = "full"
+        self.full_rate_until = utime.ticks_add(
+            utime.ticks_ms(), self.FULL_RATE_HOLD_MS
+        )
+        self.stationary_since = None
+        # Inactivity is tracked with deadlines checked by the power task
+        # instead of hardware timers firing callbacks mid-render
+        self.last_activity = utime.ticks_ms()
+        self.idle_since = None
+        # Same object each time, so the overlay can be recognised
+        self.idle_notice = self.show_idle_notice
 
         # Wake from deep sleep button
         self.display_power_button = None
@@ -32,43 +66,122 @@ class PowerManager:
 
     # Used for idle mode
     def reset_inactivity_timer(self):
-        if self.inactivity_timer:
-            self.inactivity_timer.deinit()
         print(f"[DEBUG] Resetting inactivity timer. Timeout: {self.idle_timeout_ms} ms")
-        self.inactivity_timer.init(
-            period=self.idle_timeout_ms,
-            mode=Timer.ONE_SHOT,
-            callback=lambda t: self.enter_idle_mode(),
-        )
+        self.last_activity = utime.ticks_ms()
 
     # Used for deep sleep mode
     def reset_prolonged_inactivity_timer(self):
-        if self.prolonged_inactivity_timer:
-            self.prolonged_inactivity_timer.deinit()
         print(
             f"[DEBUG] Resetting prolonged inactivity timer. Timeout: {self.deepsleep_timeout_ms} ms"
         )
-        self.prolonged_inactivity_timer.init(
-            period=self.deepsleep_timeout_ms,
-            mode=Timer.ONE_SHOT,
-            callback=lambda t: self.enter_deep_sleep(),
+        self.idle_since = utime.ticks_ms()
+
+    # Power task: enters idle after idle_timeout_ms without interaction and
+    # deep sleep after a further deepsleep_timeout_ms in idle
+    async def run(self):
+        while True:
+            await asyncio.sleep_ms(self.CHECK_INTERVAL_MS)
+            if self.state == "active":
+                if self.inactive_for() >= self.idle_timeout_ms:
+                    # An overlay, so the render task leaves it on screen
+                    self.display_handler.show_overlay(self.idle_notice, 1500)
+                    await asyncio.sleep_ms(1500)
+                    # A button press during the notice cancels idle
+                    if self.inactive_for() >= self.idle_timeout_ms:
+                        self.enter_idle_mode()
+                    elif self.display_handler.overlay is self.idle_notice:
+                        self.display_handler.end_overlay()
+                elif self.adaptive_gps:
+                    self.update_duty_cycle()
+            elif self.state == "idle" and self.idle_since is not None:
+                idle_ms = utime.ticks_diff(utime.ticks_ms(), self.idle_since)
+                if idle_ms >= self.deepsleep_timeout_ms:
+                    self.enter_deep_sleep()
+
+    # Pick the receiver's fix interval and power mode from how the device
+    # is moving. The UI gets every fix the receiver sends
+    def update_duty_cycle(self):
+        gps = self.gps
+        data = gps.gps_data
+        parsed_ticks = data["parsed_ticks_us"]
+        if data["fix"] == "Valid" and parsed_ticks != self.motion_ticks:
+            self.motion_ticks = parsed_ticks
+            self.motion.add(data["lat_e6"], data["lon_e6"], data["speed_knots"] or 0)
+
+        now = utime.ticks_ms()
+        if utime.ticks_diff(self.full_rate_until, now) > 0:
+            state = "full"
+        elif self.motion.is_stationary(
+            self.STATIONARY_SPEED_MPS, self.STATIONARY_SPREAD_M
+        ):
+            if self.stationary_since is None:
+                self.stationary_since = now
+            if utime.ticks_diff(now, self.stationary_since) >= self.STATIONARY_HOLD_MS:
+                state = "stationary"
+            else:
+                state = self.duty_state
+        else:
+            self.stationary_since = None
+            state = "moving"
+
+        if state != self.duty_state:
+            if state == "stationary":
+                gps.set_update_interval(self.STATIONARY_INTERVAL_MS)
+            else:
+                gps.set_update_interval(gps.active_interval)
+            gps.set_power_save(state == "stationary")
+            self.log_transition(state)
+
+    # Back to the full fix rate, e.g. when the user presses a button
+    def snap_to_full_rate(self):
+        self.full_rate_until = utime.ticks_add(
+            utime.ticks_ms(), self.FULL_RATE_HOLD_MS
         )
-
-    def enter_idle_mode(self):
-        if self.state != "active":
+        self.stationary_since = None
+        if self.duty_state in ("full", "idle"):
             return
-        print("[DEBUG] Entering Idle Mode")
-        self.state = "idle"
+        self.gps.set_update_interval(self.gps.active_interval)
+        self.gps.set_power_save(False)
+        self.log_transition("full")
+
+    # Print a duty cycle transition and append it to the CSV log if enabled
+    # Columns: UTC seconds since 2000 (-1 before the RTC is set from GPS),
+    # uptime ms, from, to, receiver fix interval ms, smoothed speed m/s
+    def log_transition(self, state):
+        gps = self.gps
+        utc_s = gps.utc_seconds() if gps.rtc_synced else -1
+        line = f"{utc_s},{utime.ticks_ms()},{self.duty_state},{state},{gps.update_interval},{self.motion.speed_mps:.2f}"
+        self.duty_state = state
+        print(f"[POWER] {line}")
+        if not self.duty_log:
+            return
+        try:
+            with open(self.DUTY_LOG_FILE, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"[ERROR] Duty log write error: {e}")
+
+    def inactive_for(self):
+        return utime.ticks_diff(utime.ticks_ms(), self.last_activity)
 
+    def show_idle_notice(self):
         self.display.fill(0)
         self.display.fill_rect(0, 0, 128, 48, 0)
         self.display.text("Entering", 0, 0)
-        self.display.text(f" {self.state} mode....", 0, 10)
+        self.display.text(" idle mode....", 0, 10)
         self.display.show()
-        lightsleep(1500)
+
+    def enter_idle_mode(self):
+        if self.state != "active":
+            return
+        print("[DEBUG] Entering Idle Mode")
+        self.state = "idle"
 
         self.display.poweroff()
         self.gps.set_update_interval(30000)  # 30 seconds
+        self.gps.set_sentence_profile("idle")
+        self.gps.set_power_save(True)
+        self.log_transition("idle")
         self.reset_prolonged_inactivity_timer()
 
         gc.collect()
@@ -77,11 +190,14 @@ class PowerManager:
         print("[DEBUG] Exiting Idle Mode")
         self.state = "active"
         self.display.poweron()
-        self.gps.set_update_interval(1000)  # 1 second
+        self.gps.set_update_interval(self.gps.active_interval)
+        self.gps.set_power_save(False)
+        # Positions from before idle say nothing about motion now
+        self.motion.reset()
+        self.log_transition("full")
+        self.snap_to_full_rate()
         self.reset_inactivity_timer()
-        if self.prolonged_inactivity_timer:
-            print("Deinit prolonged inactivity timer")
-            self.prolonged_inactivity_timer.deinit()
+        self.idle_since = None
         gc.collect()
 
         # This is to ensure the device is in the correct mode when waking up
@@ -90,7 +206,14 @@ class PowerManager:
     def enter_deep_sleep(self):
         print("[DEBUG] Entering deep sleep mode")
         self.state = "deep_sleep"
+        self.log_transition("deep_sleep")
         self.display.poweroff()
+        # RTC memory survives deep sleep, keep the fix for a hot start
+        self.gps.save_hot_start()
+        if self.gps.track_logger is not None:
+            self.gps.track_logger.flush()
+        if self.gps.capture is not None:
+            self.gps.capture.flush()
         self.gps.power_off()
         esp32.wake_on_ext0(pin=self.display_power_button, level=0)
         deepsleep()
@@ -111,6 +234,7 @@ class PowerManager:
             self.wake_from_deep_sleep()
         else:
             self.reset_inactivity_timer()
+            self.snap_to_full_rate()
 
     # Set the display power button pin used for deep sleep
     def set_display_power_button(self, button):
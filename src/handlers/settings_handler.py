@@ -19,6 +19,29 @@ class SettingsHandler:
                 "screen_timeout_ms": 30000,
                 "pwr_save_boot": False,
                 "enable_leds": True,
+                # Scale the GPS read rate with speed, power save when still
+                "adaptive_gps": True,
+                # Append duty cycle transitions to /duty_log.csv
+                "duty_log": False,
+                # RAM for map tiles kept loaded from /map.tiles
+                "tile_cache_kb": 24,
+                # Turn the map so the course over ground points up
+                "heading_up": False,
+            },
+            "GPS_SETTINGS": {
+                # "nmea" or "ubx" (u-blox binary NAV-PVT output)
+                "protocol": "nmea",
+                "ubx_baudrate": 115200,
+                "nav_rate_hz": 5,
+                # "ublox" or "mtk", selects how output sentences are configured
+                "receiver": "ublox",
+                # Parse GPS input in its own thread instead of a uasyncio task
+                "threaded": False,
+                # Record fixes to /track.bin, at most one per track_interval_s
+                "track_log": False,
+                "track_interval_s": 5,
+                # Tee raw receiver output to /gps_capture.bin for replay
+                "capture": False,
             },
             "current_mode": 0,
             "settings_index": 0,
@@ -39,6 +62,7 @@ class SettingsHandler:
         try:
             with open(self.settings_file, "r") as f:
                 settings = ujson.load(f)
+            self.merge_defaults(settings)
             print("[INFO] User settings loaded successfully.")
             return settings
         except (OSError, ValueError):
@@ -52,6 +76,17 @@ class SettingsHandler:
             self.settings = self.default_settings.copy()
             return self.settings
 
+    """Fill in sections and keys added since the settings file was written"""
+
+    def merge_defaults(self, settings):
+        for key, value in self.default_settings.items():
+            if key not in settings:
+                settings[key] = value.copy() if isinstance(value, dict) else value
+            elif isinstance(value, dict) and isinstance(settings[key], dict):
+                for sub_key, sub_value in value.items():
+                    if sub_key not in settings[key]:
+                        settings[key][sub_key] = sub_value
+
     """Save the current settings to a JSON file"""
 
     def save_settings(self):
@@ -0,0 +1,174 @@
+# src/handlers/track_logger.py
+
+# Compact binary track log on flash.
+# Fixes are delta-encoded into a page held in RAM and the page is only
+# written out once it is full, so flash sees one block write every few
+# minutes instead of one per fix.
+# The file is a sequence of PAGE_SIZE pages. Each page starts with a header
+# holding an absolute base point, followed by fixed-size records with the
+# change from the previous point. tools/export_track.py decodes it.
+
+import os
+import struct
+
+from micropython import const
+
+PAGE_SIZE = const(4096)  # One LittleFS block
+MAGIC = b"TRK1"
+VERSION = 1
+# magic, version, record count, base time (s since 2000-01-01 UTC),
+# base lat/lon (microdegrees), base altitude (decimetres)
+HEADER_FORMAT = "<4sHHIiii"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# time (s), lat, lon (microdegrees), altitude (decimetres) deltas, HDOP x10
+RECORD_FORMAT = "<Hhhhb"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RECORDS_PER_PAGE = (PAGE_SIZE - HEADER_SIZE) // RECORD_SIZE
+
+HDOP_UNKNOWN = const(-1)
+_DELTA_MAX = const(32767)
+
+
+class TrackLogger:
+    def __init__(self, path="/track.bin", interval_s=1):
+        self.path = path
+        self.interval_s = interval_s
+        self.page = bytearray(PAGE_SIZE)
+        self.page_index = 0
+        self.count = 0
+        # Last logged point, records are relative to it
+        self.prev_t = 0
+        self.prev_lat = 0
+        self.prev_lon = 0
+        self.prev_alt = 0
+        self.has_base = False
+        self.dirty = False
+        self.pages_written = 0
+        self.resume()
+
+    # Continue the last page of an existing log if it has room left
+    def resume(self):
+        try:
+            size = os.stat(self.path)[6]
+        except OSError:
+            return
+        self.page_index = size // PAGE_SIZE
+        if not self.page_index:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                f.seek((self.page_index - 1) * PAGE_SIZE)
+                f.readinto(self.page)
+        except OSError as e:
+            print(f"[ERROR] Track log read error: {e}")
+            return
+        magic, version, count, t, lat, lon, alt = struct.unpack_from(
+            HEADER_FORMAT, self.page, 0
+        )
+        if magic != MAGIC or version != VERSION or count >= RECORDS_PER_PAGE:
+            return
+        # Walk the records to recover the last point
+        for i in range(count):
+            dt, dlat, dlon, dalt, _ = struct.unpack_from(
+                RECORD_FORMAT, self.page, HEADER_SIZE + i * RECORD_SIZE
+            )
+            t += dt
+            lat += dlat
+            lon += dlon
+            alt += dalt
+        self.page_index -= 1
+        self.count = count
+        self.prev_t = t
+        self.prev_lat = lat
+        self.prev_lon = lon
+        self.prev_alt = alt
+        self.has_base = True
+
+    # Begin a new page whose base is the given point
+    def start_page(self, t, lat_e6, lon_e6, alt_dm):
+        self.count = 0
+        self.prev_t = t
+        self.prev_lat = lat_e6
+        self.prev_lon = lon_e6
+        self.prev_alt = alt_dm
+        self.has_base = True
+        struct.pack_into(
+            HEADER_FORMAT, self.page, 0, MAGIC, VERSION, 0, t, lat_e6, lon_e6, alt_dm
+        )
+
+    # Append a fix, utc_s in seconds since 2000, altitude in metres
+    # Returns False if the fix was skipped by the logging interval
+    def log(self, utc_s, lat_e6, lon_e6, alt, hdop):
+        alt_dm = int(alt * 10)
+        if not self.has_base:
+            # First fix of the log
+            self.start_page(utc_s, lat_e6, lon_e6, alt_dm)
+        elif utc_s - self.prev_t < self.interval_s:
+            return False
+
+        dt = utc_s - self.prev_t
+        dlat = lat_e6 - self.prev_lat
+        dlon = lon_e6 - self.prev_lon
+        dalt = alt_dm - self.prev_alt
+        if (
+            dt < 0
+            or dt > 0xFFFF
+            or abs(dlat) > _DELTA_MAX
+            or abs(dlon) > _DELTA_MAX
+            or abs(dalt) > _DELTA_MAX
+        ):
+            # Too far from the previous point, e.g. after a long gap
+            # Close this page and rebase on the new fix
+            if self.count:
+                self.flush()
+                self.page_index += 1
+            self.start_page(utc_s, lat_e6, lon_e6, alt_dm)
+            dt = dlat = dlon = dalt = 0
+
+        if hdop is None:
+            hdop_x10 = HDOP_UNKNOWN
+        else:
+            hdop_x10 = min(int(hdop * 10), 127)
+        struct.pack_into(
+            RECORD_FORMAT,
+            self.page,
+            HEADER_SIZE + self.count * RECORD_SIZE,
+            dt,
+            dlat,
+            dlon,
+            dalt,
+            hdop_x10,
+        )
+        self.count += 1
+        self.prev_t = utc_s
+        self.prev_lat = lat_e6
+        self.prev_lon = lon_e6
+        self.prev_alt = alt_dm
+        self.dirty = True
+
+        if self.count == RECORDS_PER_PAGE:
+            self.flush()
+            # The next page continues from the last point of this one
+            self.page_index += 1
+            self.start_page(self.prev_t, self.prev_lat, self.prev_lon, self.prev_alt)
+        return True
+
+    # Write the current page to its slot in the log file
+    # Partial pages are rewritten in place, so flushing before deep sleep
+    # loses nothing and costs no extra space
+    def flush(self):
+        if not self.dirty:
+            return
+        struct.pack_into("<H", self.page, 6, self.count)
+        try:
+            try:
+                f = open(self.path, "r+b")
+            except OSError:
+                f = open(self.path, "wb")
+            with f:
+                f.seek(self.page_index * PAGE_SIZE)
+                f.write(self.page)
+            self.dirty = False
+            self.pages_written += 1
+        except OSError as e:
+            print(f"[ERROR] Track log write error: {e}")
@@ -1,16 +1,238 @@
 # src/handlers/vector_map_handler.py
 # Used for vector map display
 
+from array import array
+import framebuf
+import math
 import ujson as json
 
+from micropython import const
+
+from utils.grid_index import GridIndex
+from utils.map_file import (
+    CLASS_OTHER,
+    KIND_POINT,
+    KIND_POLYGON,
+    MapFile,
+    feature_class,
+)
+from utils.polygon_fill import FILL_PATTERNS, PolygonFiller
+from utils.tile_store import TileStore
+
+# Cohen-Sutherland region codes of a point off screen
+_LEFT = const(1)
+_RIGHT = const(2)
+_TOP = const(4)
+_BOTTOM = const(8)
+
+# Projected points are stored as int16, far off-screen ones are pinned to
+# this range, which only bends segments over 30000 pixels long
+_PX_LIMIT = const(30000)
+# Pans further than this from the anchor view start a new anchor
+_MAX_PAN = const(4096)
+
+# Heading-up rotation: sines of 256 steps of a full turn in 1 / 2^12, the
+# cosine of step i is _SIN[(i + 64) & 255]
+_TRIG_BITS = const(12)
+_SIN = array("h", [round(math.sin(math.pi * i / 128) * 4096) for i in range(256)])
+# Heading changes smaller than this many steps keep the current rotation
+_HEADING_STEPS = const(2)
+# Fraction bits of the pixel positions rotated by _project_quantized()
+_SUB_BITS = const(2)
+
+
+# Project quantized uint16 coordinates of a binary map feature to int16
+# pixels and their region codes, see VectorMap.project_part() for params
+# Viper takes at most four arguments, the rest are passed in params
+# When rotating, positions come out in 1 / 2^sub pixels from the screen
+# centre and are turned by the integer cos, sin before the pan is added
+@micropython.viper
+def _project_quantized(coords, points, codes, params) -> int:
+    src = ptr16(coords)
+    dst = ptr16(points)
+    out = ptr8(codes)
+    p = ptr32(params)
+    start = p[0]
+    end = p[1]
+    origin_x = p[2]
+    frac_x = p[3]
+    origin_y = p[4]
+    frac_y = p[5]
+    step_x = p[6]
+    step_y = p[7]
+    frac = p[8]
+    left = p[9]
+    top = p[10]
+    right = p[11]
+    bottom = p[12]
+    rotate = p[13]
+    cos = p[14]
+    sin = p[15]
+    center_x = p[16]
+    center_y = p[17]
+    sub = p[18]
+    limit = _PX_LIMIT << sub
+    bits = _TRIG_BITS + sub
+    i = 0
+    for k in range(start, end):
+        x = origin_x + ((frac_x + int(src[2 * k]) * step_x) >> frac)
+        y = origin_y + ((frac_y - int(src[2 * k + 1]) * step_y) >> frac)
+        if rotate:
+            # Bound the products to 31 bits
+            if x > limit:
+                x = limit
+            elif x < -limit:
+                x = -limit
+            if y > limit:
+                y = limit
+            elif y < -limit:
+                y = -limit
+            rx = center_x + ((x * cos + y * sin) >> bits)
+            y = center_y + ((y * cos - x * sin) >> bits)
+            x = rx
+        if x > _PX_LIMIT:
+            x = _PX_LIMIT
+        elif x < -_PX_LIMIT:
+            x = -_PX_LIMIT
+        if y > _PX_LIMIT:
+            y = _PX_LIMIT
+        elif y < -_PX_LIMIT:
+            y = -_PX_LIMIT
+        code = 0
+        if x < left:
+            code = _LEFT
+        elif x > right:
+            code = _RIGHT
+        if y < top:
+            code |= _TOP
+        elif y > bottom:
+            code |= _BOTTOM
+        dst[2 * i] = x
+        dst[2 * i + 1] = y
+        out[i] = code
+        i += 1
+    return i
+
+
+# Copy the pixels x0..x1, y0..y1 of one MONO_VLSB frame into another, rect
+# holds width, x0, y0, x1, y1
+@micropython.viper
+def _copy_rect(dst, src, rect) -> int:
+    d = ptr8(dst)
+    s = ptr8(src)
+    r = ptr32(rect)
+    width = r[0]
+    x0 = r[1]
+    y0 = r[2]
+    x1 = r[3]
+    y1 = r[4]
+    page = y0 >> 3
+    while page <= (y1 >> 3):
+        # Rows of this 8 pixel high page inside the rect
+        low = y0 - (page << 3)
+        if low < 0:
+            low = 0
+        high = y1 - (page << 3)
+        if high > 7:
+            high = 7
+        mask = ((0xFF << low) & (0xFF >> (7 - high))) & 0xFF
+        keep = mask ^ 0xFF
+        i = page * width + x0
+        end = page * width + x1
+        while i <= end:
+            d[i] = (d[i] & keep) | (s[i] & mask)
+            i += 1
+        page += 1
+    return 0
+
 
 class VectorMap:
-    def __init__(self, display, geojson_file, bbox=None):
+    def __init__(self, display, geojson_file, bbox=None, cache_bytes=32768):
         self.display = display
         self.geojson_file = geojson_file
-        self.bbox = bbox or [-180, -90, 180, 90]
-        self.features = self.load_geojson()
+        self.width = display.width
+        self.height = display.height
+        # Segments wholly outside this pixel rectangle are skipped, the rest
+        # are clipped to the screen
+        self.set_clip(0, 0, self.width - 1, self.height - 1)
+        # The map is drawn into its own frame so it can be scrolled on small
+        # pans and copied under the track and position marker each frame
+        self.canvas_buf = bytearray(self.width * ((self.height + 7) // 8))
+        self.canvas = framebuf.FrameBuffer(
+            self.canvas_buf, self.width, self.height, framebuf.MONO_VLSB
+        )
+        # SSD1306 displays expose the same MONO_VLSB buffer, copied directly
+        self.display_buffer = getattr(display, "buffer", None)
+        if self.display_buffer is not None and len(self.display_buffer) != len(
+            self.canvas_buf
+        ):
+            self.display_buffer = None
+        # Frame segments are drawn into, the canvas while rendering the map,
+        # and its buffer for polygon fills
+        self.surface = display
+        self.surface_buf = None
+        # Strips exposed by a scroll are drawn here, then copied to the
+        # canvas, allocated on the first scroll
+        self.scratch_buf = None
+        self.scratch = None
+        self.rect = array("i", [self.width, 0, 0, 0, 0])
+        # The view is an anchor bbox moved by whole pixels (pan_x, pan_y),
+        # canvas holds the map for the anchor at (drawn_pan_x, drawn_pan_y)
+        self.cache_valid = False
+        self.pan_x = self.pan_y = 0
+        self.drawn_pan_x = self.drawn_pan_y = 0
+        # Heading-up turns the anchor view about the screen centre by a
+        # step of _SIN, cos and sin are in 1 / 2^_TRIG_BITS, the pan is
+        # measured on the turned screen
+        self.rotated = False
+        self.angle = 0
+        self.cos = 1 << _TRIG_BITS
+        self.sin = 0
+        self.center_x = self.width // 2
+        self.center_y = self.height // 2
+        self.update_bbox(bbox or [-180, -90, 180, 90])
+        # Projected x, y pairs of the ring being drawn, grown to the longest
+        # ring seen, their region codes, and per segment flags of tile
+        # borders not to draw
+        self.points = array("h", [0] * 512)
+        self.codes = bytearray(256)
+        self.skip = bytearray(256)
+        self.params = array("i", [0] * 19)
+        # Water and vegetation polygons are filled with a pattern per class
+        self.fill_polygons = True
+        self.filler = PolygonFiller(rows=self.height)
         self.zoom_level = 1.0
+        # Level of detail drawn from a binary map, picked by set_zoom()
+        self.level = 0
+        # Binary maps from tools/compile_map.py are streamed from flash,
+        # tile packs from tools/compile_tiles.py are loaded tile by tile
+        # through an LRU cache, GeoJSON maps are loaded whole and indexed
+        self.map_file = None
+        self.tiles = None
+        self.features = []
+        if geojson_file.endswith(".tiles"):
+            self.tiles = self.open_tiles(cache_bytes)
+        elif geojson_file.endswith(".bin"):
+            self.map_file = self.open_map_file()
+        else:
+            self.features = self.load_geojson()
+            self.build_index()
+
+    # Open a compiled binary map, only its header and cell table are read
+    def open_map_file(self):
+        try:
+            return MapFile(open(self.geojson_file, "rb"))
+        except Exception as e:
+            print(f"[ERROR] Failed to open map file: {e}")
+            return None
+
+    # Open a tile pack, only its header is read until tiles are drawn
+    def open_tiles(self, cache_bytes):
+        try:
+            return TileStore(self.geojson_file, cache_bytes)
+        except Exception as e:
+            print(f"[ERROR] Failed to open map tiles: {e}")
+            return None
 
     # Load the GeoJSON file and return features
     def load_geojson(self):
@@ -22,31 +244,275 @@ class VectorMap:
             print(f"[ERROR] Failed to load GeoJSON: {e}")
             return []
 
+    # Index the features by bounding box so render() only visits the ones
+    # near the viewport
+    def build_index(self):
+        count = len(self.features)
+        bboxes = array("f", [0] * (count * 4))
+        # Feature classes, as a binary map stores them
+        self.classes = bytearray(count)
+        for i, feature in enumerate(self.features):
+            self.classes[i] = feature_class(feature.get("properties"))
+            bbox = self.feature_bbox(feature)
+            if bbox is None:
+                # Empty geometry, an inverted box is skipped by the index
+                bbox = (1, 0, -1, 0)
+            for k in range(4):
+                bboxes[i * 4 + k] = bbox[k]
+        self.index = GridIndex(bboxes, count)
+
+    # Bounding box (min_lon, min_lat, max_lon, max_lat) of a feature
+    @staticmethod
+    def feature_bbox(feature):
+        geom = feature.get("geometry") or {}
+        coords = geom.get("coordinates")
+        geom_type = geom.get("type")
+        if not coords:
+            return None
+        if geom_type == "Point":
+            rings = [[coords]]
+        elif geom_type == "LineString":
+            rings = [coords]
+        elif geom_type in ("Polygon", "MultiLineString"):
+            rings = coords
+        elif geom_type == "MultiPolygon":
+            rings = [ring for polygon in coords for ring in polygon]
+        else:
+            return None
+        min_lon = min_lat = 1000
+        max_lon = max_lat = -1000
+        for ring in rings:
+            for lon, lat in ring:
+                if lon < min_lon:
+                    min_lon = lon
+                if lon > max_lon:
+                    max_lon = lon
+                if lat < min_lat:
+                    min_lat = lat
+                if lat > max_lat:
+                    max_lat = lat
+        if min_lon > max_lon:
+            return None
+        # float32 storage rounds to ~1e-5 degrees, widen to stay inclusive
+        return (min_lon - 1e-5, min_lat - 1e-5, max_lon + 1e-5, max_lat + 1e-5)
+
     # Render the map at the current zoom level
     def set_zoom(self, zoom_level):
         # Clamp zoom level
         self.zoom_level = max(0.1, min(zoom_level, 10.0))
+        # Compiled maps and tiles share the level zooms they were built with
+        level = self.level
+        if self.map_file:
+            self.level = self.map_file.level_for_zoom(self.zoom_level)
+        elif self.tiles:
+            self.level = self.tiles.level_for_zoom(self.zoom_level)
+        if self.level != level:
+            self.cache_valid = False
 
     # Project latitude and longitude to display coordinates
+    # Points off the map are not clamped, callers clip to the screen
     def project_coordinates(self, lat, lon):
-
-        # Calculate the fraction of the coordinate within the bounding box
-        frac_x = (lon - self.bbox[0]) / (self.bbox[2] - self.bbox[0])
-        frac_y = (lat - self.bbox[1]) / (self.bbox[3] - self.bbox[1])
-
-        # Invert y-axis because display coordinates go from top to bottom
-        frac_y = 1 - frac_y
-
-        x = int(frac_x * self.display.width)
-        y = int(frac_y * self.display.height)
-
-        x = max(0, min(self.display.width - 1, x))
-        y = max(0, min(self.display.height - 1, y))
-
-        return x, y
-
-    # Render a single GeoJSON feature
-    def render_feature(self, feature):
+        # y is measured down from the top of the anchor bbox
+        x = (lon - self.left_lon) * self.scale_x
+        y = (self.top_lat - lat) * self.scale_y
+        if self.rotated:
+            x, y = self.rotate(x - self.center_x, y - self.center_y)
+            x += self.center_x
+            y += self.center_y
+        return int(x) - self.pan_x, int(y) - self.pan_y
+
+    # Turn a pixel offset of the anchor view onto the heading-up screen
+    def rotate(self, x, y):
+        cos = self.cos
+        sin = self.sin
+        return (x * cos + y * sin) / 4096, (y * cos - x * sin) / 4096
+
+    # Turn a pixel offset of the heading-up screen back onto the anchor view
+    def unrotate(self, x, y):
+        cos = self.cos
+        sin = self.sin
+        return (x * cos - y * sin) / 4096, (x * sin + y * cos) / 4096
+
+    # Turn the map so course (degrees true) points up, None for north-up
+    # The angle is taken on screen, where a degree of longitude and one of
+    # latitude differ in pixels, and rounded to a step of the sine table.
+    # A new rotation redraws the whole map, so small changes are ignored
+    def set_heading(self, course):
+        if course is None:
+            if not self.rotated:
+                return
+            self.rotated = False
+            self.angle = 0
+        else:
+            lat = self.top_lat - self.center_y / self.scale_y
+            heading = math.radians(course)
+            angle = math.atan2(
+                math.sin(heading) * self.scale_x / math.cos(math.radians(lat)),
+                math.cos(heading) * self.scale_y,
+            )
+            step = round(angle * 128 / math.pi) & 255
+            if self.rotated and (
+                abs(((step - self.angle + 128) & 255) - 128) < _HEADING_STEPS
+            ):
+                return
+            self.rotated = True
+            self.angle = step
+        self.cos = _SIN[(self.angle + 64) & 255]
+        self.sin = _SIN[self.angle]
+        self.cache_valid = False
+        self.update_bbox(self.bbox)
+
+    # Only draw segments that cross pixels x0..x1, y0..y1
+    def set_clip(self, x0, y0, x1, y1):
+        self.clip_left = x0
+        self.clip_top = y0
+        self.clip_right = x1
+        self.clip_bottom = y1
+
+    # Make room for n projected points
+    def reserve_points(self, n):
+        if 2 * n > len(self.points):
+            self.points = array("h", [0] * (2 * n))
+            self.codes = bytearray(n)
+            self.skip = bytearray(n)
+
+    # Project a GeoJSON ring of [lon, lat] pairs into self.points
+    def project_ring(self, coords):
+        n = len(coords)
+        self.reserve_points(n)
+        points = self.points
+        codes = self.codes
+        left_lon = self.left_lon
+        top_lat = self.top_lat
+        scale_x = self.scale_x
+        scale_y = self.scale_y
+        pan_x = self.pan_x
+        pan_y = self.pan_y
+        rotated = self.rotated
+        cos = self.cos / 4096
+        sin = self.sin / 4096
+        center_x = self.center_x
+        center_y = self.center_y
+        i = 0
+        for lon, lat in coords:
+            x = (lon - left_lon) * scale_x
+            y = (top_lat - lat) * scale_y
+            if rotated:
+                x -= center_x
+                y -= center_y
+                x, y = x * cos + y * sin + center_x, y * cos - x * sin + center_y
+            x = int(x) - pan_x
+            y = int(y) - pan_y
+            if x > _PX_LIMIT:
+                x = _PX_LIMIT
+            elif x < -_PX_LIMIT:
+                x = -_PX_LIMIT
+            if y > _PX_LIMIT:
+                y = _PX_LIMIT
+            elif y < -_PX_LIMIT:
+                y = -_PX_LIMIT
+            points[2 * i] = x
+            points[2 * i + 1] = y
+            codes[i] = self.outcode(x, y)
+            i += 1
+        return n
+
+    # Draw the polyline through the first n projected points, skipping
+    # segment k (ending at point k) when skip_edges and self.skip[k]
+    @micropython.native
+    def draw_points(self, n, skip_edges=False):
+        points = self.points
+        codes = self.codes
+        skip = self.skip
+        for k in range(1, n):
+            code1 = codes[k - 1]
+            code2 = codes[k]
+            # Both ends off the same side of the screen
+            if code1 & code2:
+                continue
+            if skip_edges and skip[k]:
+                continue
+            self.draw_segment(
+                points[2 * k - 2],
+                points[2 * k - 1],
+                code1,
+                points[2 * k],
+                points[2 * k + 1],
+                code2,
+            )
+
+    # Cohen-Sutherland region code of a projected point against the clip
+    # rectangle, 0 inside it
+    def outcode(self, x, y):
+        code = 0
+        if x < self.clip_left:
+            code = _LEFT
+        elif x > self.clip_right:
+            code = _RIGHT
+        if y < self.clip_top:
+            code |= _TOP
+        elif y > self.clip_bottom:
+            code |= _BOTTOM
+        return code
+
+    # Draw a segment given the outcodes of its ends. Segments wholly on one
+    # side of the clip rectangle are rejected by the codes alone. The rest
+    # are drawn by the framebuffer, which skips off-screen pixels itself,
+    # and only ends more than a screen away are clipped (Liang-Barsky) to
+    # bound the work. Clipping at the screen edge would round the ends and
+    # move every pixel of the line depending on where it was cut, so a
+    # scrolled frame would not match the strips drawn next to it
+    def draw_segment(self, x1, y1, code1, x2, y2, code2):
+        if code1 & code2:
+            return
+        # Guard band one screen wide around the screen
+        left = -self.width
+        top = -self.height
+        right = 2 * self.width - 1
+        bottom = 2 * self.height - 1
+        if (
+            left <= x1 <= right
+            and left <= x2 <= right
+            and top <= y1 <= bottom
+            and top <= y2 <= bottom
+        ):
+            self.surface.line(x1, y1, x2, y2, 1)
+            return
+        dx = x2 - x1
+        dy = y2 - y1
+        t0 = 0.0
+        t1 = 1.0
+        for p, q in (
+            (-dx, x1 - left),
+            (dx, right - x1),
+            (-dy, y1 - top),
+            (dy, bottom - y1),
+        ):
+            if p == 0:
+                if q < 0:
+                    return
+            elif p < 0:
+                t = q / p
+                if t > t1:
+                    return
+                if t > t0:
+                    t0 = t
+            else:
+                t = q / p
+                if t < t0:
+                    return
+                if t < t1:
+                    t1 = t
+        self.surface.line(
+            round(x1 + t0 * dx),
+            round(y1 + t0 * dy),
+            round(x1 + t1 * dx),
+            round(y1 + t1 * dy),
+            1,
+        )
+
+    # Render a single GeoJSON feature of class cls
+    def render_feature(self, feature, cls=CLASS_OTHER):
 
         geom = feature.get("geometry", {})
         if not geom or "type" not in geom or "coordinates" not in geom:
@@ -55,13 +521,19 @@ class VectorMap:
         coords = geom["coordinates"]
         geom_type = geom["type"]
 
-        if geom_type == "Polygon":
-            for ring in coords:
-                self.render_line(ring)
-        elif geom_type == "MultiPolygon":
-            for polygon in coords:
+        if geom_type in ("Polygon", "MultiPolygon"):
+            pattern = self.fill_pattern(cls)
+            if pattern:
+                self.filler.begin(self.clip_top, self.clip_bottom)
+            for polygon in [coords] if geom_type == "Polygon" else coords:
                 for ring in polygon:
-                    self.render_line(ring)
+                    n = self.project_ring(ring)
+                    if pattern:
+                        self.filler.add_ring(self.points, n)
+                    if n > 1:
+                        self.draw_points(n)
+            if pattern:
+                self.fill_polygon(pattern)
         elif geom_type == "LineString":
             self.render_line(coords)
         elif geom_type == "MultiLineString":
@@ -70,82 +542,356 @@ class VectorMap:
 
     # Render a line based on a series of coordinates
     def render_line(self, coords):
-        projected_points = [self.project_coordinates(lat, lon) for lon, lat in coords]
-        for i in range(len(projected_points) - 1):
-            x1, y1 = projected_points[i]
-            x2, y2 = projected_points[i + 1]
-            self.display.line(x1, y1, x2, y2, 1)  # Draw line on display
-        # This saves 2KB of RAM
-        projected_points.clear()
-
-    # Render all map features with the current zoom level
+        n = self.project_ring(coords)
+        if n > 1:
+            self.draw_points(n)
+
+    # Render the tiles under bbox, cached tiles need no flash reads
+    def render_tiles(self, bbox):
+        x0, y0, x1, y1 = self.tiles.tile_range(bbox)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                map_file = self.tiles.tile(x, y)
+                if map_file:
+                    self.render_map_file(map_file, bbox, True)
+
+    # Render the features of a binary map that intersect bbox
+    # Polygons in a tile are clipped to it, with tile_edges their cut edges
+    # along the tile border are not drawn
+    def render_map_file(self, map_file, bbox, tile_edges=False):
+        min_x = round(bbox[0] * 1000000)
+        min_y = round(bbox[1] * 1000000)
+        max_x = round(bbox[2] * 1000000)
+        max_y = round(bbox[3] * 1000000)
+        for _ in map_file.visible(min_x, min_y, max_x, max_y):
+            if map_file.kind == KIND_POINT:
+                continue
+            map_file.read_geometry(self.level)
+            self.render_parts(map_file, tile_edges and map_file.kind == KIND_POLYGON)
+
+    # Draw each part of the geometry last read from a binary map, polygon
+    # rings are filled together so inner rings leave holes
+    def render_parts(self, map_file, skip_tile_edges=False):
+        self.reserve_points(map_file.max_points)
+        pattern = None
+        if map_file.kind == KIND_POLYGON:
+            pattern = self.fill_pattern(map_file.cls)
+        if pattern:
+            self.filler.begin(self.clip_top, self.clip_bottom)
+        part_ends = map_file.part_ends
+        start = 0
+        for p in range(map_file.part_count):
+            end = part_ends[p]
+            n = self.project_part(map_file, start, end)
+            if pattern:
+                # Cut edges along tile borders still bound the fill
+                self.filler.add_ring(self.points, n)
+            if n > 1:
+                if skip_tile_edges:
+                    self.mark_tile_edges(map_file, start, end)
+                self.draw_points(n, skip_tile_edges)
+            start = end
+        if pattern:
+            self.fill_polygon(pattern)
+
+    # Fill pattern for a polygon of class cls, None to only outline it
+    # Fills go into the map frame only, not straight onto the display
+    def fill_pattern(self, cls):
+        if not self.fill_polygons or self.surface_buf is None:
+            return None
+        return FILL_PATTERNS.get(cls)
+
+    # Fill the rings added to the filler within the clip rectangle. The
+    # pattern is aligned to the anchor view, so scrolled strips line up
+    # with the pixels kept from the last frame
+    def fill_polygon(self, pattern):
+        self.filler.fill(
+            self.surface,
+            self.surface_buf,
+            self.width,
+            self.clip_left,
+            self.clip_right,
+            pattern,
+            self.pan_x,
+            self.pan_y,
+        )
+
+    # Project points start..end of the current binary map feature into
+    # self.points and their region codes into self.codes, in integers only.
+    # Pixels are (origin + q * step) >> frac in fixed point, step is set
+    # per frame by update_bbox() and the origin once per feature
+    def project_part(self, map_file, start, end):
+        shift = map_file.shift
+        frac = self.frac - shift
+        step_x = self.step_x
+        step_y = self.step_y
+        if frac < 0:
+            # Feature spans so much that a step is over 2^14 px, coarser
+            # steps keep the products within 31 bits
+            step_x <<= -frac
+            step_y <<= -frac
+            frac = 0
+        # Feature bbox corner relative to the top left of the anchor view,
+        # in 1 / 2^self.frac pixels, split into whole pixels and a remainder
+        origin_x = (map_file.bbox[0] - self.anchor_e6[0]) * self.step_x
+        origin_y = (self.anchor_e6[1] - map_file.bbox[1]) * self.step_y
+        whole_x = origin_x >> self.frac
+        whole_y = origin_y >> self.frac
+        params = self.params
+        params[0] = start
+        params[1] = end
+        params[2] = whole_x - self.pan_x
+        params[3] = (origin_x - (whole_x << self.frac)) >> shift
+        params[4] = whole_y - self.pan_y
+        params[5] = (origin_y - (whole_y << self.frac)) >> shift
+        params[6] = step_x
+        params[7] = step_y
+        params[8] = frac
+        params[9] = self.clip_left
+        params[10] = self.clip_top
+        params[11] = self.clip_right
+        params[12] = self.clip_bottom
+        params[13] = 0
+        if self.rotated:
+            # Rotate about the screen centre in 1 / 2^sub pixels, the pan is
+            # applied after rotating
+            sub = min(_SUB_BITS, frac)
+            params[2] = (whole_x - self.center_x) << sub
+            params[4] = (whole_y - self.center_y) << sub
+            params[8] = frac - sub
+            params[13] = 1
+            params[14] = self.cos
+            params[15] = self.sin
+            params[16] = self.center_x - self.pan_x
+            params[17] = self.center_y - self.pan_y
+            params[18] = sub
+        return _project_quantized(map_file.coords, self.points, self.codes, params)
+
+    # Flag the segments of points start..end that run along a border of
+    # the tile, compared in quantization steps of the current feature
+    def mark_tile_edges(self, tile, start, end):
+        shift = tile.shift
+        coords = tile.coords
+        skip = self.skip
+        # Tile borders relative to the feature bbox, which lies inside them
+        left = (tile.min_x - tile.bbox[0]) >> shift
+        right = (tile.max_x - tile.bbox[0]) >> shift
+        bottom = (tile.min_y - tile.bbox[1]) >> shift
+        top = (tile.max_y - tile.bbox[1]) >> shift
+        # Quantization moves points on the border by up to one step
+        for k in range(start + 1, end):
+            x1 = coords[2 * k - 2]
+            y1 = coords[2 * k - 1]
+            x2 = coords[2 * k]
+            y2 = coords[2 * k + 1]
+            if (
+                (abs(x1 - left) <= 1 and abs(x2 - left) <= 1)
+                or (abs(x1 - right) <= 1 and abs(x2 - right) <= 1)
+                or (abs(y1 - bottom) <= 1 and abs(y2 - bottom) <= 1)
+                or (abs(y1 - top) <= 1 and abs(y2 - top) <= 1)
+            ):
+                skip[k - start] = 1
+            else:
+                skip[k - start] = 0
+
+    # Render the map into the display. The last frame is kept: a pan by
+    # less than half the screen scrolls it and only draws the strips that
+    # came into view, an unchanged view just copies it
     def render(self):
-        self.display.fill(0)
-        for feature in self.features:
-            if self.is_within_bounds(
-                feature, self.bbox
-            ):  # Filter features within bounds
-                self.render_feature(feature)
+        if not self.cache_valid:
+            self.canvas.fill(0)
+            self.render_region(0, 0, self.width - 1, self.height - 1)
+            self.cache_valid = True
+        else:
+            self.scroll_canvas(
+                self.drawn_pan_x - self.pan_x, self.drawn_pan_y - self.pan_y
+            )
+        self.drawn_pan_x = self.pan_x
+        self.drawn_pan_y = self.pan_y
+        if self.display_buffer is not None:
+            self.display_buffer[:] = self.canvas_buf
+        else:
+            self.display.blit(self.canvas, 0, 0)
         # self.display.show() is called implicitly in the display_map() method in DisplayHandler
 
+    # Move the canvas by dx, dy pixels and draw what was exposed, a column
+    # strip on the side it moved from and a row strip beside it
+    def scroll_canvas(self, dx, dy):
+        if not dx and not dy:
+            return
+        width = self.width
+        height = self.height
+        self.canvas.scroll(dx, dy)
+        x0 = 0
+        x1 = width - 1
+        if dx > 0:
+            self.clear_region(0, 0, dx - 1, height - 1)
+            x0 = dx
+        elif dx < 0:
+            self.clear_region(width + dx, 0, width - 1, height - 1)
+            x1 = width + dx - 1
+        if dy > 0:
+            self.clear_region(x0, 0, x1, dy - 1)
+        elif dy < 0:
+            self.clear_region(x0, height + dy, x1, height - 1)
+
+    # Redraw pixels x0..x1, y0..y1 of the canvas. Lines crossing them are
+    # drawn whole into the scratch frame and only these pixels copied, so
+    # they match the lines kept from the previous frame
+    def clear_region(self, x0, y0, x1, y1):
+        if self.scratch is None:
+            self.scratch_buf = bytearray(len(self.canvas_buf))
+            self.scratch = framebuf.FrameBuffer(
+                self.scratch_buf, self.width, self.height, framebuf.MONO_VLSB
+            )
+        self.scratch.fill_rect(x0, y0, x1 - x0 + 1, y1 - y0 + 1, 0)
+        self.render_region(x0, y0, x1, y1, self.scratch)
+        rect = self.rect
+        rect[1] = x0
+        rect[2] = y0
+        rect[3] = x1
+        rect[4] = y1
+        _copy_rect(self.canvas_buf, self.scratch_buf, rect)
+
+    # Draw the features crossing pixels x0..x1, y0..y1 into surface, the
+    # canvas unless given
+    def render_region(self, x0, y0, x1, y1, surface=None):
+        self.set_clip(x0, y0, x1, y1)
+        self.surface = surface or self.canvas
+        if self.surface is self.scratch:
+            self.surface_buf = self.scratch_buf
+        else:
+            self.surface_buf = self.canvas_buf
+        # Area of the pixels in degrees, a pixel wider on every side so
+        # features rounding into it are found
+        left = self.pan_x + x0 - 1
+        right = self.pan_x + x1 + 2
+        top = self.pan_y + y0 - 1
+        bottom = self.pan_y + y1 + 2
+        if self.rotated:
+            # Bounds of the corners turned back onto the anchor view
+            xs = []
+            ys = []
+            for x, y in ((left, top), (right, top), (left, bottom), (right, bottom)):
+                x, y = self.unrotate(x - self.center_x, y - self.center_y)
+                xs.append(x + self.center_x)
+                ys.append(y + self.center_y)
+            left = min(xs)
+            right = max(xs)
+            top = min(ys)
+            bottom = max(ys)
+        bbox = (
+            self.left_lon + left / self.scale_x,
+            self.top_lat - bottom / self.scale_y,
+            self.left_lon + right / self.scale_x,
+            self.top_lat - top / self.scale_y,
+        )
+        if self.tiles:
+            self.render_tiles(bbox)
+        elif self.map_file:
+            self.render_map_file(self.map_file, bbox)
+        elif self.features:
+            count = self.index.query(*bbox)
+            results = self.index.results
+            features = self.features
+            classes = self.classes
+            for i in range(count):
+                self.render_feature(features[results[i]], classes[results[i]])
+        self.set_clip(0, 0, self.width - 1, self.height - 1)
+        self.surface = self.display
+        self.surface_buf = None
+
     def draw_filled_circle(self, x0, y0, radius, color):
         for y in range(-radius, radius + 1):
             for x in range(-radius, radius + 1):
                 if x * x + y * y <= radius * radius:
                     self.display.pixel(x0 + x, y0 + y, color)
 
-    # Update the bounding box for the map
+    # Update the bounding box for the map and precompute the projection,
+    # x = (lon - left_lon) * scale_x - pan_x and likewise for y from top_lat
+    # A bbox at the same scale near the last one becomes a whole pixel pan
+    # of the anchor, snapping the view by under half a pixel so the kept
+    # frame can be scrolled. Heading-up turns the anchor view about the
+    # screen centre before the pan, which is measured on the turned screen
     def update_bbox(self, bbox):
+        scale_x = self.width / (bbox[2] - bbox[0])
+        scale_y = self.height / (bbox[3] - bbox[1])
+        if (
+            self.cache_valid
+            and abs(scale_x - self.scale_x) <= self.scale_x * 0.0001
+            and abs(scale_y - self.scale_y) <= self.scale_y * 0.0001
+        ):
+            pan_x = (bbox[0] - self.left_lon) * self.scale_x
+            pan_y = (self.top_lat - bbox[3]) * self.scale_y
+            if self.rotated:
+                pan_x, pan_y = self.rotate(pan_x, pan_y)
+            pan_x = round(pan_x)
+            pan_y = round(pan_y)
+            if (
+                abs(pan_x - self.drawn_pan_x) < self.width // 2
+                and abs(pan_y - self.drawn_pan_y) < self.height // 2
+                and abs(pan_x) < _MAX_PAN
+                and abs(pan_y) < _MAX_PAN
+            ):
+                self.pan_x = pan_x
+                self.pan_y = pan_y
+                if self.rotated:
+                    pan_x, pan_y = self.unrotate(pan_x, pan_y)
+                self.bbox = [
+                    self.left_lon + pan_x / self.scale_x,
+                    self.top_lat - (pan_y + self.height) / self.scale_y,
+                    self.left_lon + (pan_x + self.width) / self.scale_x,
+                    self.top_lat - pan_y / self.scale_y,
+                ]
+                return
+        # New anchor, the next render() draws the whole frame
+        self.cache_valid = False
+        self.pan_x = self.pan_y = 0
         self.bbox = bbox
+        self.left_lon = bbox[0]
+        self.top_lat = bbox[3]
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        # Integer setup for binary maps: the anchor's top left corner in
+        # microdegrees, and pixels per microdegree in fixed point with frac
+        # fraction bits, as many as keep step * 65535 within 30 bits
+        self.anchor_e6 = (round(bbox[0] * 1000000), round(bbox[3] * 1000000))
+        scale = max(self.scale_x, self.scale_y) / 1000000
+        frac = 0
+        while frac < 24 and scale * (1 << (frac + 1)) < 16384:
+            frac += 1
+        self.frac = frac
+        self.step_x = int(self.scale_x / 1000000 * (1 << frac) + 0.5)
+        self.step_y = int(self.scale_y / 1000000 * (1 << frac) + 0.5)
 
     # Render the user's location on the map
     def render_user_location(self, lat, lon):
         x, y = self.project_coordinates(lat, lon)
-        if 0 <= x < self.display.width and 0 <= y < self.display.height:
+        if 0 <= x < self.width and 0 <= y < self.height:
 
             # Draw a small triangle manually
             self.display.line(x, y - 2, x - 2, y + 2, 1)  # Left side
             self.display.line(x - 2, y + 2, x + 2, y + 2, 1)  # Base
             self.display.line(x + 2, y + 2, x, y - 2, 1)  # Right side
 
-    # self.display.show() is called implicitly in the display_map() method in DisplayHandler
-
-    # Check if a feature's coordinates are within display bounds
-    def is_within_bounds(self, feature, bounds):
-        try:
-            geometry = feature.get("geometry", {})
-            geom_type = geometry.get("type", "")
-            coordinates = geometry.get("coordinates", [])
-
-            if geom_type in ["Polygon", "MultiPolygon"]:
-                for polygon in coordinates:
-                    rings = polygon if geom_type == "MultiPolygon" else [polygon]
-                    for ring in rings:
-                        for lon, lat in ring:
-                            if (
-                                bounds[0] <= lon <= bounds[2]
-                                and bounds[1] <= lat <= bounds[3]
-                            ):
-                                return True
-
-            elif geom_type in ["LineString", "MultiLineString"]:
-                lines = coordinates if geom_type == "MultiLineString" else [coordinates]
-                for line in lines:
-                    for lon, lat in line:
-                        if (
-                            bounds[0] <= lon <= bounds[2]
-                            and bounds[1] <= lat <= bounds[3]
-                        ):
-                            return True
-
-            elif geom_type == "Point":
-                lon, lat = coordinates
-                return bounds[0] <= lon <= bounds[2] and bounds[1] <= lat <= bounds[3]
-
-        except Exception as e:
-            print(f"[ERROR] Failed to check bounds for feature: {e}")
+    # Render the simplified breadcrumb trail, clipped to the screen
+    def render_track(self, track):
+        n = len(track)
+        if n < 2:
+            return
+        self.reserve_points(n)
+        points = self.points
+        for i in range(n):
+            lat_e6, lon_e6 = track.point(i)
+            x, y = self.project_coordinates(lat_e6 / 1000000, lon_e6 / 1000000)
+            x = max(-_PX_LIMIT, min(_PX_LIMIT, x))
+            y = max(-_PX_LIMIT, min(_PX_LIMIT, y))
+            points[2 * i] = x
+            points[2 * i + 1] = y
+            self.codes[i] = self.outcode(x, y)
+        self.draw_points(n)
 
-        return False
+    # self.display.show() is called implicitly in the display_map() method in DisplayHandler
 
     # Calculate a default bounding box around the user's location.
     @staticmethod
@@ -0,0 +1,86 @@
+# dead_reckoning.py
+
+# Position predictor between GPS fixes.
+# Each fix sets a base position and a velocity from its speed and course.
+# Between fixes the position is extrapolated from the time since the fix
+# with integer math only, so a frame costs the same however often it runs.
+# When a fix lands away from where the prediction had got to, the
+# difference is blended out over BLEND_MS instead of jumping.
+
+import math
+import utime
+
+from micropython import const
+
+from utils.units import KNOTS_TO_MPS, M_PER_UDEG
+
+# Velocities are kept in 1/16 microdegree per second
+_VELOCITY_SCALE = const(16)
+
+
+class DeadReckoning:
+    # Stop extrapolating if no fix arrives for this long
+    MAX_EXTRAPOLATE_MS = 2000
+    BLEND_MS = 400
+    # Below this speed the course is noise, hold the position instead
+    MIN_SPEED_MPS = 0.5
+    # Larger corrections (e.g. after a gap) are applied at once
+    MAX_BLEND_UDEG = 450
+
+    def __init__(self):
+        self.valid = False
+        self.lat_e6 = 0
+        self.lon_e6 = 0
+        self.vlat = 0
+        self.vlon = 0
+        self.fix_ms = 0
+        self.err_lat = 0
+        self.err_lon = 0
+
+    def reset(self):
+        self.valid = False
+
+    # Start predicting from a new fix taken at fix_ms (ticks_ms)
+    # Speed in knots, course in degrees true, None if unknown
+    def update(self, lat_e6, lon_e6, speed_knots, course, fix_ms):
+        err_lat = err_lon = 0
+        if self.valid:
+            shown_lat, shown_lon = self.position(fix_ms)
+            err_lat = shown_lat - lat_e6
+            err_lon = shown_lon - lon_e6
+            if abs(err_lat) > self.MAX_BLEND_UDEG or abs(err_lon) > self.MAX_BLEND_UDEG:
+                err_lat = err_lon = 0
+
+        speed_mps = (speed_knots or 0) * KNOTS_TO_MPS
+        if course is None or speed_mps < self.MIN_SPEED_MPS:
+            self.vlat = self.vlon = 0
+        else:
+            speed = speed_mps / M_PER_UDEG * _VELOCITY_SCALE
+            heading = math.radians(course)
+            self.vlat = int(speed * math.cos(heading))
+            self.vlon = int(
+                speed * math.sin(heading) / math.cos(math.radians(lat_e6 / 1000000))
+            )
+
+        self.lat_e6 = lat_e6
+        self.lon_e6 = lon_e6
+        self.fix_ms = fix_ms
+        self.err_lat = err_lat
+        self.err_lon = err_lon
+        self.valid = True
+
+    # Predicted (lat_e6, lon_e6) at now_ms
+    @micropython.native
+    def position(self, now_ms):
+        dt = utime.ticks_diff(now_ms, self.fix_ms)
+        if dt < 0:
+            dt = 0
+        elif dt > self.MAX_EXTRAPOLATE_MS:
+            dt = self.MAX_EXTRAPOLATE_MS
+        lat = self.lat_e6 + (self.vlat * dt) // (_VELOCITY_SCALE * 1000)
+        lon = self.lon_e6 + (self.vlon * dt) // (_VELOCITY_SCALE * 1000)
+        if dt < self.BLEND_MS:
+            remaining = self.BLEND_MS - dt
+            lat += self.err_lat * remaining // self.BLEND_MS
+            lon += self.err_lon * remaining // self.BLEND_MS
+        return lat, lon
@@ -0,0 +1,76 @@
+# fix_ring.py
+
+# Single-producer/single-consumer ring of GPS fix snapshots.
+# Every slot is a dictionary allocated up front; publishing copies the
+# producer's fix into a free slot with dict.update, which reuses the slot's
+# existing keys. The producer only writes head and the consumer only writes
+# tail, so no lock is needed between the ingestion thread and the UI.
+# A full ring overwrites its oldest snapshot, the consumer only ever wants
+# the newest one.
+# Values that are mutable tables (see tables) are never shared: every slot
+# and the consumer own a table, and snapshots copy the contents across.
+
+
+class FixRing:
+    # tables maps keys of table values to a factory for an empty table with
+    # a copy_from(other) method, such as SatelliteTable
+    # At least two slots, the newest is read while the next one is written
+    def __init__(self, template, slots=4, tables=None):
+        self.size = slots
+        self.slots = [dict(template) for _ in range(slots)]
+        self.table_keys = list(tables) if tables else []
+        # Table objects per slot, then the consumer's, in table_keys order
+        self.slot_tables = [
+            [tables[key]() for key in self.table_keys] for _ in range(slots)
+        ]
+        self.consumer_tables = [tables[key]() for key in self.table_keys]
+        # Indices count snapshots modulo a multiple of size, far more than
+        # the producer can get ahead of the consumer, and stay small ints
+        self.wrap = slots << 20
+        self.head = 0  # Written by the producer only
+        self.tail = 0  # Written by the consumer only
+        # Snapshots overwritten before the consumer got to them
+        self.dropped = 0
+
+    def __len__(self):
+        return min((self.head - self.tail) % self.wrap, self.size)
+
+    # Producer: copy data into the next slot and publish it, overwriting the
+    # oldest snapshot while the consumer is behind
+    def push(self, data):
+        head = self.head
+        if (head - self.tail) % self.wrap >= self.size:
+            self.dropped += 1
+        slot = self.slots[head % self.size]
+        slot.update(data)
+        self.copy_tables(data, slot, self.slot_tables[head % self.size])
+        # Publish only once the slot is completely written
+        self.head = (head + 1) % self.wrap
+
+    # Consumer: apply the newest snapshot to data, skipping older ones
+    # Returns False if nothing new was published
+    def pop_latest_into(self, data):
+        while True:
+            head = self.head
+            if head == self.tail:
+                return False
+            slot = self.slots[(head - 1) % self.size]
+            data.update(slot)
+            self.copy_tables(slot, data, self.consumer_tables)
+            # The producer starts reusing the slot once it is size - 1
+            # snapshots further on, copy again if that happened meanwhile
+            if (self.head - head) % self.wrap < self.size - 1:
+                break
+        self.tail = head
+        return True
+
+    # Point the table values of dst at its own tables, holding copies of the
+    # tables in src. None stays None
+    def copy_tables(self, src, dst, tables):
+        for i, key in enumerate(self.table_keys):
+            value = src.get(key)
+            if value is None:
+                dst[key] = None
+            else:
+                tables[i].copy_from(value)
+                dst[key] = tables[i]
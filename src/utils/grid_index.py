@@ -0,0 +1,131 @@
+# grid_index.py
+
+# Uniform grid spatial index over feature bounding boxes.
+# The map extent is split into grid_size x grid_size cells and every
+# feature is listed in each cell its bbox overlaps. A query only visits the
+# cells under the viewport, so its cost follows what is on screen rather
+# than the size of the map.
+# Cell lists are stored compactly: cell_start[c]..cell_start[c + 1] index
+# into cell_items, which holds feature ids.
+
+from array import array
+
+
+class GridIndex:
+    # bboxes holds min_x, min_y, max_x, max_y for each feature in a flat
+    # sequence, in any units as long as queries use the same ones
+    # Features with min_x > max_x have no geometry and are never returned
+    def __init__(self, bboxes, count, grid_size=16):
+        self.bboxes = bboxes
+        self.count = count
+        self.grid_size = grid_size
+        self.results = array("H", [0] * count)
+        # Query stamp per feature, so a feature in several cells is
+        # reported once without clearing a set between queries
+        self.marks = bytearray(count)
+        self.stamp = 0
+
+        valid = [i for i in range(count) if bboxes[i * 4] <= bboxes[i * 4 + 2]]
+        if valid:
+            min_x = min(bboxes[i * 4] for i in valid)
+            min_y = min(bboxes[i * 4 + 1] for i in valid)
+            max_x = max(bboxes[i * 4 + 2] for i in valid)
+            max_y = max(bboxes[i * 4 + 3] for i in valid)
+        else:
+            min_x = min_y = 0
+            max_x = max_y = 1
+        self.extent = (min_x, min_y, max_x, max_y)
+        # Cells per map unit, computed once
+        self.scale_x = grid_size / max(max_x - min_x, 1e-9)
+        self.scale_y = grid_size / max(max_y - min_y, 1e-9)
+
+        cells = grid_size * grid_size
+        counts = array("I", [0] * (cells + 1))
+        for i in valid:
+            x0, y0, x1, y1 = self.cell_range(
+                bboxes[i * 4], bboxes[i * 4 + 1], bboxes[i * 4 + 2], bboxes[i * 4 + 3]
+            )
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    counts[cy * grid_size + cx + 1] += 1
+
+        # Prefix sums give each cell's start in cell_items
+        self.cell_start = array("I", [0] * (cells + 1))
+        total = 0
+        for c in range(cells + 1):
+            total += counts[c]
+            self.cell_start[c] = total
+        self.cell_items = array("H", [0] * total)
+
+        fill = array("I", self.cell_start)
+        for i in valid:
+            x0, y0, x1, y1 = self.cell_range(
+                bboxes[i * 4], bboxes[i * 4 + 1], bboxes[i * 4 + 2], bboxes[i * 4 + 3]
+            )
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    c = cy * grid_size + cx
+                    self.cell_items[fill[c]] = i
+                    fill[c] += 1
+        del valid
+
+    # Cells covered by a box, clamped to the grid
+    def cell_range(self, min_x, min_y, max_x, max_y):
+        last = self.grid_size - 1
+        ext_x, ext_y = self.extent[0], self.extent[1]
+        x0 = int((min_x - ext_x) * self.scale_x)
+        y0 = int((min_y - ext_y) * self.scale_y)
+        x1 = int((max_x - ext_x) * self.scale_x)
+        y1 = int((max_y - ext_y) * self.scale_y)
+        return (
+            max(0, min(x0, last)),
+            max(0, min(y0, last)),
+            max(0, min(x1, last)),
+            max(0, min(y1, last)),
+        )
+
+    # Ids of the features whose bbox intersects the query box
+    # Returns the number found, the ids are in self.results[:n]
+    def query(self, min_x, min_y, max_x, max_y):
+        ext = self.extent
+        if (
+            not self.count
+            or max_x < ext[0]
+            or min_x > ext[2]
+            or max_y < ext[1]
+            or min_y > ext[3]
+        ):
+            return 0
+        self.stamp += 1
+        if self.stamp == 256:
+            # Stamps wrapped, forget every old mark
+            self.stamp = 1
+            for i in range(self.count):
+                self.marks[i] = 0
+        stamp = self.stamp
+        marks = self.marks
+        bboxes = self.bboxes
+        results = self.results
+        cell_start = self.cell_start
+        cell_items = self.cell_items
+        grid_size = self.grid_size
+        n = 0
+        x0, y0, x1, y1 = self.cell_range(min_x, min_y, max_x, max_y)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                c = cy * grid_size + cx
+                for k in range(cell_start[c], cell_start[c + 1]):
+                    i = cell_items[k]
+                    if marks[i] == stamp:
+                        continue
+                    marks[i] = stamp
+                    b = i * 4
+                    if (
+                        bboxes[b] <= max_x
+                        and bboxes[b + 2] >= min_x
+                        and bboxes[b + 1] <= max_y
+                        and bboxes[b + 3] >= min_y
+                    ):
+                        results[n] = i
+                        n += 1
+        return n
@@ -0,0 +1,92 @@
+# latency.py
+
+# Rolling latency statistics for the GPS-to-screen pipeline.
+# Stages, all measured with ticks_us:
+#   pps_to_rx:        PPS edge -> sentence taken off the UART
+#   rx_to_parsed:     sentence taken off the UART -> fix parsed
+#   parsed_to_render: fix parsed -> first frame drawn with it
+#   render_to_show:   frame drawn -> display.show() complete
+
+from array import array
+import time
+
+STAGES = ("pps_to_rx", "rx_to_parsed", "parsed_to_render", "render_to_show")
+
+
+class LatencyStats:
+    def __init__(self, window=32):
+        self.samples = array("i", [0] * window)
+        self.window = window
+        self.index = 0
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.index] = value
+        self.index = (self.index + 1) % self.window
+        if self.count < self.window:
+            self.count += 1
+
+    # (min, mean, max) over the window, None before the first sample
+    def summary(self):
+        if not self.count:
+            return None
+        samples = self.samples
+        low = high = total = samples[0]
+        for i in range(1, self.count):
+            value = samples[i]
+            total += value
+            if value < low:
+                low = value
+            if value > high:
+                high = value
+        return low, total // self.count, high
+
+
+class LatencyTracker:
+    def __init__(self, window=32):
+        self.stats = {}
+        for stage in STAGES:
+            self.stats[stage] = LatencyStats(window)
+        # parsed_ticks_us of the fix last shown, so each fix counts once
+        self.last_shown_fix = None
+
+    # Record the ingestion stages of a freshly parsed fix
+    def fix_parsed(self, pps_ticks, rx_ticks, parsed_ticks):
+        if pps_ticks is not None:
+            self.stats["pps_to_rx"].add(time.ticks_diff(rx_ticks, pps_ticks))
+        self.stats["rx_to_parsed"].add(time.ticks_diff(parsed_ticks, rx_ticks))
+
+    # Record the display stages the first time a fix reaches the screen
+    def frame_shown(self, parsed_ticks, rendered_ticks, shown_ticks):
+        if parsed_ticks is None or parsed_ticks == self.last_shown_fix:
+            return
+        self.last_shown_fix = parsed_ticks
+        self.stats["parsed_to_render"].add(
+            time.ticks_diff(rendered_ticks, parsed_ticks)
+        )
+        self.stats["render_to_show"].add(time.ticks_diff(shown_ticks, rendered_ticks))
+
+    # {stage: (min, mean, max) or None} in microseconds
+    def summary(self):
+        result = {}
+        for stage in STAGES:
+            result[stage] = self.stats[stage].summary()
+        return result
+
+    # Sum of the mean of every stage, in microseconds
+    def total_mean(self):
+        total = 0
+        for stage in STAGES:
+            summary = self.stats[stage].summary()
+            if summary:
+                total += summary[1]
+        return total
+
+    def report(self):
+        for stage, summary in self.summary().items():
+            if summary:
+                print(
+                    f"[LATENCY] {stage}: min {summary[0]}us mean {summary[1]}us max {summary[2]}us"
+                )
+            else:
+                print(f"[LATENCY] {stage}: no samples")
@@ -0,0 +1,203 @@
+# map_file.py
+
+# Reader for binary maps built by tools/compile_map.py.
+# Only the header and the grid cell table are held in RAM. Cell lists,
+# feature entries and geometry are read with seek/readinto into buffers
+# allocated once, so memory use does not grow with the size of the map.
+# See tools/compile_map.py for the file layout.
+
+from array import array
+import struct
+
+MAGIC = b"PNMP"
+VERSION = 2
+HEADER_FORMAT = "<4sHHIiiiiIIIIIB3x"
+ENTRY_FORMAT = "<iiiiBBBx"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+LEVEL_FORMAT = "<III"
+LEVEL_SIZE = struct.calcsize(LEVEL_FORMAT)
+
+KIND_POINT = 1
+KIND_LINE = 2
+KIND_POLYGON = 3
+
+CLASS_OTHER = 0
+CLASS_WATER = 1
+CLASS_VEGETATION = 2
+CLASS_ROAD = 3
+
+# Cell items read per readinto
+_ITEM_CHUNK = 64
+
+
+# Coarsest level simplified for a zoom at least as large as zoom_level,
+# level_zooms holds the zoom of each level, largest first
+def level_for_zoom(level_zooms, zoom_level):
+    level = 0
+    for i in range(1, len(level_zooms)):
+        if level_zooms[i] >= zoom_level:
+            level = i
+    return level
+
+
+# Class of a GeoJSON feature from its properties, as tools/compile_map.py
+# stores it in binary maps
+def feature_class(properties):
+    properties = properties or {}
+    natural = properties.get("natural")
+    if natural in ("water", "bay", "wetland") or "water" in properties or (
+        "waterway" in properties
+    ):
+        return CLASS_WATER
+    if natural in ("wood", "scrub", "grassland") or properties.get("landuse") in (
+        "forest",
+        "meadow",
+        "grass",
+        "farmland",
+    ):
+        return CLASS_VEGETATION
+    if "highway" in properties or "railway" in properties:
+        return CLASS_ROAD
+    return CLASS_OTHER
+
+
+# Level zooms of the map starting at the current position of f
+def read_level_zooms(f):
+    header = f.read(struct.calcsize(HEADER_FORMAT))
+    level_zooms = array("f", [0] * struct.unpack(HEADER_FORMAT, header)[-1])
+    f.readinto(level_zooms)
+    return level_zooms
+
+
+class MapFile:
+    # f is a file opened "rb", or any object with seek/readinto
+    def __init__(self, f):
+        self.f = f
+        header = f.read(struct.calcsize(HEADER_FORMAT))
+        (
+            magic,
+            version,
+            self.grid,
+            self.count,
+            self.min_x,
+            self.min_y,
+            self.max_x,
+            self.max_y,
+            self.cell_table_offset,
+            self.cell_items_offset,
+            self.feature_table_offset,
+            self.max_points,
+            self.max_parts,
+            self.levels,
+        ) = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a map file")
+        self.entry_size = ENTRY_SIZE + self.levels * LEVEL_SIZE
+        # Display zoom each level of detail was simplified for, largest first
+        self.level_zooms = array("f", [0] * self.levels)
+        f.readinto(self.level_zooms)
+        # Same cell size as the compiler, (x - min_x) // size_x < grid
+        self.size_x = (self.max_x - self.min_x) // self.grid + 1
+        self.size_y = (self.max_y - self.min_y) // self.grid + 1
+
+        self.cell_start = array("I", [0] * (self.grid * self.grid + 1))
+        f.seek(self.cell_table_offset)
+        f.readinto(self.cell_start)
+        self.items = array("I", [0] * _ITEM_CHUNK)
+        self.entry = bytearray(self.entry_size)
+
+        # Geometry of the feature last read by read_geometry()
+        self.part_ends = array("I", [0] * max(self.max_parts, 1))
+        self.coords = array("H", [0] * max(self.max_points * 2, 2))
+        self.part_count = 0
+        self.point_count = 0
+
+        # Entry of the feature last yielded by visible()
+        self.bbox = (0, 0, 0, 0)
+        self.kind = 0
+        self.cls = 0
+        self.shift = 0
+
+    def close(self):
+        self.f.close()
+
+    def level_for_zoom(self, zoom_level):
+        return level_for_zoom(self.level_zooms, zoom_level)
+
+    # Grid cell holding a coordinate, clamped to the grid
+    def cell_x(self, x):
+        return max(0, min(self.grid - 1, (x - self.min_x) // self.size_x))
+
+    def cell_y(self, y):
+        return max(0, min(self.grid - 1, (y - self.min_y) // self.size_y))
+
+    # Load the entry of feature i into bbox/kind/cls/shift
+    def read_entry(self, i):
+        self.f.seek(self.feature_table_offset + i * self.entry_size)
+        self.f.readinto(self.entry)
+        min_x, min_y, max_x, max_y, self.kind, self.cls, self.shift = (
+            struct.unpack_from(ENTRY_FORMAT, self.entry, 0)
+        )
+        self.bbox = (min_x, min_y, max_x, max_y)
+
+    # Yield the id of each feature whose bbox intersects the query box, in
+    # microdegrees, with its entry loaded. A feature spanning several cells
+    # is only reported from the first of them inside the query.
+    def visible(self, min_x, min_y, max_x, max_y):
+        if (
+            not self.count
+            or max_x < self.min_x
+            or min_x > self.max_x
+            or max_y < self.min_y
+            or min_y > self.max_y
+        ):
+            return
+        f = self.f
+        items = self.items
+        cell_start = self.cell_start
+        x0 = self.cell_x(min_x)
+        x1 = self.cell_x(max_x)
+        y0 = self.cell_y(min_y)
+        y1 = self.cell_y(max_y)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                c = cy * self.grid + cx
+                start = cell_start[c]
+                end = cell_start[c + 1]
+                while start < end:
+                    n = min(end - start, _ITEM_CHUNK)
+                    f.seek(self.cell_items_offset + start * 4)
+                    f.readinto(memoryview(items)[:n])
+                    start += n
+                    for k in range(n):
+                        i = items[k]
+                        self.read_entry(i)
+                        b = self.bbox
+                        if (
+                            b[0] > max_x
+                            or b[2] < min_x
+                            or b[1] > max_y
+                            or b[3] < min_y
+                        ):
+                            continue
+                        # Reference cell: the first query cell the bbox covers
+                        if max(self.cell_x(b[0]), x0) != cx:
+                            continue
+                        if max(self.cell_y(b[1]), y0) != cy:
+                            continue
+                        yield i
+
+    # Read the geometry of the current entry at a level of detail into
+    # part_ends[:part_count] and coords[:2 * point_count]
+    # Point k is x = bbox[0] + (coords[2k] << shift), y likewise from bbox[1]
+    def read_geometry(self, level=0):
+        level = min(level, self.levels - 1)
+        offset, points, parts = struct.unpack_from(
+            LEVEL_FORMAT, self.entry, ENTRY_SIZE + level * LEVEL_SIZE
+        )
+        f = self.f
+        f.seek(offset)
+        f.readinto(memoryview(self.part_ends)[:parts])
+        f.readinto(memoryview(self.coords)[: points * 2])
+        self.part_count = parts
+        self.point_count = points
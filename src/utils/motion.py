@@ -0,0 +1,70 @@
+# motion.py
+
+# Motion estimate for adaptive GPS duty cycling.
+# Combines the receiver's speed over ground, smoothed, with the spread of
+# the last few positions. Speed alone reads a few tenths of a m/s while
+# standing still, and the spread alone lags behind a start from rest.
+
+from array import array
+import math
+
+from utils.units import KNOTS_TO_MPS, M_PER_UDEG
+
+
+class MotionEstimator:
+    def __init__(self, window=8):
+        self.window = window
+        self.lat = array("i", [0] * window)
+        self.lon = array("i", [0] * window)
+        self.index = 0
+        self.count = 0
+        # Exponential moving average of the speed, m/s
+        self.speed_mps = 0.0
+        self.lon_scale = 1.0
+
+    def reset(self):
+        self.index = 0
+        self.count = 0
+        self.speed_mps = 0.0
+
+    # Add a fix, position in microdegrees and speed in knots
+    def add(self, lat_e6, lon_e6, speed_knots):
+        if not self.count:
+            self.lon_scale = math.cos(math.radians(lat_e6 / 1000000))
+            self.speed_mps = speed_knots * KNOTS_TO_MPS
+        else:
+            self.speed_mps += (speed_knots * KNOTS_TO_MPS - self.speed_mps) * 0.5
+        self.lat[self.index] = lat_e6
+        self.lon[self.index] = lon_e6
+        self.index = (self.index + 1) % self.window
+        if self.count < self.window:
+            self.count += 1
+
+    # Diagonal of the box around the positions in the window, in metres
+    def spread_m(self):
+        if not self.count:
+            return 0
+        lat = self.lat
+        lon = self.lon
+        min_lat = max_lat = lat[0]
+        min_lon = max_lon = lon[0]
+        for i in range(1, self.count):
+            if lat[i] < min_lat:
+                min_lat = lat[i]
+            elif lat[i] > max_lat:
+                max_lat = lat[i]
+            if lon[i] < min_lon:
+                min_lon = lon[i]
+            elif lon[i] > max_lon:
+                max_lon = lon[i]
+        dy = max_lat - min_lat
+        dx = (max_lon - min_lon) * self.lon_scale
+        return math.sqrt(dx * dx + dy * dy) * M_PER_UDEG
+
+    # True once a full window of fixes shows neither speed nor movement
+    def is_stationary(self, max_speed_mps, max_spread_m):
+        return (
+            self.count == self.window
+            and self.speed_mps < max_speed_mps
+            and self.spread_m() < max_spread_m
+        )
@@ -0,0 +1,145 @@
+# nmea.py
+
+# Allocation-free helpers for NMEA sentences held in a bytearray.
+# Fields are located by offset instead of being split into strings, and
+# numbers are parsed straight from the ASCII bytes into integers.
+# Field i spans buf[offsets[i]:offsets[i + 1] - 1] (the trailing comma or '*').
+
+
+# Convert an ASCII hex digit to its value, or -1 if it is not hex
+@micropython.native
+def _hex_value(c):
+    if 0x30 <= c <= 0x39:
+        return c - 0x30
+    if 0x41 <= c <= 0x46:
+        return c - 0x37
+    if 0x61 <= c <= 0x66:
+        return c - 0x57
+    return -1
+
+
+# Validate the *hh checksum of the sentence in buf[0:n]
+# The checksum is the XOR of every byte between '$' and '*'
+@micropython.native
+def checksum_ok(buf, n):
+    if n < 4 or buf[0] != 0x24:
+        return False
+    checksum = 0
+    i = 1
+    while i < n:
+        c = buf[i]
+        if c == 0x2A:  # '*'
+            break
+        checksum ^= c
+        i += 1
+    # Exactly two hex digits must follow the '*'
+    if i + 3 != n:
+        return False
+    hi = _hex_value(buf[i + 1])
+    lo = _hex_value(buf[i + 2])
+    if hi < 0 or lo < 0:
+        return False
+    return checksum == (hi << 4) | lo
+
+
+# Record the start offset of every field in buf[0:n] into offsets
+# Field 0 is the address ("GPRMC"), the '$' is skipped.
+# Returns the number of fields found.
+@micropython.native
+def split_fields(buf, n, offsets):
+    max_fields = len(offsets) - 1
+    count = 0
+    offsets[0] = 1
+    i = 1
+    while i < n:
+        c = buf[i]
+        if c == 0x2C or c == 0x2A:  # ',' or '*'
+            if count < max_fields:
+                count += 1
+                offsets[count] = i + 1
+            if c == 0x2A:
+                return count
+        i += 1
+    # No checksum delimiter, close the last field at the end of the line
+    if count < max_fields:
+        count += 1
+        offsets[count] = n + 1
+    return count
+
+
+# Parse an unsigned decimal integer from buf[start:end]
+@micropython.native
+def parse_int(buf, start, end, default=0):
+    if start >= end:
+        return default
+    value = 0
+    while start < end:
+        c = buf[start] - 0x30
+        if c < 0 or c > 9:
+            return default
+        value = value * 10 + c
+        start += 1
+    return value
+
+
+# Parse a signed decimal number from buf[start:end] as a fixed-point
+# integer with the given number of decimals, e.g. "545.4" -> 5454 for 1
+@micropython.native
+def parse_fixed(buf, start, end, decimals, default=0):
+    if start >= end:
+        return default
+    negative = buf[start] == 0x2D  # '-'
+    if negative:
+        start += 1
+    value = 0
+    frac_digits = -1  # -1 until the decimal point is seen
+    while start < end:
+        c = buf[start]
+        if c == 0x2E:  # '.'
+            frac_digits = 0
+        else:
+            c -= 0x30
+            if c < 0 or c > 9:
+                return default
+            if frac_digits < 0:
+                value = value * 10 + c
+            elif frac_digits < decimals:
+                value = value * 10 + c
+                frac_digits += 1
+        start += 1
+    if frac_digits < 0:
+        frac_digits = 0
+    while frac_digits < decimals:
+        value *= 10
+        frac_digits += 1
+    return -value if negative else value
+
+
+# Convert a (D)DDMM.MMMMM field in buf[start:end] to microdegrees
+# Returns None if the field is empty or malformed
+@micropython.native
+def parse_coord(buf, start, end):
+    if start >= end:
+        return None
+    # Locate the decimal point, minutes start two digits before it
+    dot = start
+    while dot < end and buf[dot] != 0x2E:
+        dot += 1
+    if dot - start < 3:
+        return None
+    degrees = parse_int(buf, start, dot - 2, -1)
+    # Minutes scaled by 1e5
+    minutes = parse_fixed(buf, dot - 2, end, 5, -1)
+    if degrees < 0 or minutes < 0:
+        return None
+    # minutes * 1e5 / 60 / 1e5 * 1e6 == minutes / 6, rounded
+    return degrees * 1000000 + (minutes + 3) // 6
+
+
+# Build a complete sentence such as a PMTK command from its body
+# "PMTK314,..." -> b"$PMTK314,...*hh\r\n"
+def build_sentence(body):
+    checksum = 0
+    for c in body:
+        checksum ^= ord(c)
+    return ("$%s*%02X\r\n" % (body, checksum)).encode()
@@ -0,0 +1,192 @@
+# polygon_fill.py
+
+# Scanline fill of projected polygons with an edge table and an active
+# edge list. All rings of a feature are added before filling, and spans
+# run between alternate crossings (even-odd), so inner rings cut holes.
+# A fill pattern is a 4x4 ordered dither given as four row masks, bit i of
+# a row set for pixel columns x % 4 == i. Rows without pixels are skipped,
+# full rows are drawn with hline and the rest written straight into the
+# MONO_VLSB frame buffer.
+
+from array import array
+
+from micropython import const
+
+from utils.map_file import CLASS_VEGETATION, CLASS_WATER
+
+# Edge x positions are kept in 1/4096 pixel
+_FRAC_BITS = const(12)
+_HALF = const(2048)
+
+# Row masks per feature class, classes without one are only outlined
+# Water is ruled with a line every fourth row, vegetation is dotted
+FILL_PATTERNS = {
+    CLASS_WATER: b"\x0f\x00\x00\x00",
+    CLASS_VEGETATION: b"\x01\x00\x04\x00",
+}
+
+
+# Set the pattern pixels of row y from x0 to x1 - 1 in a MONO_VLSB buffer,
+# span holds width, y, x0, x1, row mask, column phase
+@micropython.viper
+def _pattern_span(buf, span) -> int:
+    b = ptr8(buf)
+    s = ptr32(span)
+    width = s[0]
+    y = s[1]
+    x = s[2]
+    x1 = s[3]
+    mask = s[4]
+    phase = s[5]
+    bit = 1 << (y & 7)
+    base = (y >> 3) * width
+    while x < x1:
+        if (mask >> ((x + phase) & 3)) & 1:
+            b[base + x] = b[base + x] | bit
+        x += 1
+    return 0
+
+
+class PolygonFiller:
+    def __init__(self, capacity=256, rows=64):
+        self.capacity = capacity
+        # Per edge: first row, row past the last, x at the first row and
+        # x step per row, in 1/4096 pixel
+        self.start = array("h", [0] * capacity)
+        self.end = array("h", [0] * capacity)
+        self.x = array("i", [0] * capacity)
+        self.step = array("i", [0] * capacity)
+        # Edge table: edges bucketed by first row as linked lists
+        self.next = array("h", [0] * capacity)
+        self.bucket = array("h", [-1] * rows)
+        self.active = array("h", [0] * capacity)
+        self.xs = array("h", [0] * capacity)
+        self.span = array("i", [0] * 6)
+        self.count = 0
+        self.top = 0
+        self.bottom = -1
+        # Rows first..last - 1 covered by the edges added so far
+        self.first = 0
+        self.last = -1
+
+    # Start a polygon to be filled within rows top..bottom
+    def begin(self, top, bottom):
+        rows = bottom - top + 1
+        if rows > len(self.bucket):
+            self.bucket = array("h", [-1] * rows)
+        else:
+            for i in range(rows):
+                self.bucket[i] = -1
+        self.count = 0
+        self.top = top
+        self.bottom = bottom
+        self.first = bottom + 1
+        self.last = top - 1
+
+    def grow(self):
+        capacity = self.capacity * 2
+        for name in ("start", "end", "x", "step", "next", "active"):
+            old = getattr(self, name)
+            new = array(old.typecode, [0] * capacity)
+            new[: len(old)] = old
+            setattr(self, name, new)
+        self.xs = array("h", [0] * capacity)
+        self.capacity = capacity
+
+    # Add the edges of a ring of n projected x, y pairs. Edges cover rows
+    # y1 <= y < y2, so a vertex shared by two edges is crossed once
+    @micropython.native
+    def add_ring(self, points, n):
+        top = self.top
+        bottom = self.bottom
+        for k in range(n):
+            j = k - 1 if k else n - 1
+            x1 = points[2 * j]
+            y1 = points[2 * j + 1]
+            x2 = points[2 * k]
+            y2 = points[2 * k + 1]
+            if y1 == y2:
+                continue
+            if y1 > y2:
+                x1, y1, x2, y2 = x2, y2, x1, y1
+            if y2 <= top or y1 > bottom:
+                continue
+            if self.count == self.capacity:
+                self.grow()
+            i = self.count
+            step = ((x2 - x1) << _FRAC_BITS) // (y2 - y1)
+            first = y1 if y1 > top else top
+            last = y2 if y2 <= bottom else bottom + 1
+            self.start[i] = first
+            self.end[i] = last
+            if first < self.first:
+                self.first = first
+            if last > self.last:
+                self.last = last
+            self.x[i] = (x1 << _FRAC_BITS) + (first - y1) * step + _HALF
+            self.step[i] = step
+            self.next[i] = self.bucket[first - top]
+            self.bucket[first - top] = i
+            self.count = i + 1
+
+    # Fill the polygon into frame (a FrameBuffer over buf) with a pattern,
+    # columns limited to left..right. phase_x, phase_y align the pattern to
+    # the map rather than the screen
+    @micropython.native
+    def fill(self, frame, buf, width, left, right, pattern, phase_x, phase_y):
+        if not self.count:
+            return
+        start = self.start
+        end = self.end
+        xs_fixed = self.x
+        steps = self.step
+        active = self.active
+        xs = self.xs
+        span = self.span
+        span[0] = width
+        span[5] = phase_x
+        top = self.top
+        n_active = 0
+        # Only the rows the polygon covers are visited
+        for y in range(self.first, self.last):
+            # Edges starting on this row join the active list
+            i = self.bucket[y - top]
+            while i >= 0:
+                active[n_active] = i
+                n_active += 1
+                i = self.next[i]
+            mask = pattern[(y + phase_y) & 3]
+            if not mask or not n_active:
+                continue
+            # Drop finished edges and find the crossings of the rest
+            m = 0
+            for a in range(n_active):
+                i = active[a]
+                if end[i] > y:
+                    active[m] = i
+                    x = (xs_fixed[i] + (y - start[i]) * steps[i]) >> _FRAC_BITS
+                    # Insertion sort, the list is short and nearly ordered
+                    b = m
+                    while b > 0 and xs[b - 1] > x:
+                        xs[b] = xs[b - 1]
+                        b -= 1
+                    xs[b] = x
+                    m += 1
+            n_active = m
+            for a in range(0, m - 1, 2):
+                x0 = xs[a]
+                x1 = xs[a + 1]
+                if x0 < left:
+                    x0 = left
+                if x1 > right + 1:
+                    x1 = right + 1
+                if x0 >= x1:
+                    continue
+                if mask == 0x0F:
+                    frame.hline(x0, y, x1 - x0, 1)
+                else:
+                    span[1] = y
+                    span[2] = x0
+                    span[3] = x1
+                    span[4] = mask
+                    _pattern_span(buf, span)
@@ -0,0 +1,83 @@
+# ring_buffer.py
+
+# Fixed-size byte ring buffer used to stream UART data into the NMEA parser.
+# All storage is allocated once, so draining the UART and splitting out
+# sentences does not create new objects per byte or per line.
+
+
+class RingBuffer:
+    def __init__(self, size=1024):
+        self.size = size
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.head = 0  # Next write position
+        self.tail = 0  # Next read position
+        self.count = 0  # Bytes currently stored
+        # Length of the partially assembled line carried across calls
+        self.line_len = 0
+        self.overflows = 0
+
+    def free(self):
+        return self.size - self.count
+
+    # Read as many pending UART bytes as fit into the ring
+    # Returns the number of bytes read
+    def fill_from(self, uart):
+        total = 0
+        while self.count < self.size and uart.any():
+            head = self.head
+            # Largest contiguous free region starting at head
+            end = self.tail if head < self.tail else self.size
+            if head == end:
+                break
+            n = uart.readinto(self.mv[head:end])
+            if not n:
+                break
+            self.head = (head + n) % self.size
+            self.count += n
+            total += n
+        return total
+
+    # Copy the next complete line (without CR/LF) into out
+    # Returns the line length, or 0 if no complete line is buffered yet.
+    # Bytes are consumed as they are scanned, so each byte is touched once
+    # no matter how many calls it takes for the line to complete.
+    @micropython.native
+    def read_line(self, out):
+        buf = self.buf
+        size = self.size
+        tail = self.tail
+        count = self.count
+        line_len = self.line_len
+        out_size = len(out)
+        while count > 0:
+            b = buf[tail]
+            tail += 1
+            if tail == size:
+                tail = 0
+            count -= 1
+            if b == 0x0A:  # \n ends the sentence
+                n = line_len
+                line_len = 0
+                if n:
+                    self.tail = tail
+                    self.count = count
+                    self.line_len = 0
+                    return n
+            elif b == 0x24:  # $ always starts a new sentence (resync)
+                out[0] = b
+                line_len = 1
+            elif b == 0x0D:  # Drop \r
+                pass
+            elif line_len:
+                if line_len < out_size:
+                    out[line_len] = b
+                    line_len += 1
+                else:
+                    # Line too long to be NMEA, discard it
+                    line_len = 0
+                    self.overflows += 1
+        self.tail = tail
+        self.count = count
+        self.line_len = line_len
+        return 0
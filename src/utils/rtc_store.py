@@ -0,0 +1,86 @@
+# rtc_store.py
+
+# Binary state kept in RTC memory, which survives deep sleep.
+# Holds the boot counter and the last valid fix so the receiver can be
+# given position/time aiding on wake and the map has something to show
+# before the first new fix.
+
+import struct
+
+from machine import RTC
+
+MAGIC = b"PN32"
+VERSION = 1
+# magic, version, flags, satellite count, boot count, lat/lon (microdegrees),
+# altitude (cm), UTC seconds since 2000-01-01, satellite PRNs
+FORMAT = "<4sBBBxIiiiI12s"
+SIZE = struct.calcsize(FORMAT)
+MAX_SATELLITES = 12
+
+FLAG_FIX = 0x01  # lat/lon/alt/utc hold a valid fix
+FLAG_RTC_TIME = 0x02  # The RTC clock was set from GPS time
+
+
+def empty_state():
+    return {
+        "flags": 0,
+        "boot_count": 0,
+        "lat_e6": 0,
+        "lon_e6": 0,
+        "alt_cm": 0,
+        "utc_s": 0,
+        "satellites": b"",
+    }
+
+
+# Read the state from RTC memory, falling back to an empty state
+def load_state():
+    state = empty_state()
+    raw = RTC().memory()
+    if len(raw) == SIZE and raw[:4] == MAGIC:
+        (
+            _,
+            version,
+            flags,
+            sat_count,
+            boot_count,
+            lat_e6,
+            lon_e6,
+            alt_cm,
+            utc_s,
+            prns,
+        ) = struct.unpack(FORMAT, raw)
+        if version == VERSION:
+            state["flags"] = flags
+            state["boot_count"] = boot_count
+            state["lat_e6"] = lat_e6
+            state["lon_e6"] = lon_e6
+            state["alt_cm"] = alt_cm
+            state["utc_s"] = utc_s
+            state["satellites"] = prns[: min(sat_count, MAX_SATELLITES)]
+    elif raw:
+        # Older firmware stored only the boot count as text
+        try:
+            state["boot_count"] = int(raw.decode())
+        except (UnicodeError, ValueError):
+            pass
+    return state
+
+
+def save_state(state):
+    satellites = state["satellites"][:MAX_SATELLITES]
+    RTC().memory(
+        struct.pack(
+            FORMAT,
+            MAGIC,
+            VERSION,
+            state["flags"],
+            len(satellites),
+            state["boot_count"],
+            state["lat_e6"],
+            state["lon_e6"],
+            state["alt_cm"],
+            state["utc_s"],
+            bytes(satellites),
+        )
+    )
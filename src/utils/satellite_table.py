@@ -0,0 +1,69 @@
+# satellite_table.py
+
+# Fixed-capacity satellite table backed by preallocated arrays.
+# Entries are keyed by PRN, so repeated GSV messages update satellites in
+# place instead of growing the table.
+
+from array import array
+
+# Marker for fields the receiver left empty
+UNKNOWN = 0xFF
+UNKNOWN_AZIMUTH = 0xFFFF
+
+
+class SatelliteTable:
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.prn = array("H", [0] * capacity)
+        self.elevation = bytearray(capacity)  # Degrees, 0-90
+        self.azimuth = array("H", [0] * capacity)  # Degrees, 0-359
+        self.snr = bytearray(capacity)  # dB-Hz, 0-99
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    # Copy the satellites of another table into this one, without allocating
+    def copy_from(self, other):
+        count = min(other.count, self.capacity)
+        for i in range(count):
+            self.prn[i] = other.prn[i]
+            self.elevation[i] = other.elevation[i]
+            self.azimuth[i] = other.azimuth[i]
+            self.snr[i] = other.snr[i]
+        self.count = count
+
+    # Return the index of a PRN in the table, or -1
+    def find(self, prn):
+        table_prn = self.prn
+        for i in range(self.count):
+            if table_prn[i] == prn:
+                return i
+        return -1
+
+    # Insert or update a satellite, None values are stored as unknown
+    # Returns False when the table is full
+    def update(self, prn, elevation, azimuth, snr):
+        i = self.find(prn)
+        if i < 0:
+            if self.count >= self.capacity:
+                return False
+            i = self.count
+            self.prn[i] = prn
+            self.count += 1
+        self.elevation[i] = UNKNOWN if elevation is None else min(elevation, 90)
+        self.azimuth[i] = UNKNOWN_AZIMUTH if azimuth is None else azimuth % 360
+        self.snr[i] = UNKNOWN if snr is None else min(snr, 99)
+        return True
+
+    # Number of satellites with a signal, i.e. currently being tracked
+    def tracked(self):
+        snr = self.snr
+        total = 0
+        for i in range(self.count):
+            if snr[i] != UNKNOWN and snr[i] > 0:
+                total += 1
+        return total
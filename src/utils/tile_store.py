@@ -0,0 +1,145 @@
+# tile_store.py
+
+# Reader for vector tile packs built by tools/compile_tiles.py.
+# Only the pack header is kept in RAM, a tile is found by binary search of
+# the directory on flash. Loaded tiles are kept in an LRU cache bounded by
+# a byte budget: each is read into RAM in one go and parsed as a MapFile
+# over an in-memory stream, so drawing a cached tile costs no flash I/O.
+
+import io
+import math
+import struct
+
+from utils.map_file import MapFile, level_for_zoom, read_level_zooms
+
+PACK_MAGIC = b"PNTL"
+PACK_VERSION = 1
+PACK_FORMAT = "<4sHBxII"
+DIR_FORMAT = "<III"
+DIR_SIZE = struct.calcsize(DIR_FORMAT)
+
+
+def tile_x(lon, zoom):
+    return int((lon + 180) / 360 * (1 << zoom))
+
+
+def tile_y(lat, zoom):
+    lat = math.radians(lat)
+    merc = math.log(math.tan(lat) + 1 / math.cos(lat))
+    return int((1 - merc / math.pi) / 2 * (1 << zoom))
+
+
+class TileStore:
+    def __init__(self, path, budget_bytes=32768):
+        self.path = path
+        self.budget_bytes = budget_bytes
+        self.f = open(path, "rb")
+        magic, version, self.zoom, self.count, self.directory_offset = struct.unpack(
+            PACK_FORMAT, self.f.read(struct.calcsize(PACK_FORMAT))
+        )
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError("Not a tile pack")
+        self.last = (1 << self.zoom) - 1
+        # Level zooms of the first tile, every tile in a pack has the same
+        self.level_zooms = None
+        self.dir_entry = bytearray(DIR_SIZE)
+        # key -> (MapFile or None for an empty tile, bytes charged)
+        self.cache = {}
+        # Keys from least to most recently used
+        self.order = []
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.f.close()
+
+    # Level of detail for a display zoom, see map_file.level_for_zoom
+    def level_for_zoom(self, zoom_level):
+        if not self.count:
+            return 0
+        if self.level_zooms is None:
+            self.f.seek(self.directory_offset)
+            self.f.readinto(self.dir_entry)
+            _, offset, _ = struct.unpack(DIR_FORMAT, self.dir_entry)
+            self.f.seek(offset)
+            self.level_zooms = read_level_zooms(self.f)
+        return level_for_zoom(self.level_zooms, zoom_level)
+
+    # Tile range (x0, y0, x1, y1) covering a [min_lon, min_lat, max_lon,
+    # max_lat] bbox, rows count down from the north
+    def tile_range(self, bbox):
+        zoom = self.zoom
+        last = self.last
+        lat_limit = 85.0511
+        return (
+            max(0, min(last, tile_x(bbox[0], zoom))),
+            max(0, min(last, tile_y(min(bbox[3], lat_limit), zoom))),
+            max(0, min(last, tile_x(bbox[2], zoom))),
+            max(0, min(last, tile_y(max(bbox[1], -lat_limit), zoom))),
+        )
+
+    # Binary search the directory, returns (offset, size) or None
+    def find(self, key):
+        f = self.f
+        entry = self.dir_entry
+        lo = 0
+        hi = self.count - 1
+        while lo <= hi:
+            mid = (lo + hi) >> 1
+            f.seek(self.directory_offset + mid * DIR_SIZE)
+            f.readinto(entry)
+            mid_key, offset, size = struct.unpack(DIR_FORMAT, entry)
+            if mid_key == key:
+                return offset, size
+            if mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return None
+
+    # MapFile of tile x, y, or None when the pack has nothing there
+    def tile(self, x, y):
+        key = (x << self.zoom) | y
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.order.remove(key)
+            self.order.append(key)
+            return cached[0]
+        self.misses += 1
+        map_file, cost = self.load(key)
+        self.evict(cost)
+        self.cache[key] = (map_file, cost)
+        self.order.append(key)
+        self.cached_bytes += cost
+        return map_file
+
+    def load(self, key):
+        found = self.find(key)
+        if found is None:
+            # Remember empty tiles too, so they are not searched again
+            return None, DIR_SIZE
+        offset, size = found
+        self.f.seek(offset)
+        # BytesIO references immutable bytes rather than copying them
+        map_file = MapFile(io.BytesIO(self.f.read(size)))
+        # The blob plus the buffers MapFile allocates for it
+        cost = (
+            size
+            + 4 * len(map_file.cell_start)
+            + 4 * len(map_file.part_ends)
+            + 2 * len(map_file.coords)
+        )
+        return map_file, cost
+
+    # Drop least recently used tiles until cost more bytes fit the budget
+    def evict(self, cost):
+        while self.order and self.cached_bytes + cost > self.budget_bytes:
+            key = self.order.pop(0)
+            self.cached_bytes -= self.cache.pop(key)[1]
+
+    def clear(self):
+        self.cache = {}
+        self.order = []
+        self.cached_bytes = 0
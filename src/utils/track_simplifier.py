@@ -0,0 +1,163 @@
+# track_simplifier.py
+
+# Streaming track simplification for breadcrumbs.
+# Each fix goes through two filters before it is kept:
+#   1. Radial distance: fixes closer than the tolerance to the last fix that
+#      was considered are dropped outright (GPS jitter while standing still).
+#   2. Sliding-window Douglas-Peucker: fixes are held in a short window behind
+#      the last kept point (the anchor). While every held fix lies within the
+#      tolerance of the line anchor -> newest fix, nothing is kept. When one
+#      falls outside, the fix before the newest becomes the new anchor.
+# Distances use a local equirectangular metric in microdegrees of latitude,
+# with the longitude scale fixed from the first fix, so each comparison is a
+# few integer multiplies instead of a haversine call. Products are kept
+# within small ints for fixes up to tens of kilometres apart, so the native
+# code never allocates a bigint.
+# Kept points go into a ring of array("i"), the oldest are overwritten.
+
+from array import array
+import math
+
+from micropython import const
+
+from utils.units import M_PER_UDEG
+
+# Longitude scale in 1/4096, leaves 18 bits for the longitude difference
+_SCALE_BITS = const(12)
+# The line direction is shifted below this before the cross product
+_DIRECTION_MAX = const(8192)
+
+
+# Integer square root of n by Newton's method, x is a guess >= sqrt(n)
+@micropython.native
+def _isqrt(n, x):
+    if x <= 0:
+        return 0
+    y = (x + n // x) >> 1
+    while y < x:
+        x = y
+        y = (x + n // x) >> 1
+    return x
+
+
+class TrackSimplifier:
+    def __init__(self, tolerance_m=5, capacity=512, window=32):
+        self.capacity = capacity
+        self.lat = array("i", [0] * capacity)
+        self.lon = array("i", [0] * capacity)
+        self.start = 0
+        self.count = 0
+
+        self.window = window
+        self.win_lat = array("i", [0] * window)
+        self.win_lon = array("i", [0] * window)
+        self.win_count = 0
+
+        # Longitude scale, cos(latitude) in 1/4096, set on the first fix
+        self.lon_scale = 0
+        self.set_tolerance(tolerance_m)
+
+        self.fixes_seen = 0
+
+    def __len__(self):
+        return self.count + (1 if self.win_count else 0)
+
+    def set_tolerance(self, tolerance_m):
+        tolerance = int(tolerance_m / M_PER_UDEG)
+        self.tolerance = tolerance
+        self.tolerance_sq = tolerance * tolerance
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        self.win_count = 0
+        self.lon_scale = 0
+
+    # Point i of the simplified track, oldest first. The newest fix is
+    # always included as the last point so the trail reaches the user.
+    def point(self, i):
+        if i < self.count:
+            i = (self.start + i) % self.capacity
+            return self.lat[i], self.lon[i]
+        last = self.win_count - 1
+        return self.win_lat[last], self.win_lon[last]
+
+    def _keep(self, lat_e6, lon_e6):
+        if self.count < self.capacity:
+            i = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.lat[i] = lat_e6
+        self.lon[i] = lon_e6
+
+    # Feed a fix in microdegrees
+    # Returns True if it changed the kept points
+    @micropython.native
+    def add(self, lat_e6, lon_e6):
+        self.fixes_seen += 1
+        if not self.count:
+            self.lon_scale = int(
+                math.cos(math.radians(lat_e6 / 1000000)) * (1 << _SCALE_BITS)
+            )
+            self._keep(lat_e6, lon_e6)
+            return True
+        scale = self.lon_scale
+        tolerance = self.tolerance
+        win_lat = self.win_lat
+        win_lon = self.win_lon
+        n = self.win_count
+
+        # Radial distance filter against the newest considered fix
+        if n:
+            ref_lat = win_lat[n - 1]
+            ref_lon = win_lon[n - 1]
+        else:
+            last = (self.start + self.count - 1) % self.capacity
+            ref_lat = self.lat[last]
+            ref_lon = self.lon[last]
+        dy = lat_e6 - ref_lat
+        dx = ((lon_e6 - ref_lon) * scale) >> _SCALE_BITS
+        # Only fixes within the tolerance box get squared
+        if (
+            -tolerance < dx < tolerance
+            and -tolerance < dy < tolerance
+            and dx * dx + dy * dy < self.tolerance_sq
+        ):
+            return False
+
+        # Line from the anchor to the new fix
+        last = (self.start + self.count - 1) % self.capacity
+        anchor_lat = self.lat[last]
+        anchor_lon = self.lon[last]
+        ly = lat_e6 - anchor_lat
+        lx = ((lon_e6 - anchor_lon) * scale) >> _SCALE_BITS
+        # Shorten the line to its direction, below _DIRECTION_MAX, and take
+        # its length once for the whole window
+        longest = max(abs(lx), abs(ly))
+        while longest >= _DIRECTION_MAX:
+            lx >>= 1
+            ly >>= 1
+            longest >>= 1
+        limit = tolerance * _isqrt(lx * lx + ly * ly, longest + (longest >> 1) + 1)
+
+        outside = n == self.window
+        i = 0
+        while i < n and not outside:
+            py = win_lat[i] - anchor_lat
+            px = ((win_lon[i] - anchor_lon) * scale) >> _SCALE_BITS
+            # Perpendicular distance: |cross| / |line|
+            cross = lx * py - ly * px
+            if abs(cross) > limit:
+                outside = True
+            i += 1
+
+        if outside:
+            # The previous fix is the furthest the line could reach
+            self._keep(win_lat[n - 1], win_lon[n - 1])
+            n = 0
+        win_lat[n] = lat_e6
+        win_lon[n] = lon_e6
+        self.win_count = n + 1
+        return True
@@ -0,0 +1,68 @@
+# uart_capture.py
+
+# Tee every byte read from a UART into a file on flash.
+# Reads are copied into a RAM buffer that is appended to the file only
+# when full, so capturing 9600 baud costs a flash write every couple of
+# seconds rather than one per read. The file holds the raw stream (NMEA
+# and/or UBX) and can be played back with utils.uart_replay.ReplayUART.
+
+
+class CaptureUART:
+    def __init__(self, uart, path="/gps_capture.bin", buf_size=2048):
+        self.uart = uart
+        self.path = path
+        self.buf = bytearray(buf_size)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.bytes_captured = 0
+        self.write_errors = 0
+
+    def any(self):
+        return self.uart.any()
+
+    def readinto(self, buf, nbytes=None):
+        if nbytes is None:
+            n = self.uart.readinto(buf)
+        else:
+            n = self.uart.readinto(buf, nbytes)
+        if n:
+            self.capture(buf, n)
+        return n
+
+    def read(self, nbytes=None):
+        data = self.uart.read() if nbytes is None else self.uart.read(nbytes)
+        if data:
+            self.capture(data, len(data))
+        return data
+
+    def write(self, data):
+        return self.uart.write(data)
+
+    def init(self, *args, **kwargs):
+        self.uart.init(*args, **kwargs)
+
+    # Copy the first n bytes of data into the buffer, flushing when it fills
+    def capture(self, data, n):
+        src = memoryview(data)
+        size = len(self.buf)
+        done = 0
+        while done < n:
+            chunk = min(n - done, size - self.pos)
+            self.mv[self.pos : self.pos + chunk] = src[done : done + chunk]
+            self.pos += chunk
+            done += chunk
+            if self.pos == size:
+                self.flush()
+        self.bytes_captured += n
+
+    # Append the buffered bytes to the capture file
+    def flush(self):
+        if not self.pos:
+            return
+        try:
+            with open(self.path, "ab") as f:
+                f.write(self.mv[: self.pos])
+        except OSError as e:
+            self.write_errors += 1
+            print(f"[ERROR] Capture write error: {e}")
+        self.pos = 0
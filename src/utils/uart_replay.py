@@ -0,0 +1,91 @@
+# uart_replay.py
+
+# Stand-in for machine.UART that plays back a captured byte stream.
+# With realtime=True bytes become available at the line rate of the
+# configured baud rate, as they would from the receiver. Otherwise the
+# whole file is available at once, for benchmarking the parser.
+# The capture is played repeat times, 0 loops forever.
+# Writes (configuration commands) are counted and discarded.
+
+import utime
+
+
+class ReplayUART:
+    def __init__(self, path, realtime=False, baudrate=9600, repeat=1, chunk=512):
+        self.path = path
+        self.realtime = realtime
+        self.repeat = repeat
+        self.passes = 1
+        self.file = open(path, "rb")
+        self.buf = bytearray(chunk)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.end = 0
+        self.eof = False
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.init(baudrate=baudrate)
+
+    # Only the baud rate matters, pins and framing are ignored
+    def init(self, baudrate=None, **kwargs):
+        if baudrate:
+            self.baudrate = baudrate
+        self.start_ms = utime.ticks_ms()
+        self.released = 0
+
+    # True once every byte of the capture has been read
+    @property
+    def exhausted(self):
+        return self.eof and self.pos == self.end
+
+    def _refill(self):
+        if self.pos < self.end or self.eof:
+            return
+        n = self.file.readinto(self.buf)
+        if not n and (not self.repeat or self.passes < self.repeat):
+            self.passes += 1
+            self.file.seek(0)
+            n = self.file.readinto(self.buf)
+        self.pos = 0
+        self.end = n or 0
+        if not n:
+            self.eof = True
+
+    # Bytes the line rate allows to have arrived so far
+    # 8N1 puts 10 bits on the wire per byte
+    def _allowance(self):
+        if not self.realtime:
+            return 0x3FFFFFFF
+        elapsed = utime.ticks_diff(utime.ticks_ms(), self.start_ms)
+        return elapsed * self.baudrate // 10000 - self.released
+
+    def any(self):
+        self._refill()
+        return max(0, min(self.end - self.pos, self._allowance()))
+
+    def readinto(self, buf, nbytes=None):
+        total = 0
+        wanted = len(buf) if nbytes is None else nbytes
+        while total < wanted:
+            available = self.any()
+            if not available:
+                break
+            n = min(available, wanted - total)
+            buf[total : total + n] = self.mv[self.pos : self.pos + n]
+            self.pos += n
+            self.released += n
+            total += n
+        self.bytes_read += total
+        return total or None
+
+    def read(self, nbytes=None):
+        out = bytearray(nbytes if nbytes is not None else self.any())
+        n = self.readinto(out)
+        return bytes(out[:n]) if n else None
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+    def close(self):
+        self.file.close()
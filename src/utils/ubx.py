@@ -0,0 +1,261 @@
+# ubx.py
+
+# u-blox UBX binary protocol support: building configuration frames and
+# pulling NAV-PVT and NAV-DOP frames out of the receive ring buffer.
+# Frame layout: 0xB5 0x62 class id length(2, LE) payload ck_a ck_b
+
+import struct
+
+from micropython import const
+
+SYNC_1 = const(0xB5)
+SYNC_2 = const(0x62)
+
+CLASS_NAV = const(0x01)
+CLASS_ACK = const(0x05)
+CLASS_CFG = const(0x06)
+CLASS_AID = const(0x0B)
+CLASS_NMEA = const(0xF0)
+
+NAV_DOP = const(0x04)
+NAV_PVT = const(0x07)
+CFG_PRT = const(0x00)
+CFG_MSG = const(0x01)
+CFG_RATE = const(0x08)
+CFG_RXM = const(0x11)
+AID_INI = const(0x01)
+
+# GPS time started 1980-01-06, 7300 days before 2000-01-01, and is ahead of
+# UTC by the accumulated leap seconds
+GPS_EPOCH_TO_2000_S = const(630720000)
+GPS_LEAP_SECONDS = const(18)
+
+# NAV-DOP is 18 bytes
+NAV_DOP_LEN = const(18)
+# NAV-PVT is 84 bytes on protocol 14 (u-blox 7) and 92 bytes from u-blox 8
+NAV_PVT_MIN_LEN = const(84)
+MAX_PAYLOAD = const(100)
+
+# Reader states
+_WAIT_SYNC_1 = const(0)
+_WAIT_SYNC_2 = const(1)
+_HEADER = const(2)
+_PAYLOAD = const(3)
+_CK_A = const(4)
+_CK_B = const(5)
+
+
+# Build a complete UBX frame with its Fletcher checksum
+def frame(msg_class, msg_id, payload=b""):
+    length = len(payload)
+    out = bytearray(8 + length)
+    out[0] = SYNC_1
+    out[1] = SYNC_2
+    struct.pack_into("<BBH", out, 2, msg_class, msg_id, length)
+    out[6 : 6 + length] = payload
+    ck_a = 0
+    ck_b = 0
+    for i in range(2, 6 + length):
+        ck_a = (ck_a + out[i]) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    out[6 + length] = ck_a
+    out[7 + length] = ck_b
+    return out
+
+
+# CFG-PRT for UART1: 8N1 at the given baud rate
+# Protocol masks: bit 0 UBX, bit 1 NMEA
+def cfg_prt_uart(baudrate, in_proto=0x03, out_proto=0x01):
+    payload = struct.pack(
+        "<BBHIIHHHH", 1, 0, 0, 0x08D0, baudrate, in_proto, out_proto, 0, 0
+    )
+    return frame(CLASS_CFG, CFG_PRT, payload)
+
+
+# CFG-RATE: measurement period in ms, one navigation solution per measurement
+def cfg_rate(meas_rate_ms):
+    return frame(CLASS_CFG, CFG_RATE, struct.pack("<HHH", meas_rate_ms, 1, 1))
+
+
+# CFG-MSG: output rate of a message on the current port (0 disables it)
+def cfg_msg(msg_class, msg_id, rate):
+    return frame(CLASS_CFG, CFG_MSG, struct.pack("<BBB", msg_class, msg_id, rate))
+
+
+# CFG-RXM: Power Save Mode (cyclic tracking) or continuous mode
+def cfg_rxm(power_save):
+    return frame(CLASS_CFG, CFG_RXM, struct.pack("<BB", 8, 1 if power_save else 0))
+
+
+# GPS week and time of week (ms) for a UTC time in seconds since 2000
+def gps_week_tow(utc_s):
+    gps_s = utc_s + GPS_EPOCH_TO_2000_S + GPS_LEAP_SECONDS
+    return gps_s // 604800, (gps_s % 604800) * 1000
+
+
+# AID-INI: initial position (lat/lon/alt) and GPS time for a hot start
+# This is the u-blox 7 aiding message, u-blox 8+ also accept it
+def aid_ini(lat_e6, lon_e6, alt_cm, pos_acc_cm, utc_s=None, t_acc_ms=0):
+    # Bit 0 position valid, bit 5 position given as lat/lon/alt
+    flags = 0x21
+    week = 0
+    tow_ms = 0
+    if utc_s is not None:
+        week, tow_ms = gps_week_tow(utc_s)
+        flags |= 0x02  # Time valid
+    payload = struct.pack(
+        "<iiiIHHIiIIiII",
+        lat_e6 * 10,  # 1e-7 degrees
+        lon_e6 * 10,
+        alt_cm,
+        pos_acc_cm,
+        0,  # tmCfg
+        week,
+        tow_ms,
+        0,  # towNs
+        t_acc_ms,
+        0,  # tAccNs
+        0,  # clkD
+        0,  # clkDAcc
+        flags,
+    )
+    return frame(CLASS_AID, AID_INI, payload)
+
+
+class UBXReader:
+    def __init__(self):
+        self.payload = bytearray(MAX_PAYLOAD)
+        self.msg_class = 0
+        self.msg_id = 0
+        self.length = 0
+        self.state = _WAIT_SYNC_1
+        self.header = bytearray(4)
+        self.pos = 0
+        self.ck_a = 0
+        self.ck_b = 0
+        self.checksum_errors = 0
+
+    # Consume bytes from the ring until a complete, valid frame is found
+    # Returns True with the frame in msg_class/msg_id/payload[:length],
+    # False once the ring is empty. Partial frames carry over to the next call.
+    @micropython.native
+    def read_frame(self, ring):
+        buf = ring.buf
+        size = ring.size
+        tail = ring.tail
+        count = ring.count
+        state = self.state
+        pos = self.pos
+        ck_a = self.ck_a
+        ck_b = self.ck_b
+        header = self.header
+        payload = self.payload
+        found = False
+        while count > 0:
+            b = buf[tail]
+            tail += 1
+            if tail == size:
+                tail = 0
+            count -= 1
+            if state == _WAIT_SYNC_1:
+                if b == SYNC_1:
+                    state = _WAIT_SYNC_2
+            elif state == _WAIT_SYNC_2:
+                if b == SYNC_2:
+                    state = _HEADER
+                    pos = 0
+                    ck_a = 0
+                    ck_b = 0
+                else:
+                    state = _WAIT_SYNC_2 if b == SYNC_1 else _WAIT_SYNC_1
+            else:
+                if state != _CK_A and state != _CK_B:
+                    ck_a = (ck_a + b) & 0xFF
+                    ck_b = (ck_b + ck_a) & 0xFF
+                if state == _HEADER:
+                    header[pos] = b
+                    pos += 1
+                    if pos == 4:
+                        self.length = header[2] | (header[3] << 8)
+                        pos = 0
+                        if self.length > MAX_PAYLOAD:
+                            # Not a message we decode, resynchronise
+                            state = _WAIT_SYNC_1
+                        else:
+                            state = _PAYLOAD if self.length else _CK_A
+                elif state == _PAYLOAD:
+                    payload[pos] = b
+                    pos += 1
+                    if pos == self.length:
+                        state = _CK_A
+                elif state == _CK_A:
+                    state = _CK_B if b == ck_a else _WAIT_SYNC_1
+                    if b != ck_a:
+                        self.checksum_errors += 1
+                else:
+                    state = _WAIT_SYNC_1
+                    if b == ck_b:
+                        self.msg_class = header[0]
+                        self.msg_id = header[1]
+                        found = True
+                        break
+                    self.checksum_errors += 1
+        ring.tail = tail
+        ring.count = count
+        self.state = state
+        self.pos = pos
+        self.ck_a = ck_a
+        self.ck_b = ck_b
+        return found
+
+
+# Decode a NAV-PVT payload into the gps_data dictionary
+def decode_nav_pvt(payload, gps_data):
+    year, month, day, hour, minute, second, valid = struct.unpack_from(
+        "<HBBBBBB", payload, 4
+    )
+    fix_type, flags, _, num_sv, lon, lat, _, h_msl, h_acc = struct.unpack_from(
+        "<BBBBiiiiI", payload, 20
+    )
+    g_speed, head_mot = struct.unpack_from("<ii", payload, 60)
+    (p_dop,) = struct.unpack_from("<H", payload, 76)
+
+    # gnssFixOK flag plus a 2D/3D solution
+    fix = bool(flags & 0x01) and 2 <= fix_type <= 4
+    # A position restored after deep sleep stays "Stale" until a real fix
+    if fix or gps_data["fix"] != "Stale":
+        gps_data["fix"] = "Valid" if fix else "No Fix"
+    gps_data["fix_type"] = fix_type
+    gps_data["sats"] = num_sv
+    gps_data["talker"] = "UBX"
+    gps_data["pdop"] = p_dop / 100
+    # NAV-PVT has no HDOP, that comes from NAV-DOP. The horizontal accuracy
+    # estimate is kept apart, it is metres rather than a dilution factor.
+    gps_data["h_acc_m"] = h_acc / 1000
+
+    # validDate and validTime bits
+    if valid & 0x03 == 0x03:
+        gps_data["utc_time"] = "%02d:%02d:%02d" % (hour, minute, second)
+        gps_data["utc_date"] = "%04d-%02d-%02d" % (year, month, day)
+
+    if fix:
+        # 1e-7 degrees to microdegrees
+        lat //= 10
+        lon //= 10
+        gps_data["lat_e6"] = lat
+        gps_data["lon_e6"] = lon
+        gps_data["lat"] = lat / 1000000
+        gps_data["lon"] = lon / 1000000
+        gps_data["alt"] = h_msl // 100 / 10
+        # mm/s to knots
+        gps_data["speed_knots"] = g_speed / 514.444
+        gps_data["course"] = head_mot / 100000
+    return fix
+
+
+# Decode a NAV-DOP payload into the gps_data dictionary, DOPs are in 0.01
+def decode_nav_dop(payload, gps_data):
+    p_dop, _, v_dop, h_dop = struct.unpack_from("<HHHH", payload, 6)
+    gps_data["pdop"] = p_dop / 100
+    gps_data["vdop"] = v_dop / 100
+    gps_data["hdop"] = h_dop / 100
@@ -0,0 +1,7 @@
+# units.py
+
+# Unit conversions shared by the GPS and map code.
+
+# Metres per microdegree of latitude
+M_PER_UDEG = 0.111195
+KNOTS_TO_MPS = 0.514444
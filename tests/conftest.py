@@ -0,0 +1,29 @@
+# Run the firmware modules under CPython with the stand-ins from
+# tools/host_stubs, the same setup tools/bench_gps.py uses
+
+import builtins
+import sys
+import time
+
+TESTS_DIR = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+sys.path.append(TESTS_DIR + "/../tools/host_stubs")
+sys.path.append(TESTS_DIR + "/../src")
+sys.path.append(TESTS_DIR + "/../tools")
+
+import micropython  # noqa: E402
+import utime  # noqa: E402
+
+import host_stubs.machine  # noqa: E402
+
+builtins.micropython = micropython
+for name in (
+    "ticks_ms",
+    "ticks_us",
+    "ticks_add",
+    "ticks_diff",
+    "sleep_ms",
+    "sleep_us",
+    "mktime",
+):
+    setattr(time, name, getattr(utime, name))
+sys.modules["machine"] = host_stubs.machine
@@ -0,0 +1,29 @@
+from utils.fix_ring import FixRing
+from utils.satellite_table import SatelliteTable
+
+
+def test_pop_without_push():
+    ring = FixRing({"lat_e6": 0}, slots=4)
+    data = {"lat_e6": 0}
+    assert not ring.pop_latest_into(data)
+
+
+def test_latest_fix_after_overflow():
+    fix = {"lat_e6": 0, "satellites": None}
+    ring = FixRing(fix, slots=4, tables={"satellites": SatelliteTable})
+    for i in range(11):
+        fix["lat_e6"] = i
+        ring.push(fix)
+    assert len(ring) == 4
+    assert ring.dropped == 7
+    data = dict(fix)
+    data["lat_e6"] = -1
+    assert ring.pop_latest_into(data)
+    assert data["lat_e6"] == 10
+    assert len(ring) == 0
+    assert not ring.pop_latest_into(data)
+
+    fix["lat_e6"] = 11
+    ring.push(fix)
+    assert ring.pop_latest_into(data)
+    assert data["lat_e6"] == 11
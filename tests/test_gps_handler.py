@@ -0,0 +1,69 @@
+from handlers.gps_handler import SENTENCE_GGA, SENTENCE_RMC, GPSHandler
+from utils.nmea import build_sentence
+from utils.ubx import CLASS_NMEA, cfg_msg, cfg_rate
+
+
+class FakeLED:
+    def set_success_led(self, value):
+        pass
+
+    def set_warning_led(self, value):
+        pass
+
+    def set_error_led(self, value):
+        pass
+
+
+class RecordingUART:
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+
+def make_gps(receiver="ublox"):
+    gps = GPSHandler(FakeLED())
+    gps.receiver = receiver
+    gps.uart1 = RecordingUART()
+    return gps
+
+
+def test_idle_profile_is_rmc_only():
+    gps = make_gps()
+    gps.set_sentence_profile("idle")
+    assert gps.sentence_mask == SENTENCE_RMC
+
+
+def test_idle_profile_keeps_gga_while_track_logging():
+    gps = make_gps()
+    gps.track_logger = object()
+    gps.set_sentence_profile("position")
+    gps.uart1.written.clear()
+    gps.set_sentence_profile("idle")
+    assert gps.sentence_mask == SENTENCE_RMC | SENTENCE_GGA
+    assert bytes(cfg_msg(CLASS_NMEA, 0x00, 0)) not in gps.uart1.written
+
+
+def test_idle_profile_keeps_gga_while_track_logging_mtk():
+    gps = make_gps("mtk")
+    gps.track_logger = object()
+    gps.set_sentence_profile("idle")
+    rates = [0] * 19
+    rates[1] = 1
+    rates[3] = 1
+    body = "PMTK314," + ",".join(str(r) for r in rates)
+    assert gps.uart1.written == [bytes(build_sentence(body))]
+
+
+def test_update_interval_sets_receiver_rate():
+    gps = make_gps()
+    gps.set_update_interval(10000)
+    gps.set_update_interval(10000)
+    assert gps.uart1.written == [bytes(cfg_rate(10000))]
+
+
+def test_update_interval_sets_receiver_rate_mtk():
+    gps = make_gps("mtk")
+    gps.set_update_interval(30000)
+    assert gps.uart1.written == [bytes(build_sentence("PMTK220,10000"))]
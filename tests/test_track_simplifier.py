@@ -0,0 +1,37 @@
+from utils.track_simplifier import TrackSimplifier
+
+LAT = 52000000
+LON = 13000000
+# Microdegrees per metre north, and east at 52 degrees
+NORTH = 9
+EAST = 15
+
+
+def test_straight_long_segments_keep_no_interior_points():
+    track = TrackSimplifier(tolerance_m=5)
+    # 2 km steps, the line from the anchor reaches 40 km
+    for i in range(21):
+        track.add(LAT + i * 2000 * NORTH, LON + i * 2000 * EAST)
+    assert track.count == 1
+    assert track.point(len(track) - 1) == (LAT + 40000 * NORTH, LON + 40000 * EAST)
+
+
+def test_long_segment_keeps_corner():
+    track = TrackSimplifier(tolerance_m=5)
+    for i in range(11):
+        track.add(LAT + i * 2000 * NORTH, LON)
+    for i in range(1, 11):
+        track.add(LAT + 20000 * NORTH, LON + i * 2000 * EAST)
+    kept = [track.point(i) for i in range(track.count)]
+    assert (LAT + 20000 * NORTH, LON) in kept
+
+
+def test_long_segment_offset_against_tolerance():
+    # Midpoint of a 20 km line 3 m off it stays inside a 5 m tolerance,
+    # 8 m off it is outside
+    for offset_m, kept in ((3, 1), (8, 2)):
+        track = TrackSimplifier(tolerance_m=5)
+        track.add(LAT, LON)
+        track.add(LAT + 10000 * NORTH, LON + offset_m * EAST)
+        track.add(LAT + 20000 * NORTH, LON)
+        assert track.count == kept
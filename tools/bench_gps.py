@@ -0,0 +1,153 @@
+# Benchmark GPSHandler.read_gps() on a PC from a captured receiver log
+# Capture a log on the device by setting "capture": true under GPS_SETTINGS,
+# then copy it off:
+#   mpremote connect /dev/tty.usbserial-0001 + cp :gps_capture.bin .
+# Run with CPython or the Unix MicroPython port:
+#   python bench_gps.py gps_capture.bin [--ubx] [--realtime] [--repeat N]
+#   micropython bench_gps.py gps_capture.bin
+# --realtime feeds bytes at the 9600 baud line rate and reads once per
+# second like the device, otherwise the log is parsed as fast as possible.
+# host_stubs/ stands in for the machine module (and micropython/utime/
+# uasyncio under CPython).
+
+import gc
+import sys
+
+TOOLS_DIR = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+sys.path.append(TOOLS_DIR + "/host_stubs")
+sys.path.append(TOOLS_DIR + "/../src")
+
+IS_MICROPYTHON = sys.implementation.name == "micropython"
+
+if not IS_MICROPYTHON:
+    import builtins
+    import time
+
+    import micropython
+    import utime
+
+    # @micropython.native is resolved by the MicroPython compiler without an
+    # import, and the handlers call the tick functions through time
+    builtins.micropython = micropython
+    for name in (
+        "ticks_ms",
+        "ticks_us",
+        "ticks_add",
+        "ticks_diff",
+        "sleep_ms",
+        "sleep_us",
+        "mktime",
+    ):
+        setattr(time, name, getattr(utime, name))
+
+# The Unix port has its own machine module without UART/Pin, which a file
+# on sys.path cannot shadow, so the stub is registered under its name
+sys.path.append(TOOLS_DIR)
+import host_stubs.machine  # noqa: E402
+
+sys.modules["machine"] = host_stubs.machine
+
+from handlers.gps_handler import GPSHandler  # noqa: E402
+from utils.uart_replay import ReplayUART  # noqa: E402
+import utime  # noqa: E402
+
+
+class NullLEDs:
+    def set_success_led(self, value):
+        pass
+
+    def set_warning_led(self, value):
+        pass
+
+    def set_error_led(self, value):
+        pass
+
+
+class BenchSettings:
+    def __init__(self, protocol):
+        self.settings = {
+            "protocol": protocol,
+            "ubx_baudrate": 9600,
+            "nav_rate_hz": 1,
+            "receiver": "ublox",
+            "capture": False,
+        }
+
+    def get_setting(self, key, section=None):
+        return self.settings[key]
+
+
+def heap_used():
+    if IS_MICROPYTHON:
+        return gc.mem_alloc()
+    import tracemalloc
+
+    return tracemalloc.get_traced_memory()[0]
+
+
+def run(path, protocol, realtime, repeat):
+    gps = GPSHandler(NullLEDs(), BenchSettings(protocol))
+    uart = ReplayUART(path, realtime=realtime, repeat=repeat)
+    gps.init_gps(uart)
+    # Configuration commands sent during init are not part of the benchmark
+    uart.bytes_written = 0
+    # Restart the line rate clock after the configuration delays
+    uart.init()
+
+    if not IS_MICROPYTHON:
+        import tracemalloc
+
+        tracemalloc.start()
+    gc.collect()
+    # Without collections mem_alloc() grows by exactly what was allocated
+    gc.disable()
+    heap_before = heap_used()
+    start = utime.ticks_us()
+    reads = 0
+    while not uart.exhausted:
+        gps.read_gps()
+        reads += 1
+        if realtime:
+            utime.sleep_ms(gps.update_interval)
+        elif IS_MICROPYTHON and gc.mem_free() < 8192:
+            break
+    elapsed_us = utime.ticks_diff(utime.ticks_us(), start)
+    heap_after = heap_used()
+    gc.enable()
+
+    handled = gps.messages_handled
+    print(f"Input:     {uart.bytes_read} bytes, {reads} read_gps() calls")
+    print(f"Handled:   {handled} {'frames' if protocol == 'ubx' else 'sentences'}")
+    if gps.ubx_reader:
+        print(f"Bad:       {gps.ubx_reader.checksum_errors} checksum errors")
+    else:
+        print(f"Bad:       {gps.checksum_errors} checksum errors")
+    if elapsed_us > 0 and handled:
+        print(f"Time:      {elapsed_us / 1000:.1f} ms")
+        print(f"Rate:      {handled * 1000000 / elapsed_us:.0f} messages/s")
+        print(f"Per msg:   {elapsed_us / handled:.1f} us")
+        label = "heap" if IS_MICROPYTHON else "traced"
+        print(f"Per msg:   {(heap_after - heap_before) / handled:.1f} {label} bytes")
+    print(f"Last fix:  {gps.gps_data['fix']} {gps.gps_data['lat']} {gps.gps_data['lon']}")
+
+
+def main(argv):
+    args = [arg for arg in argv if not arg.startswith("--")]
+    if not args:
+        print("Usage: bench_gps.py capture.bin [--ubx] [--realtime] [--repeat N]")
+        return
+    repeat = 1
+    if "--repeat" in argv:
+        index = argv.index("--repeat")
+        repeat = int(argv[index + 1])
+        args.remove(argv[index + 1])
+    run(
+        args[0],
+        "ubx" if "--ubx" in argv else "nmea",
+        "--realtime" in argv,
+        repeat,
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
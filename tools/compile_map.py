@@ -0,0 +1,325 @@
+# Compile a GeoJSON map into the binary map format read by the device
+# Usage: python compile_map.py input.geojson map.bin [--grid N] [--zooms 3,2,1,0.5]
+# Copy map.bin to the root of the device, it is used instead of the GeoJSON
+# map when present. Read by src/utils/map_file.py, which defines the format:
+#
+#   header        HEADER_FORMAT
+#   level zooms   levels float32, the display zoom each level is made for
+#   cell table    (grid * grid + 1) uint32, start of each cell in cell items
+#   cell items    uint32 feature ids, grouped by grid cell
+#   feature table ENTRY_FORMAT + levels * LEVEL_FORMAT per feature
+#   geometry      per feature and level: uint32 part ends (cumulative point
+#                 counts), then uint16 x, y pairs relative to the feature
+#                 bbox minimum, shifted right by the feature's shift
+#
+# All coordinates are integer microdegrees, x = longitude, y = latitude.
+# Level 0 is the geometry simplified for the first (largest) zoom, each
+# following level for the next zoom. The device draws the coarsest level
+# made for a zoom at least as large as the current one.
+
+import json
+import struct
+import sys
+
+# The format constants and the feature classifier are shared with the
+# device reader, so the two cannot disagree
+TOOLS_DIR = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+sys.path.append(TOOLS_DIR + "/../src")
+
+from utils.map_file import (  # noqa: E402
+    ENTRY_FORMAT,
+    HEADER_FORMAT,
+    KIND_LINE,
+    KIND_POINT,
+    KIND_POLYGON,
+    LEVEL_FORMAT,
+    MAGIC,
+    VERSION,
+    feature_class,
+)
+
+# DisplayHandler's zoom steps, and the view they give: calculate_bbox_for_zoom
+# spans BASE_SIZE_DEG / zoom on a DISPLAY_WIDTH x DISPLAY_HEIGHT screen
+ZOOMS = (3.0, 2.0, 1.0, 0.5)
+BASE_SIZE_DEG = 0.1
+DISPLAY_WIDTH = 128
+DISPLAY_HEIGHT = 64
+# Points closer than this to the simplified line are dropped
+TOLERANCE_PX = 0.5
+
+
+# Flatten a GeoJSON geometry into (kind, [parts of (x, y) microdegrees])
+def geometry_parts(geometry):
+    geometry = geometry or {}
+    geom_type = geometry.get("type")
+    coords = geometry.get("coordinates")
+    if not coords:
+        return None, []
+    if geom_type == "Point":
+        kind, parts = KIND_POINT, [[coords]]
+    elif geom_type == "MultiPoint":
+        kind, parts = KIND_POINT, [coords]
+    elif geom_type == "LineString":
+        kind, parts = KIND_LINE, [coords]
+    elif geom_type == "MultiLineString":
+        kind, parts = KIND_LINE, coords
+    elif geom_type == "Polygon":
+        kind, parts = KIND_POLYGON, coords
+    elif geom_type == "MultiPolygon":
+        kind, parts = KIND_POLYGON, [ring for polygon in coords for ring in polygon]
+    else:
+        return None, []
+    out = []
+    for part in parts:
+        points = [(round(p[0] * 1e6), round(p[1] * 1e6)) for p in part]
+        # Drop consecutive duplicates left by rounding
+        deduped = [points[0]] if points else []
+        for point in points[1:]:
+            if point != deduped[-1]:
+                deduped.append(point)
+        if deduped:
+            out.append(deduped)
+    return kind, out
+
+
+# Microdegrees per pixel (x, y) at a display zoom
+def pixel_size(zoom):
+    span = BASE_SIZE_DEG * 1e6 / zoom
+    return span / DISPLAY_WIDTH, span / DISPLAY_HEIGHT
+
+
+# Douglas-Peucker simplification measured in screen pixels at a zoom
+def simplify(points, zoom, tolerance_px=TOLERANCE_PX):
+    if len(points) < 3:
+        return points
+    px, py = pixel_size(zoom)
+    xs = [x / px for x, _ in points]
+    ys = [y / py for _, y in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length_sq = dx * dx + dy * dy
+        worst, worst_i = 0.0, -1
+        for i in range(first + 1, last):
+            ex, ey = xs[i] - ax, ys[i] - ay
+            if length_sq:
+                # Distance to the segment, not the infinite line, so closed
+                # rings (first == last) simplify correctly
+                t = max(0.0, min(1.0, (ex * dx + ey * dy) / length_sq))
+                ex -= t * dx
+                ey -= t * dy
+            dist_sq = ex * ex + ey * ey
+            if dist_sq > worst:
+                worst, worst_i = dist_sq, i
+        if worst > tolerance_px * tolerance_px:
+            keep[worst_i] = True
+            stack.append((first, worst_i))
+            stack.append((worst_i, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+# Parts simplified for a zoom, parts smaller than a pixel are dropped
+def simplify_parts(kind, parts, zoom):
+    if kind == KIND_POINT:
+        return parts
+    px, py = pixel_size(zoom)
+    out = []
+    for part in parts:
+        bbox = bbox_of([part])
+        if bbox[2] - bbox[0] < px and bbox[3] - bbox[1] < py:
+            continue
+        part = simplify(part, zoom)
+        if kind == KIND_POLYGON and len(part) < 4:
+            continue
+        out.append(part)
+    return out
+
+
+# One simplified copy of the parts per zoom
+def build_levels(kind, parts, zooms):
+    return [simplify_parts(kind, parts, zoom) for zoom in zooms]
+
+
+def bbox_of(parts):
+    xs = [x for part in parts for x, _ in part]
+    ys = [y for part in parts for _, y in part]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# Smallest shift that fits the feature's span into uint16
+def shift_for(bbox):
+    span = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    shift = 0
+    while span >> shift > 0xFFFF:
+        shift += 1
+    return shift
+
+
+def encode_geometry(parts, bbox, shift):
+    ends = []
+    total = 0
+    for part in parts:
+        total += len(part)
+        ends.append(total)
+    out = bytearray(struct.pack(f"<{len(ends)}I", *ends))
+    half = (1 << shift) >> 1
+    coords = []
+    for part in parts:
+        for x, y in part:
+            coords.append(min((x - bbox[0] + half) >> shift, 0xFFFF))
+            coords.append(min((y - bbox[1] + half) >> shift, 0xFFFF))
+    out += struct.pack(f"<{len(coords)}H", *coords)
+    # Keep the next record 4-byte aligned
+    while len(out) % 4:
+        out.append(0)
+    return bytes(out), total, len(parts)
+
+
+# Build the cell table and cell items of a uniform grid over the extent
+def build_grid(bboxes, extent, grid):
+    # Cell size rounded up so (value - origin) // size is always < grid
+    size_x = (extent[2] - extent[0]) // grid + 1
+    size_y = (extent[3] - extent[1]) // grid + 1
+    cells = [[] for _ in range(grid * grid)]
+
+    def cell(value, origin, size):
+        return max(0, min(grid - 1, (value - origin) // size))
+
+    for i, bbox in enumerate(bboxes):
+        x0 = cell(bbox[0], extent[0], size_x)
+        x1 = cell(bbox[2], extent[0], size_x)
+        y0 = cell(bbox[1], extent[1], size_y)
+        y1 = cell(bbox[3], extent[1], size_y)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                cells[cy * grid + cx].append(i)
+    starts = []
+    items = []
+    for ids in cells:
+        starts.append(len(items))
+        items.extend(ids)
+    starts.append(len(items))
+    return starts, items
+
+
+# features: list of (kind, cls, [parts per level]), one level per zoom
+# Level 0 must not be empty. The bbox covers every level, as a coarser
+# level clipped to a tile can reach outside the detailed one
+# extent defaults to the union of the feature bboxes
+def encode_map(features, grid=32, zooms=ZOOMS, extent=None):
+    levels = len(zooms)
+    bboxes = [
+        bbox_of([part for parts in level_parts for part in parts])
+        for _, _, level_parts in features
+    ]
+    if extent is None and bboxes:
+        extent = (
+            min(b[0] for b in bboxes),
+            min(b[1] for b in bboxes),
+            max(b[2] for b in bboxes),
+            max(b[3] for b in bboxes),
+        )
+    elif extent is None:
+        extent = (0, 0, 0, 0)
+    starts, items = build_grid(bboxes, extent, grid)
+
+    header_size = struct.calcsize(HEADER_FORMAT) + 4 * levels
+    entry_size = struct.calcsize(ENTRY_FORMAT) + levels * struct.calcsize(LEVEL_FORMAT)
+    cell_table_offset = header_size
+    cell_items_offset = cell_table_offset + 4 * len(starts)
+    feature_table_offset = cell_items_offset + 4 * len(items)
+    geometry_offset = feature_table_offset + entry_size * len(features)
+
+    entries = bytearray()
+    geometry = bytearray()
+    max_points = 0
+    max_parts = 0
+    for (kind, cls, level_parts), bbox in zip(features, bboxes):
+        shift = shift_for(bbox)
+        entries += struct.pack(ENTRY_FORMAT, *bbox, kind, cls, shift)
+        for level in range(levels):
+            parts = level_parts[min(level, len(level_parts) - 1)]
+            data, points, part_count = encode_geometry(parts, bbox, shift)
+            entries += struct.pack(
+                LEVEL_FORMAT, geometry_offset + len(geometry), points, part_count
+            )
+            geometry += data
+            max_points = max(max_points, points)
+            max_parts = max(max_parts, part_count)
+
+    header = struct.pack(
+        HEADER_FORMAT,
+        MAGIC,
+        VERSION,
+        grid,
+        len(features),
+        *extent,
+        cell_table_offset,
+        cell_items_offset,
+        feature_table_offset,
+        max_points,
+        max_parts,
+        levels,
+    )
+    return (
+        header
+        + struct.pack(f"<{levels}f", *zooms)
+        + struct.pack(f"<{len(starts)}I", *starts)
+        + struct.pack(f"<{len(items)}I", *items)
+        + entries
+        + geometry
+    )
+
+
+# Features as (kind, cls, [parts per zoom]), dropping those that vanish
+# even at the most detailed zoom
+def load_features(path, zooms=ZOOMS):
+    with open(path) as f:
+        data = json.load(f)
+    features = []
+    for feature in data.get("features", []):
+        kind, parts = geometry_parts(feature.get("geometry"))
+        if kind is None or not parts:
+            continue
+        levels = build_levels(kind, parts, zooms)
+        if not levels[0]:
+            continue
+        features.append((kind, feature_class(feature.get("properties")), levels))
+    return features
+
+
+# Parse "--zooms 3,2,1,0.5" into zooms sorted from the largest
+def parse_zooms(text):
+    return tuple(sorted((float(z) for z in text.split(",")), reverse=True))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    grid = 32
+    zooms = ZOOMS
+    if "--grid" in args:
+        index = args.index("--grid")
+        grid = int(args[index + 1])
+        del args[index : index + 2]
+    if "--zooms" in args:
+        index = args.index("--zooms")
+        zooms = parse_zooms(args[index + 1])
+        del args[index : index + 2]
+    if len(args) != 2:
+        print(
+            "Usage: python compile_map.py input.geojson map.bin [--grid N] "
+            "[--zooms 3,2,1,0.5]"
+        )
+        sys.exit(1)
+    features = load_features(args[0], zooms)
+    data = encode_map(features, grid, zooms)
+    with open(args[1], "wb") as f:
+        f.write(data)
+    print(f"Wrote {len(features)} features, {len(data)} bytes")
+    for level, zoom in enumerate(zooms):
+        points = sum(len(p) for _, _, levels in features for p in levels[level])
+        print(f"  zoom {zoom}: {points} points")
@@ -0,0 +1,242 @@
+# Split a GeoJSON map into a pack of vector tiles read by the device
+# Usage: python compile_tiles.py input.geojson map.tiles [--zoom Z] [--grid N]
+#        [--zooms 3,2,1,0.5]
+# Copy map.tiles to the root of the device, it is used instead of map.bin
+# and the GeoJSON map when present. Layout must match src/utils/tile_store.py:
+#
+#   header     PACK_FORMAT
+#   directory  DIR_FORMAT per tile, sorted by key = (x << zoom) | y
+#   tiles      one map per tile in the compile_map.py format, holding the
+#              features clipped to the tile, with the tile bounds as extent
+#
+# Tiles use the usual web map z/x/y numbering. Empty tiles are left out.
+# --zooms sets the display zooms levels of detail are made for, as in
+# compile_map.py. Features are simplified before they are clipped so the
+# pieces in neighbouring tiles still meet.
+
+import math
+import struct
+import sys
+
+from compile_map import (
+    KIND_LINE,
+    KIND_POINT,
+    ZOOMS,
+    bbox_of,
+    encode_map,
+    load_features,
+    parse_zooms,
+)
+
+PACK_MAGIC = b"PNTL"
+PACK_VERSION = 1
+PACK_FORMAT = "<4sHBxII"
+DIR_FORMAT = "<III"
+# Keeps keys within a MicroPython small int
+MAX_ZOOM = 14
+
+
+def tile_x(lon, zoom):
+    return int((lon + 180) / 360 * (1 << zoom))
+
+
+def tile_y(lat, zoom):
+    lat = math.radians(lat)
+    merc = math.log(math.tan(lat) + 1 / math.cos(lat))
+    return int((1 - merc / math.pi) / 2 * (1 << zoom))
+
+
+# Bounds of a tile in microdegrees (min_x, min_y, max_x, max_y)
+def tile_bounds(x, y, zoom):
+    n = 1 << zoom
+
+    def lat_of(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (
+        round((x / n * 360 - 180) * 1e6),
+        round(lat_of(y + 1) * 1e6),
+        round(((x + 1) / n * 360 - 180) * 1e6),
+        round(lat_of(y) * 1e6),
+    )
+
+
+def inside(point, bounds):
+    return bounds[0] <= point[0] <= bounds[2] and bounds[1] <= point[1] <= bounds[3]
+
+
+# Liang-Barsky clip of the segment a-b, None when it misses the bounds
+def clip_segment(a, b, bounds):
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    t0, t1 = 0.0, 1.0
+    for p, q in (
+        (-dx, a[0] - bounds[0]),
+        (dx, bounds[2] - a[0]),
+        (-dy, a[1] - bounds[1]),
+        (dy, bounds[3] - a[1]),
+    ):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            t0 = max(t0, t)
+        else:
+            t1 = min(t1, t)
+        if t0 > t1:
+            return None
+    return (
+        (round(a[0] + t0 * dx), round(a[1] + t0 * dy)),
+        (round(a[0] + t1 * dx), round(a[1] + t1 * dy)),
+    )
+
+
+# Pieces of a polyline inside the bounds
+def clip_line(points, bounds):
+    pieces = []
+    piece = []
+    for a, b in zip(points, points[1:]):
+        clipped = clip_segment(a, b, bounds)
+        if clipped is None:
+            if len(piece) > 1:
+                pieces.append(piece)
+            piece = []
+            continue
+        start, end = clipped
+        if piece and piece[-1] != start:
+            if len(piece) > 1:
+                pieces.append(piece)
+            piece = []
+        if not piece:
+            piece.append(start)
+        if end != piece[-1]:
+            piece.append(end)
+    if len(piece) > 1:
+        pieces.append(piece)
+    return pieces
+
+
+# Sutherland-Hodgman clip of a ring, the result stays a closed ring whose
+# cut edges lie on the tile bounds
+def clip_ring(ring, bounds):
+    def cross_x(a, b, x):
+        return (x, round(a[1] + (b[1] - a[1]) * (x - a[0]) / (b[0] - a[0])))
+
+    def cross_y(a, b, y):
+        return (round(a[0] + (b[0] - a[0]) * (y - a[1]) / (b[1] - a[1])), y)
+
+    edges = (
+        (lambda p: p[0] >= bounds[0], lambda a, b: cross_x(a, b, bounds[0])),
+        (lambda p: p[0] <= bounds[2], lambda a, b: cross_x(a, b, bounds[2])),
+        (lambda p: p[1] >= bounds[1], lambda a, b: cross_y(a, b, bounds[1])),
+        (lambda p: p[1] <= bounds[3], lambda a, b: cross_y(a, b, bounds[3])),
+    )
+    points = ring[:-1] if len(ring) > 1 and ring[0] == ring[-1] else ring
+    for keep, cross in edges:
+        if not points:
+            break
+        out = []
+        prev = points[-1]
+        for point in points:
+            if keep(point):
+                if not keep(prev):
+                    out.append(cross(prev, point))
+                out.append(point)
+            elif keep(prev):
+                out.append(cross(prev, point))
+            prev = point
+        points = out
+    deduped = []
+    for point in points:
+        if not deduped or point != deduped[-1]:
+            deduped.append(point)
+    if len(deduped) > 1 and deduped[0] == deduped[-1]:
+        deduped.pop()
+    if len(deduped) < 3:
+        return None
+    return deduped + [deduped[0]]
+
+
+def clip_parts(kind, parts, bounds):
+    if kind == KIND_POINT:
+        return [[p for p in part if inside(p, bounds)] for part in parts]
+    if kind == KIND_LINE:
+        return [piece for part in parts for piece in clip_line(part, bounds)]
+    rings = [clip_ring(part, bounds) for part in parts]
+    return [ring for ring in rings if ring]
+
+
+# Bucket the features into tiles, returns {(x, y): [features]}
+def build_tiles(features, zoom):
+    tiles = {}
+    for kind, cls, level_parts in features:
+        bbox = bbox_of(level_parts[0])
+        x0 = tile_x(bbox[0] / 1e6, zoom)
+        x1 = tile_x(bbox[2] / 1e6, zoom)
+        # Tile rows count down from the north
+        y0 = tile_y(bbox[3] / 1e6, zoom)
+        y1 = tile_y(bbox[1] / 1e6, zoom)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bounds = tile_bounds(x, y, zoom)
+                levels = [clip_parts(kind, parts, bounds) for parts in level_parts]
+                levels = [[part for part in parts if part] for parts in levels]
+                if not levels[0]:
+                    continue
+                tiles.setdefault((x, y), []).append((kind, cls, levels))
+    return tiles
+
+
+def encode_pack(tiles, zoom, grid=8, zooms=ZOOMS):
+    keys = sorted(tiles, key=lambda xy: (xy[0] << zoom) | xy[1])
+    header_size = struct.calcsize(PACK_FORMAT)
+    directory_offset = header_size
+    offset = directory_offset + struct.calcsize(DIR_FORMAT) * len(keys)
+    directory = bytearray()
+    blobs = bytearray()
+    for x, y in keys:
+        blob = encode_map(tiles[(x, y)], grid, zooms, tile_bounds(x, y, zoom))
+        directory += struct.pack(
+            DIR_FORMAT, (x << zoom) | y, offset + len(blobs), len(blob)
+        )
+        blobs += blob
+    header = struct.pack(
+        PACK_FORMAT, PACK_MAGIC, PACK_VERSION, zoom, len(keys), directory_offset
+    )
+    return header + directory + blobs
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {"--zoom": 12, "--grid": 8}
+    for name in options:
+        if name in args:
+            index = args.index(name)
+            options[name] = int(args[index + 1])
+            del args[index : index + 2]
+    zooms = ZOOMS
+    if "--zooms" in args:
+        index = args.index("--zooms")
+        zooms = parse_zooms(args[index + 1])
+        del args[index : index + 2]
+    if len(args) != 2:
+        print(
+            "Usage: python compile_tiles.py input.geojson map.tiles [--zoom Z] "
+            "[--grid N] [--zooms 3,2,1,0.5]"
+        )
+        sys.exit(1)
+    zoom = options["--zoom"]
+    if not 0 <= zoom <= MAX_ZOOM:
+        print(f"Zoom must be between 0 and {MAX_ZOOM}")
+        sys.exit(1)
+    tiles = build_tiles(load_features(args[0], zooms), zoom)
+    data = encode_pack(tiles, zoom, options["--grid"], zooms)
+    with open(args[1], "wb") as f:
+        f.write(data)
+    largest = max((len(features) for features in tiles.values()), default=0)
+    print(
+        f"Wrote {len(tiles)} tiles at zoom {zoom}, {len(data)} bytes, "
+        f"up to {largest} features per tile"
+    )
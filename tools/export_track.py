@@ -0,0 +1,125 @@
+# Convert a track log recorded on the device to GPX or GeoJSON
+# Copy the log off the device first:
+#   mpremote connect /dev/tty.usbserial-0001 + cp :track.bin .
+# Then: python export_track.py track.bin track.gpx (or track.geojson)
+# Page and record layout are defined by src/handlers/track_logger.py
+
+from datetime import datetime, timedelta, timezone
+import json
+import struct
+import sys
+
+# The page and record layout is shared with the device writer, so the two
+# cannot disagree. host_stubs provides micropython.const under CPython.
+TOOLS_DIR = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+sys.path.append(TOOLS_DIR + "/host_stubs")
+sys.path.append(TOOLS_DIR + "/../src")
+
+from handlers.track_logger import (  # noqa: E402
+    HEADER_FORMAT,
+    HEADER_SIZE,
+    MAGIC,
+    PAGE_SIZE,
+    RECORD_FORMAT,
+    RECORD_SIZE,
+    VERSION,
+)
+
+EPOCH_2000 = datetime(2000, 1, 1, tzinfo=timezone.utc)
+# Start a new track segment when fixes are further apart than this
+SEGMENT_GAP_S = 60
+
+
+# Decode the log into segments of (time, lat, lon, alt, hdop) points
+def read_track(path):
+    segments = []
+    points = []
+    last_t = None
+    with open(path, "rb") as f:
+        data = f.read()
+    for offset in range(0, len(data) - PAGE_SIZE + 1, PAGE_SIZE):
+        magic, version, count, t, lat, lon, alt = struct.unpack_from(
+            HEADER_FORMAT, data, offset
+        )
+        if magic != MAGIC or version != VERSION:
+            print(f"Skipping unknown page at offset {offset}")
+            continue
+        for i in range(count):
+            dt, dlat, dlon, dalt, hdop = struct.unpack_from(
+                RECORD_FORMAT, data, offset + HEADER_SIZE + i * RECORD_SIZE
+            )
+            t += dt
+            lat += dlat
+            lon += dlon
+            alt += dalt
+            if last_t is not None and t - last_t > SEGMENT_GAP_S and points:
+                segments.append(points)
+                points = []
+            last_t = t
+            points.append(
+                (
+                    EPOCH_2000 + timedelta(seconds=t),
+                    lat / 1e6,
+                    lon / 1e6,
+                    alt / 10,
+                    hdop / 10 if hdop >= 0 else None,
+                )
+            )
+    if points:
+        segments.append(points)
+    return segments
+
+
+def write_gpx(segments, path):
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(
+            '<gpx version="1.1" creator="PocketNav32" '
+            'xmlns="http://www.topografix.com/GPX/1/1">\n'
+        )
+        f.write("<trk><name>PocketNav32 track</name>\n")
+        for points in segments:
+            f.write("<trkseg>\n")
+            for when, lat, lon, alt, hdop in points:
+                f.write(f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}">')
+                f.write(f"<ele>{alt:.1f}</ele>")
+                f.write(f"<time>{when.strftime('%Y-%m-%dT%H:%M:%SZ')}</time>")
+                if hdop is not None:
+                    f.write(f"<hdop>{hdop:.1f}</hdop>")
+                f.write("</trkpt>\n")
+            f.write("</trkseg>\n")
+        f.write("</trk>\n</gpx>\n")
+
+
+def write_geojson(segments, path):
+    features = []
+    for points in segments:
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {
+                    "start": points[0][0].isoformat(),
+                    "end": points[-1][0].isoformat(),
+                    "times": [p[0].isoformat() for p in points],
+                },
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [[p[2], p[1], p[3]] for p in points],
+                },
+            }
+        )
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python export_track.py track.bin output.gpx|output.geojson")
+        sys.exit(1)
+    segments = read_track(sys.argv[1])
+    total = sum(len(points) for points in segments)
+    if sys.argv[2].endswith(".geojson") or sys.argv[2].endswith(".json"):
+        write_geojson(segments, sys.argv[2])
+    else:
+        write_gpx(segments, sys.argv[2])
+    print(f"Exported {total} points in {len(segments)} segments to {sys.argv[2]}")
@@ -0,0 +1 @@
+# Host stand-ins for MicroPython modules, see bench_gps.py
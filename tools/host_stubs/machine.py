@@ -0,0 +1,72 @@
+# Host stand-in for the MicroPython machine module
+# Enough of Pin, UART and RTC for the handlers to import and run under
+# CPython or the Unix MicroPython port. There is no serial port, pass a
+# utils.uart_replay.ReplayUART to GPSHandler.init_gps instead.
+
+import time
+
+DEEPSLEEP_RESET = 4
+PWRON_RESET = 1
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, pin_id, mode=None, pull=None, value=None):
+        self.pin_id = pin_id
+        self._value = value or 0
+        self.handler = None
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, trigger=None, handler=None):
+        self.handler = handler
+
+
+class UART:
+    def __init__(self, *args, **kwargs):
+        raise OSError("No UART on the host, pass a ReplayUART to init_gps")
+
+
+class RTC:
+    _memory = b""
+
+    def memory(self, data=None):
+        if data is None:
+            return RTC._memory
+        RTC._memory = bytes(data)
+
+    def datetime(self, value=None):
+        if value is None:
+            t = time.gmtime()
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+def reset_cause():
+    return PWRON_RESET
+
+
+def freq(hz=None):
+    return 240000000
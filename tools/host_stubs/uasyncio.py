@@ -0,0 +1,12 @@
+# Host stand-in for uasyncio on top of asyncio
+
+from asyncio import *  # noqa: F401,F403
+import asyncio as _asyncio
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+async def wait_for_ms(awaitable, timeout_ms):
+    return await _asyncio.wait_for(awaitable, timeout_ms / 1000)
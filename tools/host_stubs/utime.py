@@ -0,0 +1,53 @@
+# Host stand-in for utime, the MicroPython tick functions on top of time
+# Ticks wrap at 2**30 like on the ESP32 port. The RTC of the device runs
+# on UTC, so mktime()/localtime() are UTC here as well.
+
+import calendar
+import time as _time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+
+def ticks_ms():
+    return int(_time.monotonic() * 1000) % _TICKS_PERIOD
+
+
+def ticks_us():
+    return int(_time.monotonic() * 1000000) % _TICKS_PERIOD
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) % _TICKS_PERIOD
+
+
+def ticks_diff(end, start):
+    return (end - start + _TICKS_HALF) % _TICKS_PERIOD - _TICKS_HALF
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def time():
+    return int(_time.time())
+
+
+# MicroPython time tuples have 8 fields, CPython's have 9
+def mktime(t):
+    return calendar.timegm(tuple(t[:6]) + (0, 0, 0))
+
+
+def gmtime(seconds=None):
+    return _time.gmtime(seconds)[:8]
+
+
+localtime = gmtime